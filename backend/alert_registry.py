@@ -0,0 +1,493 @@
+# backend/alert_registry.py - Alertas PENDING en memoria, parcheadas en cada escritura y reconciliadas con la BD
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from conditions import CompiledCondition, ConditionError, EvalContext, compile_condition
+from database import AsyncSessionLocal
+from shared_state import shared_state
+from threshold_index import ThresholdIndex, NEAR_PROGRESS, NEAR_EXIT_PROGRESS, alert_progress
+
+# Reconciliación completa con Postgres para corregir desviaciones
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("ALERT_RECONCILE_INTERVAL", "300"))
+# Cadencia de persistencia de los cambios de proximidad pendientes
+NEAR_STATE_FLUSH_SECONDS = 5
+DEFAULT_NEAR_COOLDOWN_SECONDS = 5 * 60
+
+class AlertRecord:
+    """Copia compacta de una alerta PENDING"""
+    __slots__ = ("id", "symbol", "target_price", "alert_type", "notes", "created_at",
+                 "near", "near_notified_at", "expiry_hours", "condition")
+
+    def __init__(self, id: int, symbol: str, target_price: float, alert_type, notes: Optional[str], created_at,
+                 near: Optional[bool] = False, near_notified_at: Optional[datetime] = None,
+                 expiry_hours: Optional[int] = None, condition: Optional[dict] = None):
+        self.id = id
+        self.symbol = symbol
+        self.target_price = target_price
+        self.alert_type = alert_type
+        self.notes = notes
+        self.created_at = created_at
+        # Dentro de la banda de proximidad y epoch del último aviso enviado
+        self.near = bool(near)
+        self.near_notified_at = near_notified_at.timestamp() if near_notified_at else None
+        self.expiry_hours = expiry_hours
+        # Condición compilada (None = LONG/SHORT simple, evaluada por el índice de targets)
+        self.condition: Optional[CompiledCondition] = compile_condition(condition)
+
+    @classmethod
+    def from_alert(cls, alert) -> "AlertRecord":
+        return cls(alert.id, alert.symbol, alert.target_price, alert.alert_type, alert.notes, alert.created_at,
+                   alert.near_state, alert.near_notified_at, alert.expiry_hours, alert.condition)
+
+    @property
+    def condition_source(self) -> Optional[dict]:
+        return self.condition.source if self.condition is not None else None
+
+    def to_shared(self) -> dict:
+        shared = {"symbol": self.symbol, "target_price": self.target_price, "alert_type": self.alert_type.value}
+        if self.condition is not None:
+            shared["condition"] = self.condition.source
+        return shared
+
+_RECORD_COLUMNS = (
+    models.Alert.id, models.Alert.symbol, models.Alert.target_price,
+    models.Alert.alert_type, models.Alert.notes, models.Alert.created_at,
+    models.Alert.near_state, models.Alert.near_notified_at, models.Alert.expiry_hours,
+    models.Alert.condition
+)
+
+def _record_key(record: AlertRecord) -> tuple:
+    """Lo que decide dónde y cómo se evalúa una alerta"""
+    return record.symbol, record.target_price, record.alert_type, record.condition_source
+
+class AlertRegistry:
+    """Índice de alertas activas que evita escanear Postgres en cada evaluación"""
+
+    def __init__(self, reconcile_interval: float = RECONCILE_INTERVAL_SECONDS):
+        self.reconcile_interval = reconcile_interval
+        self.index = ThresholdIndex()
+        # Retiradas del índice por cruce, a la espera de que la BD confirme la transición
+        self.triggering: Set[int] = set()
+        # Alertas con condición compilada, fuera del índice de targets
+        self.conditional: Dict[int, AlertRecord] = {}
+        self.conditional_by_symbol: Dict[str, Dict[int, AlertRecord]] = {}
+        # Último precio evaluado por símbolo: sin cambio no se reevalúan condiciones
+        self._condition_prices: Dict[str, float] = {}
+        self.conditions_evaluated = 0
+        # Alertas dentro de la banda de proximidad por símbolo (para detectar salidas)
+        self.near_by_symbol: Dict[str, Set[int]] = {}
+        self.near_cooldown_seconds = DEFAULT_NEAR_COOLDOWN_SECONDS
+        self._near_dirty: Set[int] = set()
+        self.near_sent = 0
+        self.near_suppressed = 0
+        self.loaded_at: Optional[float] = None
+        self.reconciled_at: Optional[float] = None
+        self.drift_fixed = 0
+        self.version = 0
+        self._symbol_listeners: List[Callable[[], None]] = []
+        self._alert_listeners: List[Callable[[int, Optional[AlertRecord]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.index) + len(self.conditional)
+
+    # ==================== CONSULTAS ====================
+
+    def symbols(self) -> List[str]:
+        symbols = self.index.symbols()
+        symbols.extend(s for s in self.conditional_by_symbol if not self.index.count(s))
+        return symbols
+
+    def records(self) -> Iterable[AlertRecord]:
+        yield from self.index.values()
+        yield from self.conditional.values()
+
+    def get(self, alert_id: int) -> Optional[AlertRecord]:
+        return self.index.get(alert_id) or self.conditional.get(alert_id)
+
+    def count(self, symbol: str) -> int:
+        return self.index.count(symbol) + len(self.conditional_by_symbol.get(symbol, ()))
+
+    def has_conditions(self, symbol: str) -> bool:
+        return symbol in self.conditional_by_symbol
+
+    def nearest_distance(self, symbol: str, price: float) -> Optional[float]:
+        return self.index.nearest_distance(symbol, price)
+
+    # ==================== ESCRITURA ====================
+
+    def on_symbols_changed(self, callback: Callable[[], None]):
+        """Callback cuando aparece o desaparece un símbolo con alertas (re-suscripción)"""
+        if callback not in self._symbol_listeners:
+            self._symbol_listeners.append(callback)
+
+    def on_alert_changed(self, callback: Callable[[int, Optional[AlertRecord]], None]):
+        """Callback por alta/cambio (record) o baja (None) de una alerta"""
+        if callback not in self._alert_listeners:
+            self._alert_listeners.append(callback)
+
+    def _changed(self, symbols_before: Set[str], record: Optional[AlertRecord], alert_id: int):
+        self.version += 1
+        if shared_state.enabled:
+            asyncio.ensure_future(shared_state.update_active_alert(alert_id, record.to_shared() if record else None))
+        self._notify_alert(alert_id, record)
+        if set(self.symbols()) != symbols_before:
+            self._notify_symbols_changed()
+
+    def _notify_alert(self, alert_id: int, record: Optional[AlertRecord]):
+        for callback in self._alert_listeners:
+            callback(alert_id, record)
+
+    def _notify_symbols_changed(self):
+        for callback in self._symbol_listeners:
+            callback()
+
+    def upsert(self, alert):
+        """Aplicar el estado de una alerta recién escrita (ORM) al índice"""
+        if alert.status != models.AlertStatusEnum.PENDING:
+            self.remove(alert.id)
+            return
+        self.put(AlertRecord.from_alert(alert))
+
+    def put(self, record: AlertRecord):
+        """Alta o cambio de una alerta PENDING"""
+        if record.id in self.triggering:
+            return
+        symbols_before = set(self.symbols())
+        previous = self._delete(record.id)
+        if previous is not None:
+            if _record_key(previous) == _record_key(record):
+                # El estado en memoria puede ser más reciente que el persistido
+                record.near, record.near_notified_at = previous.near, previous.near_notified_at
+                if previous.condition is not None:
+                    record.condition = previous.condition
+        self._insert(record)
+        self._changed(symbols_before, record, record.id)
+
+    def remove(self, alert_id: int):
+        self.triggering.discard(alert_id)
+        self._near_dirty.discard(alert_id)
+        symbols_before = set(self.symbols())
+        if self._delete(alert_id) is not None:
+            self._changed(symbols_before, None, alert_id)
+
+    def _insert(self, record: AlertRecord):
+        if record.condition is not None:
+            self.conditional[record.id] = record
+            self.conditional_by_symbol.setdefault(record.symbol, {})[record.id] = record
+        else:
+            self.index.add(record.id, record.symbol, record.alert_type, record.target_price, record)
+            self._track_near(record)
+
+    def _delete(self, alert_id: int) -> Optional[AlertRecord]:
+        record = self.index.remove(alert_id)
+        if record is not None:
+            self._forget_near(record)
+            return record
+        record = self.conditional.pop(alert_id, None)
+        if record is not None:
+            alerts = self.conditional_by_symbol[record.symbol]
+            del alerts[alert_id]
+            if not alerts:
+                del self.conditional_by_symbol[record.symbol]
+                self._condition_prices.pop(record.symbol, None)
+        return record
+
+    # ==================== EVALUACIÓN ====================
+
+    def pop_crossed(self, symbol: str, price: float,
+                    low: Optional[float] = None, high: Optional[float] = None) -> List[AlertRecord]:
+        """Retira las alertas cruzadas y las marca en transición hasta ``release``"""
+        crossed = self.index.pop_crossed(symbol, price, low, high)
+        for record in crossed:
+            self._forget_near(record)
+        if symbol in self.conditional_by_symbol:
+            for record in self._matched_conditions(symbol, price):
+                self._delete(record.id)
+                crossed.append(record)
+        if crossed:
+            self.version += 1
+            self.triggering.update(record.id for record in crossed)
+            if not self.count(symbol):
+                self._notify_symbols_changed()
+        return crossed
+
+    def _matched_conditions(self, symbol: str, price: float) -> List[AlertRecord]:
+        """Evaluar las condiciones del símbolo solo si su entrada (el precio) cambió"""
+        if price <= 0 or self._condition_prices.get(symbol) == price:
+            return []
+        self._condition_prices[symbol] = price
+        alerts = self.conditional_by_symbol[symbol]
+        self.conditions_evaluated += len(alerts)
+        ctx = EvalContext(symbol, price)
+        return [record for record in alerts.values() if record.condition.evaluate(ctx)]
+
+    def release(self, record: AlertRecord, resolved: bool):
+        """Fin de la transición: si falló (no resuelta), la alerta vuelve al índice"""
+        self.triggering.discard(record.id)
+        if resolved:
+            if shared_state.enabled:
+                asyncio.ensure_future(shared_state.update_active_alert(record.id, None))
+            # pop_crossed no avisó la baja: los listeners (p. ej. el heap de expiración) la ven aquí
+            self._notify_alert(record.id, None)
+        else:
+            is_new_symbol = not self.count(record.symbol)
+            self._insert(record)
+            if is_new_symbol:
+                self._notify_symbols_changed()
+
+    def near(self, symbol: str, price: float, progress: float = NEAR_PROGRESS) -> List[AlertRecord]:
+        """Máquina de estados de proximidad; devuelve las alertas a notificar
+
+        Se entra en la banda con ``progress`` y se sale por debajo de NEAR_EXIT_PROGRESS,
+        así que un precio rondando el umbral no alterna de estado. Al entrar solo se
+        avisa si pasó el cooldown desde el último aviso (Config.snooze_duration_minutes).
+        """
+        now = time.time()
+        inside = self.near_by_symbol.get(symbol)
+        if inside:
+            for alert_id in list(inside):
+                record = self.index.get(alert_id)
+                if record is None:
+                    inside.discard(alert_id)
+                elif alert_progress(record.alert_type, record.target_price, price) < NEAR_EXIT_PROGRESS:
+                    record.near = False
+                    inside.discard(alert_id)
+                    self._near_dirty.add(alert_id)
+            if not inside:
+                del self.near_by_symbol[symbol]
+
+        to_notify = []
+        for record in self.index.near(symbol, price, progress):
+            if record.near:
+                continue
+            record.near = True
+            self._track_near(record)
+            self._near_dirty.add(record.id)
+            if record.near_notified_at is None or now - record.near_notified_at >= self.near_cooldown_seconds:
+                record.near_notified_at = now
+                to_notify.append(record)
+                self.near_sent += 1
+            else:
+                self.near_suppressed += 1
+        return to_notify
+
+    def _track_near(self, record: AlertRecord):
+        if record.near:
+            self.near_by_symbol.setdefault(record.symbol, set()).add(record.id)
+
+    def _forget_near(self, record: AlertRecord):
+        inside = self.near_by_symbol.get(record.symbol)
+        if inside is not None:
+            inside.discard(record.id)
+            if not inside:
+                del self.near_by_symbol[record.symbol]
+
+    # ==================== PERSISTENCIA DE PROXIMIDAD ====================
+
+    def drain_near_changes(self) -> List[Tuple[int, bool, Optional[float]]]:
+        """Cambios de proximidad pendientes de persistir (id, near, epoch del último aviso)"""
+        changes = []
+        for alert_id in self._near_dirty:
+            record = self.index.get(alert_id)
+            if record is not None:
+                changes.append((alert_id, record.near, record.near_notified_at))
+        self._near_dirty.clear()
+        return changes
+
+    def apply_near_changes(self, changes: List[Tuple[int, bool, Optional[float]]]):
+        """Aplicar cambios de proximidad calculados en otro proceso (workers)"""
+        for alert_id, near, notified_at in changes:
+            record = self.index.get(alert_id)
+            if record is None:
+                continue
+            self._forget_near(record)
+            record.near, record.near_notified_at = near, notified_at
+            self._track_near(record)
+            self._near_dirty.add(alert_id)
+
+    async def flush_near_states(self, db: AsyncSession) -> int:
+        """Persistir en bloque (UPDATE por clave primaria) los cambios de proximidad"""
+        changes = self.drain_near_changes()
+        if not changes:
+            return 0
+        try:
+            await db.execute(update(models.Alert), [
+                {
+                    "id": alert_id,
+                    "near_state": near,
+                    "near_notified_at": datetime.fromtimestamp(notified_at) if notified_at else None
+                }
+                for alert_id, near, notified_at in changes
+            ])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self._near_dirty.update(alert_id for alert_id, _, _ in changes)
+            raise
+        return len(changes)
+
+    # ==================== CARGA Y RECONCILIACIÓN ====================
+
+    async def _query_pending(self, db: AsyncSession) -> Dict[int, AlertRecord]:
+        # Solo las columnas necesarias: sin hidratar objetos ORM completos
+        rows = (await db.execute(
+            select(*_RECORD_COLUMNS).where(models.Alert.status == models.AlertStatusEnum.PENDING)
+        )).all()
+        records = {}
+        for row in rows:
+            try:
+                records[row.id] = AlertRecord(*row)
+            except ConditionError as e:
+                print(f"❌ Alerta {row.id} con condición inválida, no se evalúa: {e}")
+        return records
+
+    async def _load_config(self, db: AsyncSession):
+        snooze = (await db.execute(select(models.Config.snooze_duration_minutes).limit(1))).first()
+        if snooze and snooze[0] is not None:
+            self.near_cooldown_seconds = snooze[0] * 60
+
+    async def load(self, db: AsyncSession):
+        await self._load_config(db)
+        pending = await self._query_pending(db)
+        self.index = ThresholdIndex()
+        self.near_by_symbol = {}
+        self.conditional = {}
+        self.conditional_by_symbol = {}
+        self._condition_prices = {}
+        for record in pending.values():
+            if record.id not in self.triggering:
+                self._insert(record)
+        self.version += 1
+        self.loaded_at = self.reconciled_at = time.time()
+        self._publish_all()
+        print(f"✅ Registro de alertas cargado: {len(self)} activas en {len(self.symbols())} símbolos")
+
+    async def reconcile(self, db: AsyncSession) -> int:
+        """Comparar con la BD y corregir diferencias; devuelve cuántas se corrigieron"""
+        await self._load_config(db)
+        await self.flush_near_states(db)
+        pending = await self._query_pending(db)
+        symbols_before = set(self.symbols())
+        fixed = 0
+
+        for record in list(self.records()):
+            current = pending.get(record.id)
+            if current is None:
+                self._delete(record.id)
+                self._notify_alert(record.id, None)
+                fixed += 1
+            elif _record_key(current) != _record_key(record):
+                self._delete(record.id)
+                self._insert(current)
+                self._notify_alert(current.id, current)
+                fixed += 1
+
+        for alert_id, record in pending.items():
+            if self.get(alert_id) is None and alert_id not in self.triggering:
+                self._insert(record)
+                self._notify_alert(alert_id, record)
+                fixed += 1
+
+        self.reconciled_at = time.time()
+        if fixed:
+            self.version += 1
+            self.drift_fixed += fixed
+            self._publish_all()
+            print(f"⚠️ Reconciliación de alertas: {fixed} diferencia(s) corregida(s)")
+            if set(self.symbols()) != symbols_before:
+                self._notify_symbols_changed()
+        return fixed
+
+    def refresh_alert(self, alert_id: Optional[int] = None):
+        """Releer una alerta concreta (cambio hecho por otro proceso); sin id, reconciliar todo
+
+        Callback síncrono de Redis: la lectura se programa en el event loop.
+        """
+        asyncio.ensure_future(self._refresh_alert(alert_id))
+
+    async def _refresh_alert(self, alert_id: Optional[int]):
+        try:
+            if alert_id is None:
+                await self._reconcile_once()
+                return
+            async with AsyncSessionLocal() as db:
+                alert = await db.get(models.Alert, alert_id)
+            if alert is None:
+                self.remove(alert_id)
+            else:
+                self.upsert(alert)
+        except Exception as e:
+            print(f"❌ Error releyendo alerta {alert_id}: {e}")
+
+    def _publish_all(self):
+        if shared_state.enabled:
+            asyncio.ensure_future(shared_state.publish_active_alerts(
+                {r.id: r.to_shared() for r in self.records()}
+            ))
+
+    # ==================== BACKGROUND ====================
+
+    async def start(self):
+        async with AsyncSessionLocal() as db:
+            await self.load(db)
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _reconcile_once(self):
+        async with AsyncSessionLocal() as db:
+            await self.reconcile(db)
+
+    async def _flush_near_once(self):
+        async with AsyncSessionLocal() as db:
+            await self.flush_near_states(db)
+
+    async def _run(self):
+        last_reconcile = time.monotonic()
+        while True:
+            await asyncio.sleep(NEAR_STATE_FLUSH_SECONDS)
+            try:
+                if time.monotonic() - last_reconcile >= self.reconcile_interval:
+                    last_reconcile = time.monotonic()
+                    await self._reconcile_once()
+                elif self._near_dirty:
+                    await self._flush_near_once()
+            except Exception as e:
+                print(f"❌ Error sincronizando alertas con la BD: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self),
+            "symbols": len(self.symbols()),
+            "conditional": len(self.conditional),
+            "conditions_evaluated": self.conditions_evaluated,
+            "triggering": len(self.triggering),
+            "near": sum(len(ids) for ids in self.near_by_symbol.values()),
+            "near_notifications_sent": self.near_sent,
+            "near_notifications_suppressed": self.near_suppressed,
+            "near_cooldown_seconds": self.near_cooldown_seconds,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "reconciled_at": self.reconciled_at,
+            "drift_fixed": self.drift_fixed,
+            "reconcile_interval_seconds": self.reconcile_interval
+        }
+
+# Instancia global
+alert_registry = AlertRegistry()
@@ -0,0 +1,272 @@
+# backend/alert_snapshot.py - Instantánea inmutable de alertas enriquecidas, reconstruida con cada cambio de precio
+import asyncio
+import os
+import time
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import desc, func, select
+
+import models
+from binance_scheduler import PRIORITY_DASHBOARD
+from database import AsyncSessionLocal
+from etags import change_counters
+from price_cache import price_cache
+from threshold_index import alert_progress
+
+# Cadencia máxima de reconstrucción (los ticks de un intervalo se agrupan)
+ALERT_SNAPSHOT_INTERVAL = float(os.getenv("ALERT_SNAPSHOT_INTERVAL", "1"))
+# Relectura completa de la BD para recoger cambios de otros procesos
+ALERT_SNAPSHOT_RELOAD_SECONDS = float(os.getenv("ALERT_SNAPSHOT_RELOAD_SECONDS", "30"))
+# Alertas no PENDING (las más recientes) que entran en la instantánea; el historial
+# completo se pagina en SQL (crud.get_alerts)
+ALERT_SNAPSHOT_HISTORY = int(os.getenv("ALERT_SNAPSHOT_HISTORY", "100"))
+# Sin lecturas durante este tiempo no se refrescan precios para la instantánea
+ALERT_SNAPSHOT_IDLE_SECONDS = 60
+# Umbral de progreso de /api/alerts/proximas y de las oportunidades del dashboard
+PROXIMAS_PROGRESS = 80.0
+RECENT_ALERTS_LIMIT = 10
+
+# ==================== SERIALIZACIÓN ====================
+
+def serialize_alert(alert) -> dict:
+    """Campos de una alerta para la API; los de precio se rellenan con ``with_price``"""
+    return {
+        "id": alert.id,
+        "symbol": alert.symbol,
+        "target_price": alert.target_price,
+        "current_price": 0.0,
+        "alert_type": alert.alert_type.value,
+        "status": alert.status.value,
+        "notes": alert.notes or "",
+        "created_at": alert.created_at.isoformat(),
+        "triggered_at": alert.triggered_at.isoformat() if alert.triggered_at else None,
+        "executed_at": alert.executed_at.isoformat() if alert.executed_at else None,
+        "progress_percentage": 0.0,
+        "distance_percentage": None,
+        "trade_id": alert.trade_id,
+        "condition": alert.condition
+    }
+
+def with_price(data: dict, alert_type, current_price: float) -> dict:
+    """Copia de la alerta serializada con precio actual, progreso y distancia al target"""
+    if current_price <= 0:
+        return {**data, "current_price": current_price}
+    target_price = data["target_price"]
+    progress = min(alert_progress(alert_type, target_price, current_price), 100.0)
+    return {
+        **data,
+        "current_price": current_price,
+        "progress_percentage": round(progress, 1),
+        "distance_percentage": round(abs(target_price - current_price) / current_price * 100, 2)
+    }
+
+class _BaseAlert:
+    """Fila leída de la BD: lo que no depende del precio"""
+    __slots__ = ("id", "symbol", "alert_type", "is_pending", "data")
+
+    def __init__(self, alert):
+        self.id = alert.id
+        self.symbol = alert.symbol
+        self.alert_type = alert.alert_type
+        self.is_pending = alert.status == models.AlertStatusEnum.PENDING
+        self.data = serialize_alert(alert)
+
+# ==================== INSTANTÁNEA ====================
+
+class AlertSnapshot:
+    """Vista de solo lectura: tuplas de dicts que nadie modifica tras construirse
+
+    Las alertas van por created_at descendente; los endpoints sirven cortes ya
+    hechos, sin consultas ni cálculo por petición.
+    """
+    __slots__ = ("alerts", "active", "proximas", "recent", "counts", "total",
+                 "version", "built_at")
+
+    def __init__(self, rows: List[Tuple[_BaseAlert, dict]], counts: Dict[str, int], version: int):
+        self.alerts = tuple(data for _, data in rows)
+        self.active = tuple(data for base, data in rows if base.is_pending)
+        self.proximas = tuple(sorted(
+            (data for data in self.active if data["progress_percentage"] >= PROXIMAS_PROGRESS),
+            key=lambda data: data["progress_percentage"],
+            reverse=True
+        ))
+        self.recent = self.alerts[:RECENT_ALERTS_LIMIT]
+        self.counts: Mapping[str, int] = MappingProxyType(dict(counts))
+        self.total = sum(counts.values())
+        self.version = version
+        self.built_at = time.time()
+
+    def count(self, status: models.AlertStatusEnum) -> int:
+        return self.counts.get(status.value, 0)
+
+class AlertSnapshotService:
+    """Mantiene la última instantánea y la reconstruye cuando cambian precios o alertas
+
+    Las filas de la BD solo se releen si algo invalidó la instantánea (o cada
+    ALERT_SNAPSHOT_RELOAD_SECONDS); entre medias cada reconstrucción solo
+    recalcula las alertas de los símbolos cuyo precio cambió y reutiliza el
+    resto de dicts de la instantánea anterior.
+    """
+
+    def __init__(self, interval: float = ALERT_SNAPSHOT_INTERVAL,
+                 reload_seconds: float = ALERT_SNAPSHOT_RELOAD_SECONDS,
+                 history_limit: int = ALERT_SNAPSHOT_HISTORY):
+        self.interval = interval
+        self.reload_seconds = reload_seconds
+        self.history_limit = history_limit
+        self.snapshot: Optional[AlertSnapshot] = None
+        self._base: List[_BaseAlert] = []
+        self._symbols: List[str] = []
+        self._counts: Dict[str, int] = {}
+        self._rows: Dict[int, Tuple[_BaseAlert, float, dict]] = {}
+        self._prices: Dict[str, float] = {}
+        self._dirty = True
+        # Versión de alertas (change_counters) vista al empezar la última relectura
+        self._alerts_key: Optional[str] = None
+        self._loaded_at = 0.0
+        self._last_read = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.version = 0
+        self.reloads = 0
+        self.rows_computed = 0
+        self.rows_reused = 0
+        self.last_build_ms = 0.0
+
+    def invalidate(self, *args):
+        """Alguna alerta cambió: releer la BD en la próxima reconstrucción
+
+        Acepta y descarta los argumentos de los callbacks de registro y Redis.
+        """
+        self._dirty = True
+
+    # ==================== LECTURA ====================
+
+    async def get(self, alerts_key: Optional[str] = None) -> AlertSnapshot:
+        """Instantánea actual; se construye aquí la primera vez, tras un cambio de
+        alertas (una lectura justo después de escribir ya lo ve) o tras estar inactiva
+
+        ``alerts_key`` es la versión de alertas que irá en el ETag: si difiere de
+        la de la última relectura (cambio hecho en otro proceso) se relee la BD,
+        así que el ETag nuevo nunca acompaña a filas viejas.
+        """
+        idle = time.monotonic() - self._last_read > ALERT_SNAPSHOT_IDLE_SECONDS
+        self._last_read = time.monotonic()
+        if alerts_key is not None and alerts_key != self._alerts_key:
+            self._dirty = True
+        if self.snapshot is None or self._dirty or (idle and time.time() - self.snapshot.built_at > self.interval):
+            await self.refresh()
+        return self.snapshot
+
+    # ==================== CONSTRUCCIÓN ====================
+
+    async def _reload(self):
+        async with AsyncSessionLocal() as db:
+            pending = (await db.execute(select(models.Alert).where(
+                models.Alert.status == models.AlertStatusEnum.PENDING
+            ))).scalars().all()
+            history = (await db.execute(select(models.Alert).where(
+                models.Alert.status != models.AlertStatusEnum.PENDING
+            ).order_by(desc(models.Alert.created_at), desc(models.Alert.id)).limit(self.history_limit))).scalars().all()
+            counts = (await db.execute(
+                select(models.Alert.status, func.count(models.Alert.id)).group_by(models.Alert.status)
+            )).all()
+
+        alerts = sorted([*pending, *history], key=lambda alert: (alert.created_at, alert.id), reverse=True)
+        self._base = [_BaseAlert(alert) for alert in alerts]
+        self._symbols = list(dict.fromkeys(base.symbol for base in self._base))
+        self._counts = {status.value: count for status, count in counts}
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+
+    def _build(self, prices: Dict[str, float]) -> AlertSnapshot:
+        rows: List[Tuple[_BaseAlert, dict]] = []
+        cache: Dict[int, Tuple[_BaseAlert, float, dict]] = {}
+        for base in self._base:
+            price = prices.get(base.symbol, 0.0)
+            cached = self._rows.get(base.id)
+            if cached is not None and cached[0] is base and cached[1] == price:
+                data = cached[2]
+                self.rows_reused += 1
+            else:
+                data = with_price(base.data, base.alert_type, price)
+                self.rows_computed += 1
+            cache[base.id] = (base, price, data)
+            rows.append((base, data))
+        self._rows = cache
+        self.version += 1
+        return AlertSnapshot(rows, self._counts, self.version)
+
+    async def refresh(self):
+        """Reconstruir si cambiaron las alertas o algún precio de sus símbolos"""
+        async with self._lock:
+            reloaded = False
+            if self._dirty or time.monotonic() - self._loaded_at >= self.reload_seconds:
+                # Se limpia antes de leer: lo que cambie durante la lectura vuelve a marcarla
+                self._dirty = False
+                try:
+                    self._alerts_key = await change_counters.get("alerts")
+                    await self._reload()
+                except Exception:
+                    self._dirty = True
+                    raise
+                reloaded = True
+
+            # Con el WebSocket activo todo sale de la caché; si no, un lote coalescido
+            prices = await price_cache.get_many(self._symbols, PRIORITY_DASHBOARD) if self._symbols else {}
+            if not reloaded and self.snapshot is not None and prices == self._prices:
+                return
+
+            started = time.perf_counter()
+            self._prices = prices
+            self.snapshot = self._build(prices)
+            self.last_build_ms = (time.perf_counter() - started) * 1000
+
+    # ==================== BACKGROUND ====================
+
+    async def start(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # Sin nadie leyendo no se piden precios solo para la instantánea
+            if time.monotonic() - self._last_read > ALERT_SNAPSHOT_IDLE_SECONDS:
+                continue
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"❌ Error reconstruyendo instantánea de alertas: {e}")
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "version": self.version,
+            "built_at": snapshot.built_at if snapshot else None,
+            "alerts": len(snapshot.alerts) if snapshot else 0,
+            "active": len(snapshot.active) if snapshot else 0,
+            "total_in_db": snapshot.total if snapshot else 0,
+            "symbols": len(self._symbols),
+            "reloads": self.reloads,
+            "rows_computed": self.rows_computed,
+            "rows_reused": self.rows_reused,
+            "last_build_ms": round(self.last_build_ms, 2),
+            "interval_seconds": self.interval,
+            "reload_seconds": self.reload_seconds,
+            "history_limit": self.history_limit,
+            "idle": time.monotonic() - self._last_read > ALERT_SNAPSHOT_IDLE_SECONDS
+        }
+
+# Instancia global
+alert_snapshot = AlertSnapshotService()
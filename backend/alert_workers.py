@@ -0,0 +1,335 @@
+# backend/alert_workers.py - Evaluación de alertas repartida por símbolo entre varios procesos
+"""
+Proceso separado (como scanner.py) que reparte los símbolos con alertas
+PENDING entre N workers mediante hashing consistente. Cada worker mantiene
+su propio WebSocket de precios y el índice de sus alertas; los cruces vuelven
+al proceso padre por una cola y es el padre quien escribe en Postgres y
+envía las notificaciones.
+
+Uso:
+
+    ALERT_EVALUATION_MODE=sharded uvicorn main:app ...   # la API no evalúa
+    python alert_workers.py --workers 4
+
+Los cambios de alertas hechos por la API llegan vía Redis (REDIS_URL); sin
+Redis se recogen en la reconciliación periódica (--reconcile-interval).
+
+Solo evalúa el coordinador que tiene el lock de líder (leader_election.py);
+si lo pierde termina junto con sus workers y otro toma el relevo.
+"""
+import argparse
+import asyncio
+import hashlib
+import multiprocessing as mp
+import os
+import queue
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+# inline: la API evalúa las alertas | sharded: las evalúa este proceso aparte
+ALERT_EVALUATION_MODE = os.getenv("ALERT_EVALUATION_MODE", "inline").lower()
+# Nodos virtuales por worker en el anillo de hashing
+VIRTUAL_NODES = 64
+WORKER_STATS_INTERVAL = 10
+# Sin stream sano, el worker consulta por REST con esta cadencia
+REST_FALLBACK_INTERVAL = 30
+# Cadencia con la que el worker envía al padre sus cambios de proximidad
+NEAR_STATE_REPORT_INTERVAL = 2
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """Hashing consistente: cambiar el número de workers solo mueve ~1/N de los símbolos"""
+
+    def __init__(self, nodes: List[int], virtual_nodes: int = VIRTUAL_NODES):
+        points = sorted((_hash(f"worker-{node}#{v}"), node) for node in nodes for v in range(virtual_nodes))
+        self._keys = [p[0] for p in points]
+        self._nodes = [p[1] for p in points]
+
+    def owner(self, symbol: str) -> int:
+        i = bisect_right(self._keys, _hash(symbol)) % len(self._keys)
+        return self._nodes[i]
+
+# ==================== WORKER ====================
+
+def _worker_main(worker_id: int, commands: mp.Queue, results: mp.Queue):
+    """Punto de entrada de cada proceso worker"""
+    asyncio.run(_worker_loop(worker_id, commands, results))
+
+async def _worker_loop(worker_id: int, commands: mp.Queue, results: mp.Queue):
+    from alert_registry import AlertRegistry
+    from binance_scheduler import PRIORITY_ALERTS
+    from price_cache import price_cache
+    from price_stream import PriceStreamEngine
+
+    class ShardEngine(PriceStreamEngine):
+        """Motor de precios que informa de los cruces al padre en lugar de escribir en la BD"""
+
+        def __init__(self, registry: AlertRegistry):
+            super().__init__(registry=registry)
+            self.awaiting: Dict[int, object] = {}
+
+        async def _commit_triggers(self, batch):
+            self.awaiting.update((alert_id, record) for alert_id, (record, _) in batch.items())
+            results.put(("triggered", worker_id, [(alert_id, price) for alert_id, (_, price) in batch.items()]))
+
+        async def _notify_near(self, record, price: float, progress: float):
+            # El estado va delante del aviso para que el padre lo persista con él
+            report_near_states()
+            results.put(("near", worker_id, record.id, price, progress))
+
+    registry = AlertRegistry()
+    engine = ShardEngine(registry)
+    loop = asyncio.get_running_loop()
+
+    def report_near_states():
+        changes = registry.drain_near_changes()
+        if changes:
+            results.put(("near_states", worker_id, changes))
+
+    async def read_commands():
+        while True:
+            command = await loop.run_in_executor(None, commands.get)
+            kind = command[0]
+            if kind == "put":
+                registry.put(command[1])
+            elif kind == "remove":
+                registry.remove(command[1])
+            elif kind == "resolved":
+                for alert_id in command[1]:
+                    record = engine.awaiting.pop(alert_id, None)
+                    if record is not None:
+                        registry.release(record, command[2])
+            elif kind == "config":
+                registry.near_cooldown_seconds = command[1]
+            elif kind == "stop":
+                return
+
+    async def rest_fallback():
+        # Respaldo REST del WebSocket, igual que monitor_alerts_background
+        while True:
+            await asyncio.sleep(REST_FALLBACK_INTERVAL)
+            symbols = registry.symbols()
+            if engine.is_healthy() or not symbols:
+                continue
+            try:
+                prices = await price_cache.get_many(symbols, PRIORITY_ALERTS)
+                for symbol, price in prices.items():
+                    # Ya registrado en el historial al leerlo de la caché/REST
+                    engine._on_tick(symbol, price, history=False)
+            except Exception as e:
+                print(f"❌ Worker {worker_id}: error en respaldo REST: {e}")
+
+    async def report_stats():
+        while True:
+            await asyncio.sleep(WORKER_STATS_INTERVAL)
+            results.put(("stats", worker_id, {**engine.stats(), "alerts": len(registry)}))
+
+    async def report_near():
+        # Las salidas de la banda no generan aviso; se envían en bloque
+        while True:
+            await asyncio.sleep(NEAR_STATE_REPORT_INTERVAL)
+            report_near_states()
+
+    engine.start()
+    tasks = [
+        asyncio.create_task(rest_fallback()),
+        asyncio.create_task(report_stats()),
+        asyncio.create_task(report_near())
+    ]
+    print(f"🧩 Worker {worker_id} iniciado (pid {os.getpid()})")
+    try:
+        await read_commands()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await engine.stop()
+
+# ==================== COORDINADOR ====================
+
+class ShardCoordinator:
+    """Proceso padre: reparte alertas, recoge cruces y aplica las transiciones en la BD"""
+
+    def __init__(self, workers: int, reconcile_interval: float):
+        self.workers = workers
+        self.reconcile_interval = reconcile_interval
+        self.ring = HashRing(list(range(workers)))
+        self._ctx = mp.get_context("spawn")
+        self.results: mp.Queue = self._ctx.Queue()
+        self.commands: Dict[int, mp.Queue] = {}
+        self.processes: Dict[int, mp.Process] = {}
+        self.worker_stats: Dict[int, dict] = {}
+        # alert_id -> worker que la tiene asignada
+        self.owners: Dict[int, int] = {}
+        self.triggered = 0
+        self.restarts = 0
+
+    def _spawn(self, worker_id: int):
+        commands = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main, args=(worker_id, commands, self.results),
+            name=f"alert-worker-{worker_id}", daemon=True
+        )
+        process.start()
+        self.commands[worker_id] = commands
+        self.processes[worker_id] = process
+
+    def _assign(self, worker_id: Optional[int] = None):
+        """Enviar a los workers (o a uno) las alertas que les corresponden"""
+        from alert_registry import alert_registry
+        for wid in ([worker_id] if worker_id is not None else self.commands):
+            self.commands[wid].put(("config", alert_registry.near_cooldown_seconds))
+        for record in alert_registry.records():
+            owner = self.ring.owner(record.symbol)
+            if worker_id is None or owner == worker_id:
+                self.owners[record.id] = owner
+                self.commands[owner].put(("put", record))
+
+    def _route(self, alert_id: int, record):
+        """Listener del registro: reenviar cada cambio al worker dueño del símbolo"""
+        previous = self.owners.pop(alert_id, None)
+        owner = self.ring.owner(record.symbol) if record is not None else None
+        if previous is not None and previous != owner:
+            # Borrada o movida a un símbolo de otro worker
+            self.commands[previous].put(("remove", alert_id))
+        if owner is not None:
+            self.owners[alert_id] = owner
+            self.commands[owner].put(("put", record))
+
+    async def run(self):
+        import crud
+        from alert_registry import alert_registry
+        from database import AsyncSessionLocal
+        from expiry_scheduler import expiry_scheduler
+        from leader_election import leader_election
+        from shared_state import shared_state
+        from symbol_registry import symbol_registry
+
+        # Un solo coordinador activo; los demás esperan al relevo
+        await leader_election.start()
+        await leader_election.wait_until_leader()
+
+        alert_registry.reconcile_interval = self.reconcile_interval
+        await shared_state.connect()
+        await shared_state.set_leader(True)
+        await symbol_registry.refresh()
+        shared_state.on_alerts_changed(alert_registry.refresh_alert)
+        await alert_registry.start()
+        await expiry_scheduler.start()
+
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        self._assign()
+        alert_registry.on_alert_changed(self._route)
+        print(f"🚀 Evaluación repartida en {self.workers} workers ({len(alert_registry)} alertas)")
+
+        loop = asyncio.get_running_loop()
+        supervisor = asyncio.create_task(self._supervise())
+        try:
+            while leader_election.is_leader:
+                try:
+                    message = await loop.run_in_executor(None, self.results.get, True, 1.0)
+                except queue.Empty:
+                    continue
+                # Vaciar lo que haya en cola para aplicar los cruces juntos
+                messages = [message]
+                while True:
+                    try:
+                        messages.append(self.results.get_nowait())
+                    except queue.Empty:
+                        break
+                await self._handle(messages, crud, alert_registry, AsyncSessionLocal)
+        finally:
+            supervisor.cancel()
+            await self.stop()
+            await expiry_scheduler.stop()
+            await alert_registry.stop()
+            await shared_state.close()
+            await leader_election.stop()
+
+    async def _handle(self, messages, crud, alert_registry, AsyncSessionLocal):
+        import models
+
+        triggered: Dict[int, float] = {}
+        triggered_by: Dict[int, List[int]] = {}
+        near = []
+        for message in messages:
+            kind, worker_id = message[0], message[1]
+            if kind == "stats":
+                self.worker_stats[worker_id] = {**message[2], "reported_at": time.time()}
+            elif kind == "triggered":
+                for alert_id, price in message[2]:
+                    triggered[alert_id] = price
+                    triggered_by.setdefault(worker_id, []).append(alert_id)
+            elif kind == "near":
+                near.append(message[2:])
+            elif kind == "near_states":
+                # Se persisten con el siguiente aviso o en el flush periódico del registro
+                alert_registry.apply_near_changes(message[2])
+
+        if not triggered and not near:
+            return
+
+        db = AsyncSessionLocal()
+        try:
+            applied = {}
+            if triggered:
+                # Un UPDATE ... RETURNING para todos los cruces recibidos de todos los workers
+                resolved = False
+                try:
+                    applied = await crud.apply_alert_transitions(db, {models.AlertStatusEnum.TRIGGERED: triggered})
+                    resolved = True
+                except Exception as e:
+                    print(f"❌ Error disparando {len(triggered)} alerta(s): {e}")
+                finally:
+                    for worker_id, alert_ids in triggered_by.items():
+                        self.commands[worker_id].put(("resolved", alert_ids, resolved))
+                if resolved:
+                    for alert_id in triggered:
+                        alert_registry.remove(alert_id)
+                self.triggered += await crud.notify_transitions(db, applied)
+
+            for alert_id, price, progress in near:
+                record = alert_registry.get(alert_id)
+                if record is not None:
+                    await crud.notify_price_near_target(db, record, price, progress)
+            if near:
+                await alert_registry.flush_near_states(db)
+        except Exception as e:
+            print(f"❌ Error procesando resultados de los workers: {e}")
+        finally:
+            await db.close()
+
+    async def _supervise(self):
+        """Reiniciar workers caídos y reenviarles sus alertas"""
+        while True:
+            await asyncio.sleep(5)
+            for worker_id, process in list(self.processes.items()):
+                if not process.is_alive():
+                    print(f"⚠️ Worker {worker_id} terminó (exit {process.exitcode}), reiniciando...")
+                    self.restarts += 1
+                    self._spawn(worker_id)
+                    self._assign(worker_id)
+
+    async def stop(self):
+        for commands in self.commands.values():
+            commands.put(("stop",))
+        for process in self.processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Evaluación de alertas repartida por símbolo")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ALERT_WORKERS", str(os.cpu_count() or 2))))
+    parser.add_argument("--reconcile-interval", type=float, default=float(os.getenv("ALERT_RECONCILE_INTERVAL", "60")))
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        asyncio.run(ShardCoordinator(args.workers, args.reconcile_interval).run())
+    except KeyboardInterrupt:
+        pass
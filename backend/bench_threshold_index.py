@@ -0,0 +1,93 @@
+# backend/bench_threshold_index.py - Coste por tick del índice de targets frente al recorrido lineal
+"""
+Uso:
+
+    python bench_threshold_index.py --sizes 1000 10000 100000 --ticks 2000
+
+Para cada tamaño se reparten N alertas PENDING de un símbolo alrededor del
+precio y se aplican ticks que cruzan un número fijo de targets (--crossed).
+El índice solo toca las alertas cruzadas, así que su coste por tick debe
+mantenerse casi constante al crecer N; el recorrido lineal crece con N.
+"""
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+import models
+from threshold_index import ThresholdIndex
+
+SYMBOL = "BTCUSDT"
+BASE_PRICE = 50000.0
+
+def build_population(n: int, seed: int) -> List[Tuple[int, models.AlertTypeEnum, float]]:
+    rng = random.Random(seed)
+    alerts = []
+    for alert_id in range(n):
+        if alert_id % 2:
+            alerts.append((alert_id, models.AlertTypeEnum.LONG, BASE_PRICE * rng.uniform(1.10, 2.0)))
+        else:
+            alerts.append((alert_id, models.AlertTypeEnum.SHORT, BASE_PRICE * rng.uniform(0.5, 0.90)))
+    return alerts
+
+def bench_index(alerts, ticks: int, crossed: int) -> float:
+    index = ThresholdIndex()
+    for alert_id, alert_type, target in alerts:
+        index.add(alert_id, SYMBOL, alert_type, target)
+
+    next_id = len(alerts)
+    elapsed = 0.0
+    for tick in range(ticks):
+        # Alertas nuevas justo por debajo del precio que el tick cruzará
+        for _ in range(crossed):
+            index.add(next_id, SYMBOL, models.AlertTypeEnum.LONG, BASE_PRICE * 0.999)
+            next_id += 1
+        price = BASE_PRICE + (tick % 7)
+        start = time.perf_counter()
+        hits = index.pop_crossed(SYMBOL, price)
+        index.near(SYMBOL, price)
+        elapsed += time.perf_counter() - start
+        assert len(hits) == crossed
+    return elapsed / ticks
+
+def bench_linear(alerts, ticks: int, crossed: int) -> float:
+    pending = list(alerts)
+    next_id = len(alerts)
+    elapsed = 0.0
+    for tick in range(ticks):
+        for _ in range(crossed):
+            pending.append((next_id, models.AlertTypeEnum.LONG, BASE_PRICE * 0.999))
+            next_id += 1
+        price = BASE_PRICE + (tick % 7)
+        start = time.perf_counter()
+        keep = []
+        hits = 0
+        for alert in pending:
+            _, alert_type, target = alert
+            if (price >= target) if alert_type == models.AlertTypeEnum.LONG else (price <= target):
+                hits += 1
+            else:
+                keep.append(alert)
+        pending = keep
+        elapsed += time.perf_counter() - start
+        assert hits == crossed
+    return elapsed / ticks
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del índice de targets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--crossed", type=int, default=2, help="alertas cruzadas por tick")
+    parser.add_argument("--linear-ticks", type=int, default=200, help="ticks para el recorrido lineal")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    print(f"{'alertas':>10} {'índice µs/tick':>16} {'lineal µs/tick':>16} {'speedup':>9}")
+    for n in args.sizes:
+        alerts = build_population(n, args.seed)
+        indexed = bench_index(alerts, args.ticks, args.crossed)
+        linear = bench_linear(alerts, args.linear_ticks, args.crossed)
+        print(f"{n:>10} {indexed * 1e6:>16.2f} {linear * 1e6:>16.2f} {linear / indexed:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
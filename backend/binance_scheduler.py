@@ -0,0 +1,213 @@
+# backend/binance_scheduler.py - Presupuesto de request weight de Binance para todas las llamadas salientes
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from http_clients import http_pool
+from upstreams import BINANCE_SPOT_URL, BINANCE_FUTURES_URL, BINANCE_FUTURES_TESTNET_URL
+
+# Prioridades (menor = más importante)
+PRIORITY_ALERTS = 0
+PRIORITY_DASHBOARD = 1
+PRIORITY_TEST = 2
+PRIORITY_NAMES = {PRIORITY_ALERTS: "alerts", PRIORITY_DASHBOARD: "dashboard", PRIORITY_TEST: "test"}
+
+# Límite de weight por minuto e IP de cada host
+WEIGHT_LIMITS = {
+    BINANCE_SPOT_URL: int(os.getenv("BINANCE_SPOT_WEIGHT_LIMIT", "6000")),
+    BINANCE_FUTURES_URL: int(os.getenv("BINANCE_FUTURES_WEIGHT_LIMIT", "2400")),
+    BINANCE_FUTURES_TESTNET_URL: int(os.getenv("BINANCE_FUTURES_WEIGHT_LIMIT", "2400")),
+}
+DEFAULT_WEIGHT_LIMIT = 1200
+
+# Fracción del límite que puede consumir cada prioridad; las bajas se frenan antes
+PRIORITY_HEADROOM = {PRIORITY_ALERTS: 0.95, PRIORITY_DASHBOARD: 0.80, PRIORITY_TEST: 0.60}
+# Espera máxima en cola antes de descartar (None = esperar lo necesario)
+PRIORITY_MAX_WAIT = {PRIORITY_ALERTS: None, PRIORITY_DASHBOARD: 5.0, PRIORITY_TEST: 0.0}
+# Peticiones en cola a partir de las cuales se descarta directamente
+PRIORITY_MAX_QUEUE = {PRIORITY_ALERTS: 1000, PRIORITY_DASHBOARD: 50, PRIORITY_TEST: 5}
+
+# Weight de cada endpoint (documentación de Binance)
+ENDPOINT_WEIGHTS = {
+    "/api/v3/ticker/price": 2,
+    "/fapi/v1/ticker/price": 1,
+    "/fapi/v1/exchangeInfo": 1,
+    "/fapi/v2/account": 5,
+    "/fapi/v2/positionRisk": 5,
+    "/fapi/v1/openOrders": 1,
+}
+
+class BinanceRateLimitError(Exception):
+    """Petición descartada para no superar el presupuesto de weight (o IP baneada)"""
+
+def endpoint_weight(path: str, params: Optional[dict] = None) -> int:
+    params = params or {}
+    if path == "/api/v3/ticker/price":
+        return 2 if "symbol" in params else 4
+    if path == "/fapi/v1/ticker/price":
+        return 1 if "symbol" in params else 2
+    if path == "/fapi/v1/openOrders":
+        return 1 if "symbol" in params else 40
+    return ENDPOINT_WEIGHTS.get(path, 1)
+
+class WeightBudget:
+    """Weight usado en el minuto actual de un host, según cabeceras y reservas en vuelo"""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.limit = WEIGHT_LIMITS.get(host, DEFAULT_WEIGHT_LIMIT)
+        self.used = 0
+        self.reserved = 0
+        self.window = self._current_window()
+        self.banned_until = 0.0
+        self.waiting: Dict[int, int] = {p: 0 for p in PRIORITY_NAMES}
+        self.sent: Dict[int, int] = {p: 0 for p in PRIORITY_NAMES}
+        self.shed: Dict[int, int] = {p: 0 for p in PRIORITY_NAMES}
+        self.rate_limited = 0
+        self.cond = asyncio.Condition()
+
+    @staticmethod
+    def _current_window() -> int:
+        return int(time.time() // 60)
+
+    def roll_window(self):
+        window = self._current_window()
+        if window != self.window:
+            self.window = window
+            self.used = 0
+
+    def seconds_to_reset(self) -> float:
+        now = time.time()
+        if self.banned_until > now:
+            return self.banned_until - now
+        return 60 - (now % 60) + 0.05
+
+    def can_send(self, weight: int, priority: int) -> bool:
+        if self.banned_until > time.time():
+            return False
+        if any(self.waiting[p] for p in self.waiting if p < priority):
+            return False
+        return self.used + self.reserved + weight <= self.limit * PRIORITY_HEADROOM[priority]
+
+class BinanceRequestScheduler:
+    """Ordena las peticiones a Binance por prioridad dentro del presupuesto de weight"""
+
+    def __init__(self):
+        self._budgets: Dict[str, WeightBudget] = {}
+
+    def _budget(self, url: str) -> WeightBudget:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        budget = self._budgets.get(host)
+        if budget is None:
+            budget = self._budgets[host] = WeightBudget(host)
+        return budget
+
+    async def request(self, method: str, url: str, priority: int = PRIORITY_DASHBOARD,
+                      weight: Optional[int] = None, **kwargs) -> httpx.Response:
+        parts = urlsplit(url)
+        if weight is None:
+            params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            params.update(kwargs.get("params") or {})
+            weight = endpoint_weight(parts.path, params)
+
+        budget = self._budget(url)
+        await self._acquire(budget, weight, priority)
+        try:
+            response = await http_pool.request(method, url, **kwargs)
+        except Exception:
+            await self._release(budget, weight, None)
+            raise
+        await self._release(budget, weight, response)
+        return response
+
+    async def get(self, url: str, priority: int = PRIORITY_DASHBOARD, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, priority=priority, **kwargs)
+
+    async def _acquire(self, budget: WeightBudget, weight: int, priority: int):
+        max_wait = PRIORITY_MAX_WAIT[priority]
+        async with budget.cond:
+            budget.roll_window()
+            if budget.can_send(weight, priority):
+                budget.reserved += weight
+                budget.sent[priority] += 1
+                return
+
+            if max_wait == 0 or budget.waiting[priority] >= PRIORITY_MAX_QUEUE[priority]:
+                budget.shed[priority] += 1
+                raise BinanceRateLimitError(
+                    f"Presupuesto de weight agotado en {budget.host} ({PRIORITY_NAMES[priority]})"
+                )
+
+            deadline = time.monotonic() + max_wait if max_wait is not None else None
+            budget.waiting[priority] += 1
+            try:
+                while True:
+                    timeout = budget.seconds_to_reset()
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            budget.shed[priority] += 1
+                            raise BinanceRateLimitError(
+                                f"Tiempo de espera agotado en cola de {budget.host} ({PRIORITY_NAMES[priority]})"
+                            )
+                        timeout = min(timeout, remaining)
+                    try:
+                        await asyncio.wait_for(budget.cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    budget.roll_window()
+                    # can_send ignora la propia prioridad al mirar quién espera
+                    budget.waiting[priority] -= 1
+                    ready = budget.can_send(weight, priority)
+                    budget.waiting[priority] += 1
+                    if ready:
+                        budget.reserved += weight
+                        budget.sent[priority] += 1
+                        return
+            finally:
+                budget.waiting[priority] -= 1
+                budget.cond.notify_all()
+
+    async def _release(self, budget: WeightBudget, weight: int, response: Optional[httpx.Response]):
+        async with budget.cond:
+            budget.reserved -= weight
+            budget.roll_window()
+            if response is not None:
+                used = response.headers.get("X-MBX-USED-WEIGHT-1M")
+                if used is not None:
+                    budget.used = int(used)
+                else:
+                    budget.used += weight
+
+                if response.status_code in (418, 429):
+                    budget.rate_limited += 1
+                    retry_after = float(response.headers.get("Retry-After", "60"))
+                    budget.banned_until = max(budget.banned_until, time.time() + retry_after)
+                    print(f"⛔ Binance {response.status_code} en {budget.host}: pausa de {retry_after:.0f}s")
+            budget.cond.notify_all()
+
+    def stats(self) -> dict:
+        now = time.time()
+        hosts = {}
+        for host, budget in self._budgets.items():
+            budget.roll_window()
+            hosts[host] = {
+                "used_weight_1m": budget.used,
+                "reserved_weight": budget.reserved,
+                "limit_1m": budget.limit,
+                "usage_percent": round((budget.used + budget.reserved) / budget.limit * 100, 1),
+                "banned_for_seconds": round(max(0.0, budget.banned_until - now), 1),
+                "rate_limited_responses": budget.rate_limited,
+                "queue_depth": {PRIORITY_NAMES[p]: n for p, n in budget.waiting.items()},
+                "sent": {PRIORITY_NAMES[p]: n for p, n in budget.sent.items()},
+                "shed": {PRIORITY_NAMES[p]: n for p, n in budget.shed.items()}
+            }
+        return {"hosts": hosts}
+
+# Instancia global
+binance_scheduler = BinanceRequestScheduler()
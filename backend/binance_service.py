@@ -1,5 +1,4 @@
 import os
-import aiohttp
 import asyncio
 import hmac
 import hashlib
@@ -8,6 +7,10 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
+from binance_scheduler import binance_scheduler, PRIORITY_DASHBOARD
+from upstreams import binance_futures_url
+from symbol_registry import symbol_registry, EXCHANGE_INFO_URL
+
 class BinanceFuturesService:
     def __init__(self, api_key: str = None, secret_key: str = None, testnet: bool = True):
         # Cargar desde variables de entorno si no se proporcionan
@@ -16,14 +19,14 @@ class BinanceFuturesService:
         self.testnet = testnet or os.getenv('BINANCE_TESTNET', 'true').lower() == 'true'
         
         # URLs para FUTURES
-        if self.testnet:
-            self.base_url = 'https://testnet.binancefuture.com'
-        else:
-            self.base_url = 'https://fapi.binance.com'
+        self.base_url = binance_futures_url(self.testnet)
             
         self.price_url = f'{self.base_url}/fapi/v1/ticker/price'
         self.exchange_info_url = f'{self.base_url}/fapi/v1/exchangeInfo'
         
+        # Prioridad de estas llamadas en el presupuesto de weight
+        self.priority = PRIORITY_DASHBOARD
+        
         # Símbolos excluidos
         self.excluded_symbols = ['ADA', 'ALGO', 'AAVE']
         
@@ -56,14 +59,12 @@ class BinanceFuturesService:
             url = f'{self.base_url}/fapi/v2/account?{query_string}&signature={signature}'
             headers = {'X-MBX-APIKEY': self.api_key}
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        error_text = await response.text()
-                        print(f'Binance API error {response.status}: {error_text}')
-                        return None
+            response = await binance_scheduler.get(url, priority=self.priority, headers=headers)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f'Binance API error {response.status_code}: {response.text}')
+                return None
         except Exception as e:
             print(f'Error obteniendo info de cuenta: {e}')
             return None
@@ -81,59 +82,62 @@ class BinanceFuturesService:
             url = f'{self.base_url}/fapi/v2/positionRisk?{query_string}&signature={signature}'
             headers = {'X-MBX-APIKEY': self.api_key}
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        positions = await response.json()
-                        return [pos for pos in positions if float(pos['positionAmt']) != 0]
-                    else:
-                        error_text = await response.text()
-                        print(f'Binance API error {response.status}: {error_text}')
-                        return []
+            response = await binance_scheduler.get(url, priority=self.priority, headers=headers)
+            if response.status_code == 200:
+                positions = response.json()
+                return [pos for pos in positions if float(pos['positionAmt']) != 0]
+            else:
+                print(f'Binance API error {response.status_code}: {response.text}')
+                return []
         except Exception as e:
             print(f'Error obteniendo posiciones: {e}')
             return []
 
     async def get_price(self, symbol: str):
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'{self.price_url}?symbol={symbol}') as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return float(data['price'])
-                    return None
+            response = await binance_scheduler.get(self.price_url, priority=self.priority, params={'symbol': symbol})
+            if response.status_code == 200:
+                data = response.json()
+                return float(data['price'])
+            return None
         except Exception as e:
             print(f'Error obteniendo precio para {symbol}: {e}')
             return None
 
     async def get_multiple_prices(self, symbols: List[str]):
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.price_url) as response:
-                    if response.status == 200:
-                        all_prices = await response.json()
-                        return {item['symbol']: float(item['price']) for item in all_prices if item['symbol'] in symbols}
-                    return {}
+            response = await binance_scheduler.get(self.price_url, priority=self.priority)
+            if response.status_code == 200:
+                all_prices = response.json()
+                return {item['symbol']: float(item['price']) for item in all_prices if item['symbol'] in symbols}
+            return {}
         except Exception as e:
             print(f'Error obteniendo precios múltiples: {e}')
             return {}
 
     async def get_futures_symbols(self):
+        if self.exchange_info_url == EXCHANGE_INFO_URL:
+            # Mismo exchangeInfo que el registro global: no volver a descargarlo
+            await symbol_registry.ensure_loaded()
+            return [
+                symbol for symbol in symbol_registry.perpetual_usdt()
+                if symbol_registry.get(symbol).base_asset not in self.excluded_symbols
+            ]
+        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.exchange_info_url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        symbols = []
-                        for symbol_info in data['symbols']:
-                            if (symbol_info['status'] == 'TRADING' and 
-                                symbol_info['contractType'] == 'PERPETUAL' and
-                                symbol_info['quoteAsset'] == 'USDT'):
-                                base_asset = symbol_info['baseAsset']
-                                if base_asset not in self.excluded_symbols:
-                                    symbols.append(symbol_info['symbol'])
-                        return sorted(symbols)
-                    return []
+            response = await binance_scheduler.get(self.exchange_info_url, priority=self.priority)
+            if response.status_code == 200:
+                data = response.json()
+                symbols = []
+                for symbol_info in data['symbols']:
+                    if (symbol_info['status'] == 'TRADING' and 
+                        symbol_info['contractType'] == 'PERPETUAL' and
+                        symbol_info['quoteAsset'] == 'USDT'):
+                        base_asset = symbol_info['baseAsset']
+                        if base_asset not in self.excluded_symbols:
+                            symbols.append(symbol_info['symbol'])
+                return sorted(symbols)
+            return []
         except Exception as e:
             print(f'Error obteniendo símbolos: {e}')
             return []
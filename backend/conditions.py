@@ -0,0 +1,249 @@
+# backend/conditions.py - Condiciones de alerta compiladas una vez a objetos predicado
+"""
+Formato JSON de ``alerts.condition`` (todas sobre el símbolo de la alerta):
+
+    {"type": "above", "price": 50000}
+    {"type": "below", "price": 48000}
+    {"type": "cross_up", "price": 50000}
+    {"type": "cross_down", "price": 48000}
+    {"type": "percent_move", "percent": 5, "window": 3600, "direction": "up"}
+    {"type": "range_break", "low": 48000, "high": 52000}
+    {"type": "all", "conditions": [...]}
+    {"type": "any", "conditions": [...]}
+
+``percent_move`` compara el precio con el mínimo (up), el máximo (down) o
+ambos (any) de los últimos ``window`` segundos del historial de ticks.
+Los cruces necesitan dos evaluaciones: el primer precio visto solo fija
+la referencia.
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from tick_history import tick_history
+
+MAX_CONDITION_DEPTH = 4
+MAX_CONDITION_NODES = 16
+MAX_WINDOW_SECONDS = 24 * 3600
+
+class ConditionError(ValueError):
+    """Condición JSON mal formada"""
+
+class EvalContext:
+    """Entradas de una evaluación: precio actual y extremos de ventana memorizados
+
+    Todas las alertas de un símbolo comparten el contexto del tick, así que cada
+    ventana se consulta una sola vez aunque la usen muchas condiciones.
+    """
+    __slots__ = ("symbol", "price", "now", "_extremes")
+
+    def __init__(self, symbol: str, price: float, now: Optional[float] = None):
+        self.symbol = symbol
+        self.price = price
+        self.now = now or time.time()
+        self._extremes: Dict[float, Optional[Tuple[float, float]]] = {}
+
+    def extremes(self, window: float) -> Optional[Tuple[float, float]]:
+        if window not in self._extremes:
+            self._extremes[window] = tick_history.extremes_since(self.symbol, self.now - window)
+        return self._extremes[window]
+
+# ==================== NODOS ====================
+
+class Node:
+    __slots__ = ()
+    # Coste relativo: en all/any se evalúan primero los nodos baratos
+    cost = 1
+
+    def test(self, ctx: EvalContext) -> bool:
+        raise NotImplementedError
+
+class Above(Node):
+    __slots__ = ("price",)
+
+    def __init__(self, price: float):
+        self.price = price
+
+    def test(self, ctx: EvalContext) -> bool:
+        return ctx.price >= self.price
+
+    def describe(self) -> str:
+        return f"precio ≥ {self.price:,.4f}"
+
+class Below(Node):
+    __slots__ = ("price",)
+
+    def __init__(self, price: float):
+        self.price = price
+
+    def test(self, ctx: EvalContext) -> bool:
+        return ctx.price <= self.price
+
+    def describe(self) -> str:
+        return f"precio ≤ {self.price:,.4f}"
+
+class Cross(Node):
+    """Cruce del nivel entre el precio anterior y el actual (con estado)"""
+    __slots__ = ("price", "up", "last")
+
+    def __init__(self, price: float, up: bool):
+        self.price = price
+        self.up = up
+        self.last: Optional[float] = None
+
+    def test(self, ctx: EvalContext) -> bool:
+        if self.last is None:
+            return False
+        if self.up:
+            return self.last < self.price <= ctx.price
+        return self.last > self.price >= ctx.price
+
+    def observe(self, price: float):
+        self.last = price
+
+    def describe(self) -> str:
+        return f"cruce {'al alza' if self.up else 'a la baja'} de {self.price:,.4f}"
+
+class PercentMove(Node):
+    __slots__ = ("ratio", "window", "direction")
+    cost = 3
+
+    def __init__(self, percent: float, window: float, direction: str):
+        self.ratio = percent / 100
+        self.window = window
+        self.direction = direction
+
+    def test(self, ctx: EvalContext) -> bool:
+        extremes = ctx.extremes(self.window)
+        if extremes is None:
+            return False
+        low, high = extremes
+        if self.direction != "down" and low > 0 and ctx.price >= low * (1 + self.ratio):
+            return True
+        if self.direction != "up" and ctx.price <= high * (1 - self.ratio):
+            return True
+        return False
+
+    def describe(self) -> str:
+        sign = {"up": "+", "down": "-", "any": "±"}[self.direction]
+        return f"{sign}{self.ratio * 100:g}% en {self.window:g}s"
+
+class RangeBreak(Node):
+    __slots__ = ("low", "high")
+
+    def __init__(self, low: float, high: float):
+        self.low = low
+        self.high = high
+
+    def test(self, ctx: EvalContext) -> bool:
+        return ctx.price >= self.high or ctx.price <= self.low
+
+    def describe(self) -> str:
+        return f"salida del rango {self.low:,.4f}-{self.high:,.4f}"
+
+class AllOf(Node):
+    __slots__ = ("children", "cost")
+
+    def __init__(self, children: List[Node]):
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.cost = sum(child.cost for child in children)
+
+    def test(self, ctx: EvalContext) -> bool:
+        for child in self.children:
+            if not child.test(ctx):
+                return False
+        return True
+
+    def describe(self) -> str:
+        return "(" + " Y ".join(child.describe() for child in self.children) + ")"
+
+class AnyOf(Node):
+    __slots__ = ("children", "cost")
+
+    def __init__(self, children: List[Node]):
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.cost = sum(child.cost for child in children)
+
+    def test(self, ctx: EvalContext) -> bool:
+        for child in self.children:
+            if child.test(ctx):
+                return True
+        return False
+
+    def describe(self) -> str:
+        return "(" + " O ".join(child.describe() for child in self.children) + ")"
+
+# ==================== COMPILACIÓN ====================
+
+class CompiledCondition:
+    """Árbol de predicados listo para evaluar; guarda el estado de los cruces"""
+    __slots__ = ("root", "stateful", "source")
+
+    def __init__(self, root: Node, stateful: List[Cross], source: dict):
+        self.root = root
+        self.stateful = stateful
+        self.source = source
+
+    def evaluate(self, ctx: EvalContext) -> bool:
+        matched = self.root.test(ctx)
+        # Con cortocircuito no todos los cruces se evalúan: su referencia se
+        # actualiza siempre para que el siguiente tick compare con el anterior
+        for node in self.stateful:
+            node.observe(ctx.price)
+        return matched
+
+    def describe(self) -> str:
+        text = self.root.describe()
+        return text[1:-1] if text.startswith("(") else text
+
+def _number(spec: dict, key: str) -> float:
+    value = spec.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ConditionError(f"'{key}' debe ser numérico en {spec.get('type')}")
+    if value <= 0:
+        raise ConditionError(f"'{key}' debe ser positivo en {spec.get('type')}")
+    return float(value)
+
+def _compile_node(spec: Any, depth: int, counter: List[int], stateful: List[Cross]) -> Node:
+    if not isinstance(spec, dict):
+        raise ConditionError("Cada condición debe ser un objeto JSON")
+    counter[0] += 1
+    if depth > MAX_CONDITION_DEPTH or counter[0] > MAX_CONDITION_NODES:
+        raise ConditionError("Condición demasiado grande")
+
+    kind = spec.get("type")
+    if kind == "above":
+        return Above(_number(spec, "price"))
+    if kind == "below":
+        return Below(_number(spec, "price"))
+    if kind in ("cross_up", "cross_down"):
+        node = Cross(_number(spec, "price"), kind == "cross_up")
+        stateful.append(node)
+        return node
+    if kind == "percent_move":
+        window = _number(spec, "window")
+        if window > MAX_WINDOW_SECONDS:
+            raise ConditionError(f"'window' no puede superar {MAX_WINDOW_SECONDS}s")
+        direction = spec.get("direction", "any")
+        if direction not in ("up", "down", "any"):
+            raise ConditionError("'direction' debe ser up, down o any")
+        return PercentMove(_number(spec, "percent"), window, direction)
+    if kind == "range_break":
+        low, high = _number(spec, "low"), _number(spec, "high")
+        if low >= high:
+            raise ConditionError("'low' debe ser menor que 'high'")
+        return RangeBreak(low, high)
+    if kind in ("all", "any"):
+        children = spec.get("conditions")
+        if not isinstance(children, list) or not children:
+            raise ConditionError(f"'{kind}' necesita una lista 'conditions' no vacía")
+        nodes = [_compile_node(child, depth + 1, counter, stateful) for child in children]
+        return AllOf(nodes) if kind == "all" else AnyOf(nodes)
+    raise ConditionError(f"Tipo de condición desconocido: {kind}")
+
+def compile_condition(spec: Optional[dict]) -> Optional[CompiledCondition]:
+    """Validar y compilar una condición JSON (None si la alerta es LONG/SHORT simple)"""
+    if spec is None:
+        return None
+    stateful: List[Cross] = []
+    root = _compile_node(spec, 1, [0], stateful)
+    return CompiledCondition(root, stateful, spec)
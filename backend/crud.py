@@ -1,17 +1,32 @@
 # backend/crud.py - VERSIÓN CORREGIDA Y COMPLETA
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select, update, delete, func, any_, bindparam, case, tuple_, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict
+from typing import Iterable, List, Optional, Dict, Tuple
 import models
 import schemas
-import httpx
+from price_cache import price_cache
+from http_clients import http_pool
+from symbol_registry import symbol_registry
+from tick_history import tick_history
+from alert_registry import alert_registry
+from alert_snapshot import alert_snapshot, serialize_alert, with_price
+from etags import change_counters
+from shared_state import shared_state
+from stream_hub import stream_hub
+from threshold_index import alert_progress as threshold_progress
+from conditions import compile_condition
+from database import AsyncSessionLocal
+from upstreams import BINANCE_SPOT_URL, binance_futures_url, telegram_url, discord_webhook_url
+from binance_scheduler import binance_scheduler, BinanceRateLimitError, PRIORITY_ALERTS, PRIORITY_DASHBOARD, PRIORITY_TEST
 import asyncio
-import aiohttp
+import base64
 from cryptography.fernet import Fernet
 import os
 import hmac
 import hashlib
+import json
 import time
 
 # Clave para encriptar API keys (generar una vez y guardar en .env)
@@ -37,23 +52,81 @@ def decrypt_api_key(encrypted_key: str) -> str:
 
 # ==================== ALERTS CRUD ====================
 
-def get_alert(db: Session, alert_id: int):
-    return db.query(models.Alert).filter(models.Alert.id == alert_id).first()
+async def get_alert(db: AsyncSession, alert_id: int):
+    return await db.get(models.Alert, alert_id)
 
-def get_alerts(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Alert).offset(skip).limit(limit).all()
+def encode_alert_cursor(alert) -> str:
+    """Cursor opaco con la clave de orden (created_at, id) de la última alerta de la página"""
+    raw = f"{alert.created_at.isoformat()}|{alert.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
-def get_active_alerts(db: Session):
-    return db.query(models.Alert).filter(
+def decode_alert_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverso de encode_alert_cursor; ValueError si el cursor no es válido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, alert_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(alert_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+async def get_alerts(db: AsyncSession, limit: int = 100, cursor: Optional[str] = None,
+                     statuses: Optional[List[models.AlertStatusEnum]] = None, symbol: Optional[str] = None,
+                     alert_type: Optional[models.AlertTypeEnum] = None, created_from: Optional[datetime] = None,
+                     created_to: Optional[datetime] = None) -> Tuple[List[models.Alert], Optional[str]]:
+    """Página de alertas por (created_at, id) descendente con paginación keyset
+
+    Cada página continúa con ``(created_at, id) < cursor`` sobre los índices
+    compuestos, así que la página N cuesta lo mismo que la primera. Devuelve las
+    alertas y el cursor de la siguiente página (None si no hay más).
+    """
+    query = select(models.Alert)
+    if statuses:
+        query = query.where(models.Alert.status.in_(statuses))
+    if symbol:
+        query = query.where(models.Alert.symbol == symbol)
+    if alert_type is not None:
+        query = query.where(models.Alert.alert_type == alert_type)
+    if created_from is not None:
+        query = query.where(models.Alert.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(models.Alert.created_at < created_to)
+    if cursor:
+        query = query.where(tuple_(models.Alert.created_at, models.Alert.id) < decode_alert_cursor(cursor))
+    # Una fila de más indica si hay página siguiente sin un COUNT aparte
+    query = query.order_by(desc(models.Alert.created_at), desc(models.Alert.id)).limit(limit + 1)
+
+    alerts = list((await db.execute(query)).scalars().all())
+    if len(alerts) > limit:
+        alerts = alerts[:limit]
+        return alerts, encode_alert_cursor(alerts[-1])
+    return alerts, None
+
+async def get_active_alerts(db: AsyncSession):
+    return (await db.execute(select(models.Alert).where(
         models.Alert.status == models.AlertStatusEnum.PENDING
-    ).all()
+    ))).scalars().all()
 
-def get_alerts_by_symbol(db: Session, symbol: str):
-    return db.query(models.Alert).filter(
+async def get_alerts_by_symbol(db: AsyncSession, symbol: str):
+    return (await db.execute(select(models.Alert).where(
         models.Alert.symbol == symbol
-    ).order_by(desc(models.Alert.created_at)).all()
+    ).order_by(desc(models.Alert.created_at)))).scalars().all()
+
+async def _alert_changed(db_alert=None, removed_ids: Iterable[int] = ()):
+    """Tras el commit: registro en memoria, instantánea, versión de los ETags y aviso
+    al resto de procesos (sus instantáneas y, en el líder, el registro evaluado)"""
+    changed = []
+    if db_alert is not None:
+        alert_registry.upsert(db_alert)
+        changed.append(db_alert.id)
+    for alert_id in removed_ids:
+        alert_registry.remove(alert_id)
+        changed.append(alert_id)
+    alert_snapshot.invalidate()
+    await change_counters.bump("alerts")
+    if changed:
+        await shared_state.publish_alerts_changed(*changed)
 
-def create_alert(db: Session, alert: schemas.AlertCreate):
+async def create_alert(db: AsyncSession, alert: schemas.AlertCreate):
     """Crear una nueva alerta"""
     # Convertir el tipo de alerta
     alert_type_enum = models.AlertTypeEnum.LONG if alert.alert_type.value == "LONG" else models.AlertTypeEnum.SHORT
@@ -63,170 +136,211 @@ def create_alert(db: Session, alert: schemas.AlertCreate):
         target_price=alert.target_price,
         alert_type=alert_type_enum,
         notes=alert.notes,
+        expiry_hours=alert.expiry_hours,
+        condition=alert.condition,
         status=models.AlertStatusEnum.PENDING,
         created_at=datetime.now(),
         trade_id=getattr(alert, 'trade_id', None)
     )
     db.add(db_alert)
-    db.commit()
-    db.refresh(db_alert)
+    await db.commit()
+    await db.refresh(db_alert)
+    await _alert_changed(db_alert)
     return db_alert
 
-def update_alert(db: Session, alert_id: int, alert: schemas.AlertCreate):
+async def update_alert(db: AsyncSession, alert_id: int, alert: schemas.AlertCreate):
     """Actualizar una alerta existente"""
     try:
-        db_alert = db.query(models.Alert).filter(models.Alert.id == alert_id).first()
+        db_alert = await get_alert(db, alert_id)
         if db_alert:
             # Convertir el tipo de alerta
             alert_type_enum = models.AlertTypeEnum.LONG if alert.alert_type.value == "LONG" else models.AlertTypeEnum.SHORT
             
+            if (db_alert.symbol, db_alert.target_price, db_alert.alert_type, db_alert.condition) != \
+                    (alert.symbol, alert.target_price, alert_type_enum, alert.condition):
+                # Nuevo objetivo: la histéresis y el cooldown de proximidad empiezan de cero
+                db_alert.near_state = False
+                db_alert.near_notified_at = None
             db_alert.symbol = alert.symbol
             db_alert.target_price = alert.target_price
             db_alert.alert_type = alert_type_enum
             db_alert.notes = alert.notes
+            db_alert.expiry_hours = alert.expiry_hours
+            db_alert.condition = alert.condition
             db_alert.updated_at = datetime.now()
             
-            db.commit()
-            db.refresh(db_alert)
+            await db.commit()
+            await db.refresh(db_alert)
+            await _alert_changed(db_alert)
             return db_alert
         return None
     except Exception as e:
         print(f"Error en update_alert: {e}")
-        db.rollback()
+        await db.rollback()
         return None
 
-def delete_alert(db: Session, alert_id: int):
-    db_alert = get_alert(db, alert_id)
+async def delete_alert(db: AsyncSession, alert_id: int):
+    db_alert = await get_alert(db, alert_id)
     if db_alert:
-        db.delete(db_alert)
-        db.commit()
+        await db.delete(db_alert)
+        await db.commit()
+        await _alert_changed(removed_ids=[alert_id])
         return True
     return False
 
-def get_triggered_alerts(db: Session):
-    return db.query(models.Alert).filter(
-        and_(
-            models.Alert.status == models.AlertStatusEnum.TRIGGERED,
-            models.Alert.triggered_at >= datetime.now() - timedelta(minutes=10)
-        )
-    ).all()
+async def get_triggered_alerts(db: AsyncSession):
+    return (await db.execute(select(models.Alert).where(
+        models.Alert.status == models.AlertStatusEnum.TRIGGERED,
+        models.Alert.triggered_at >= datetime.now() - timedelta(minutes=10)
+    ))).scalars().all()
+
+async def get_expired_alerts(db: AsyncSession):
+    """Alertas PENDING cuyo created_at + expiry_hours (o el de la configuración) ya pasó"""
+    config = await get_config(db)
+    ttl_hours = func.coalesce(models.Alert.expiry_hours, config.default_expiry_hours)
+    return (await db.execute(select(models.Alert).where(
+        models.Alert.status == models.AlertStatusEnum.PENDING,
+        ttl_hours > 0,
+        models.Alert.created_at + func.make_interval(0, 0, 0, 0, ttl_hours) <= datetime.now()
+    ))).scalars().all()
+
+async def expire_alerts(db: AsyncSession, alert_ids: List[int]) -> List[models.Alert]:
+    """Pasar a EXPIRED en bloque y, si auto_delete_expired, borrarlas después
+
+    Devuelve las alertas que realmente caducaron (seguían PENDING).
+    """
+    applied = await apply_alert_transitions(db, {models.AlertStatusEnum.EXPIRED: dict.fromkeys(alert_ids)})
+    expired = applied.get(models.AlertStatusEnum.EXPIRED, [])
+    if expired and (await get_config(db)).auto_delete_expired:
+        try:
+            await db.execute(delete(models.Alert).where(models.Alert.id.in_([a.id for a in expired])))
+            await db.commit()
+            await _alert_changed(removed_ids=[a.id for a in expired])
+        except Exception:
+            # Quedan como EXPIRED; el borrado se reintenta con el siguiente lote
+            await db.rollback()
+            raise
+    return expired
 
 # ==================== CONFIG CRUD ====================
 
-def get_config(db: Session) -> models.Config:
+async def get_config(db: AsyncSession) -> models.Config:
     """Obtener configuración actual del sistema"""
-    config = db.query(models.Config).first()
+    config = (await db.execute(select(models.Config).limit(1))).scalars().first()
     if not config:
         # Crear configuración por defecto
         config = models.Config()
         db.add(config)
-        db.commit()
-        db.refresh(config)
+        await db.commit()
+        await db.refresh(config)
     return config
 
-def update_config(db: Session, config_update: schemas.ConfigUpdate) -> models.Config:
+async def update_config(db: AsyncSession, config_update: schemas.ConfigUpdate) -> models.Config:
     """Actualizar configuración del sistema"""
     try:
-        config = get_config(db)
-        
-        # Actualizar Binance
-        if config_update.binance:
-            if config_update.binance.api_key:
-                config.binance_api_key = encrypt_api_key(config_update.binance.api_key)
-            if config_update.binance.secret_key:
-                config.binance_secret_key = encrypt_api_key(config_update.binance.secret_key)
-            config.use_testnet = config_update.binance.use_testnet
-        
-        # Actualizar Telegram
-        if config_update.telegram:
-            config.telegram_bot_token = config_update.telegram.bot_token
-            config.telegram_chat_id = config_update.telegram.chat_id
-        
-        # Actualizar Discord
-        if config_update.discord:
-            config.discord_webhook_url = config_update.discord.webhook_url
-        
-        # Actualizar Trading
-        if config_update.trading:
-            config.max_positions = config_update.trading.max_positions
-            config.max_daily_loss = config_update.trading.max_daily_loss
-            config.auto_close_profit = config_update.trading.auto_close_profit
-            config.enable_anti_greed = config_update.trading.enable_anti_greed
-            config.enable_post_tp1_lock = config_update.trading.enable_post_tp1_lock
-            config.enable_psychological_alerts = config_update.trading.enable_psychological_alerts
-            config.enable_sound_notifications = config_update.trading.enable_sound_notifications
-        
-        # Actualizar Alertas
-        if config_update.alerts:
-            config.default_expiry_hours = config_update.alerts.default_expiry_hours
-            config.auto_delete_expired = config_update.alerts.auto_delete_expired
-            config.snooze_duration_minutes = config_update.alerts.snooze_duration_minutes
-            config.notify_on_trigger = config_update.alerts.notify_on_trigger
-            config.notify_on_near_price = config_update.alerts.notify_on_near_price
-            config.notify_on_expiry = config_update.alerts.notify_on_expiry
-            config.notify_on_position_detected = config_update.alerts.notify_on_position_detected
-        
-        # Actualizar Apariencia
-        if config_update.appearance:
-            config.theme = config_update.appearance.theme
-            config.animations = config_update.appearance.animations
-            config.sounds_enabled = config_update.appearance.sounds_enabled
-            config.number_format = config_update.appearance.number_format
-            config.timezone = config_update.appearance.timezone
-        
-        config.updated_at = datetime.now()
-        db.commit()
-        db.refresh(config)
+        config = await get_config(db)
+        _apply_config_update(config, config_update)
+        await db.commit()
+        await db.refresh(config)
+        await change_counters.bump("config")
         
         return config
     except Exception as e:
         print(f"Error updating config: {e}")
-        db.rollback()
+        await db.rollback()
         raise
 
+def _apply_config_update(config: models.Config, config_update: schemas.ConfigUpdate):
+    # Actualizar Binance
+    if config_update.binance:
+        if config_update.binance.api_key:
+            config.binance_api_key = encrypt_api_key(config_update.binance.api_key)
+        if config_update.binance.secret_key:
+            config.binance_secret_key = encrypt_api_key(config_update.binance.secret_key)
+        config.use_testnet = config_update.binance.use_testnet
+    
+    # Actualizar Telegram
+    if config_update.telegram:
+        config.telegram_bot_token = config_update.telegram.bot_token
+        config.telegram_chat_id = config_update.telegram.chat_id
+    
+    # Actualizar Discord
+    if config_update.discord:
+        config.discord_webhook_url = config_update.discord.webhook_url
+    
+    # Actualizar Trading
+    if config_update.trading:
+        config.max_positions = config_update.trading.max_positions
+        config.max_daily_loss = config_update.trading.max_daily_loss
+        config.auto_close_profit = config_update.trading.auto_close_profit
+        config.enable_anti_greed = config_update.trading.enable_anti_greed
+        config.enable_post_tp1_lock = config_update.trading.enable_post_tp1_lock
+        config.enable_psychological_alerts = config_update.trading.enable_psychological_alerts
+        config.enable_sound_notifications = config_update.trading.enable_sound_notifications
+    
+    # Actualizar Alertas
+    if config_update.alerts:
+        config.default_expiry_hours = config_update.alerts.default_expiry_hours
+        config.auto_delete_expired = config_update.alerts.auto_delete_expired
+        config.snooze_duration_minutes = config_update.alerts.snooze_duration_minutes
+        config.notify_on_trigger = config_update.alerts.notify_on_trigger
+        config.notify_on_near_price = config_update.alerts.notify_on_near_price
+        config.notify_on_expiry = config_update.alerts.notify_on_expiry
+        config.notify_on_position_detected = config_update.alerts.notify_on_position_detected
+    
+    # Actualizar Apariencia
+    if config_update.appearance:
+        config.theme = config_update.appearance.theme
+        config.animations = config_update.appearance.animations
+        config.sounds_enabled = config_update.appearance.sounds_enabled
+        config.number_format = config_update.appearance.number_format
+        config.timezone = config_update.appearance.timezone
+    
+    config.updated_at = datetime.now()
+
 # ==================== BINANCE API FUNCTIONS ====================
 
-async def get_binance_price(symbol: str) -> float:
-    """Obtener precio de un solo símbolo desde SPOT"""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}",
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return float(data['price'])
-            else:
-                print(f"Error API Binance para {symbol}: {response.status_code}")
-                return 0.0
-    except Exception as e:
-        print(f"Error obteniendo precio de {symbol}: {e}")
-        return 0.0
+async def get_binance_price(symbol: str, priority: int = PRIORITY_DASHBOARD) -> float:
+    """Obtener precio de un solo símbolo (vía caché de precios)"""
+    return await price_cache.get(symbol, priority)
+
+async def get_multiple_prices(symbols: List[str], priority: int = PRIORITY_DASHBOARD) -> Dict[str, float]:
+    """Obtener precios de múltiples símbolos (vía caché de precios)"""
+    if not symbols:
+        return {}
+    return await price_cache.get_many(symbols, priority)
 
-async def get_multiple_prices(symbols: List[str]) -> Dict[str, float]:
-    """Obtener precios de múltiples símbolos"""
+# Máximo de peticiones individuales simultáneas cuando fallan las peticiones en lote
+PRICE_FALLBACK_CONCURRENCY = 5
+
+async def fetch_binance_prices(symbols: List[str], priority: int = PRIORITY_DASHBOARD) -> Dict[str, float]:
+    """Obtener precios de múltiples símbolos desde SPOT (usado por la caché)
+
+    Una sola petición ``symbols=[...]``; si Binance la rechaza (p.ej. un símbolo
+    inválido invalida el lote) se usa el endpoint de todos los tickers. Solo si
+    ambas fallan se pide símbolo a símbolo, con concurrencia acotada.
+    """
     try:
         if not symbols:
             return {}
         
-        prices = {}
-        async with httpx.AsyncClient() as client:
-            for symbol in symbols:
-                try:
-                    response = await client.get(
-                        f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}",
-                        timeout=5.0
-                    )
-                    if response.status_code == 200:
-                        data = response.json()
-                        prices[symbol] = float(data['price'])
-                    else:
-                        print(f"Error para {symbol}: {response.status_code}")
-                        prices[symbol] = 0.0
-                except Exception as e:
-                    print(f"Error individual para {symbol}: {e}")
-                    prices[symbol] = 0.0
+        symbols = list(dict.fromkeys(symbols))
+        
+        batch = await _fetch_ticker_batch(symbols, priority)
+        if batch is None:
+            batch = await _fetch_ticker_batch(None, priority)
+        
+        if batch is not None:
+            # Lo que no viene en la lista completa no existe en SPOT
+            prices = {symbol: batch.get(symbol, 0.0) for symbol in symbols}
+        else:
+            semaphore = asyncio.Semaphore(PRICE_FALLBACK_CONCURRENCY)
+            
+            async def fetch_one(symbol: str):
+                async with semaphore:
+                    return symbol, await _fetch_ticker_single(symbol, priority)
+            
+            prices = dict(await asyncio.gather(*[fetch_one(s) for s in symbols]))
         
         print(f"✅ Precios obtenidos exitosamente: {len(prices)} símbolos")
         return prices
@@ -235,94 +349,77 @@ async def get_multiple_prices(symbols: List[str]) -> Dict[str, float]:
         print(f"Error obteniendo precios múltiples: {e}")
         return {}
 
-async def get_supported_futures_symbols() -> List[str]:
-    """Obtener símbolos soportados en FUTURES"""
+async def _fetch_ticker_batch(symbols: Optional[List[str]], priority: int) -> Optional[Dict[str, float]]:
+    """GET /api/v3/ticker/price con ``symbols=[...]`` (o todos los tickers si symbols es None)"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get("https://fapi.binance.com/fapi/v1/exchangeInfo", timeout=10.0)
-            if response.status_code == 200:
-                data = response.json()
-                symbols = [s['symbol'] for s in data['symbols'] if s['status'] == 'TRADING' and s['symbol'].endswith('USDT')]
-                
-                # Filtrar solo los más populares para trading de futuros
-                popular_futures = [
-                    'BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'XRPUSDT', 'SOLUSDT',
-                    'ADAUSDT', 'DOGEUSDT', 'DOTUSDT', 'AVAXUSDT', 'MATICUSDT',
-                    'LTCUSDT', 'LINKUSDT', 'ATOMUSDT', 'UNIUSDT', 'ETCUSDT',
-                    'FILUSDT', 'AAVEUSDT', 'ALGOUSDT', 'SANDUSDT', 'MANAUSDT',
-                    'APTUSDT', 'OPUSDT', 'ARBUSDT', 'INJUSDT', 'SUIUSDT',
-                    'SHIBUSDT', 'TRXUSDT', 'NEARUSDT', 'FTMUSDT', 'ICPUSDT'
-                ]
-                
-                # Retornar solo los que existen en futures
-                available_symbols = [s for s in popular_futures if s in symbols]
-                return available_symbols
+        params = {"symbols": json.dumps(symbols, separators=(",", ":"))} if symbols else None
+        response = await binance_scheduler.get(
+            f"{BINANCE_SPOT_URL}/api/v3/ticker/price",
+            priority=priority,
+            params=params,
+            timeout=5.0
+        )
+        if response.status_code == 200:
+            return {item['symbol']: float(item['price']) for item in response.json()}
+        print(f"Error en lote de precios ({len(symbols) if symbols else 'todos'}): {response.status_code}")
+    except BinanceRateLimitError:
+        raise
     except Exception as e:
-        print(f"Error obteniendo símbolos de futures: {e}")
-    
-    # Fallback lista
-    return [
-        'BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'XRPUSDT', 'SOLUSDT',
-        'ADAUSDT', 'DOGEUSDT', 'AVAXUSDT', 'LTCUSDT', 'LINKUSDT',
-        'MATICUSDT', 'DOTUSDT', 'ATOMUSDT', 'UNIUSDT', 'ETCUSDT'
-    ]
+        print(f"Error en lote de precios: {e}")
+    return None
+
+async def _fetch_ticker_single(symbol: str, priority: int) -> float:
+    try:
+        response = await binance_scheduler.get(
+            f"{BINANCE_SPOT_URL}/api/v3/ticker/price",
+            priority=priority,
+            params={"symbol": symbol},
+            timeout=5.0
+        )
+        if response.status_code == 200:
+            return float(response.json()['price'])
+        print(f"Error para {symbol}: {response.status_code}")
+    except BinanceRateLimitError:
+        raise
+    except Exception as e:
+        print(f"Error individual para {symbol}: {e}")
+    return 0.0
+
+async def get_supported_futures_symbols() -> List[str]:
+    """Obtener símbolos soportados en FUTURES (registro en memoria)"""
+    await symbol_registry.ensure_loaded()
+    return list(symbol_registry.supported_list)
 
 async def enrich_alerts_with_prices(alerts):
-    """Enriquecer alertas con precios actuales"""
+    """Enriquecer alertas con precios actuales
+
+    Los endpoints de lectura sirven la instantánea de alert_snapshot; esto queda
+    para listas sueltas fuera de ella.
+    """
     if not alerts:
         return []
     
-    # Obtener símbolos únicos
-    symbols = list(set([alert.symbol for alert in alerts]))
-    print(f"Obteniendo precios para: {symbols}")
-    
-    # Obtener precios
-    prices = await get_multiple_prices(symbols)
-    print(f"Precios obtenidos: {len(prices)} símbolos")
+    # Obtener precios de los símbolos únicos
+    prices = await get_multiple_prices(list(set([alert.symbol for alert in alerts])))
     
-    enriched_alerts = []
-    for alert in alerts:
-        current_price = prices.get(alert.symbol, 0.0)
-        
-        # Calcular progreso
-        progress_percentage = 0.0
-        if current_price > 0:
-            if alert.alert_type == models.AlertTypeEnum.LONG:
-                if current_price <= alert.target_price:
-                    progress_percentage = (current_price / alert.target_price) * 100
-                else:
-                    progress_percentage = 100.0
-            else:  # SHORT
-                if current_price >= alert.target_price:
-                    progress_percentage = (alert.target_price / current_price) * 100
-                else:
-                    progress_percentage = 100.0
-        
-        enriched_alert = {
-            "id": alert.id,
-            "symbol": alert.symbol,
-            "target_price": alert.target_price,
-            "current_price": current_price,
-            "alert_type": alert.alert_type.value,
-            "status": alert.status.value,
-            "notes": alert.notes or "",
-            "created_at": alert.created_at.isoformat(),
-            "triggered_at": alert.triggered_at.isoformat() if alert.triggered_at else None,
-            "executed_at": alert.executed_at.isoformat() if alert.executed_at else None,
-            "progress_percentage": round(progress_percentage, 1),
-            "trade_id": alert.trade_id
-        }
-        
-        enriched_alerts.append(enriched_alert)
-    
-    return enriched_alerts
+    return [
+        with_price(serialize_alert(alert), alert.alert_type, prices.get(alert.symbol, 0.0))
+        for alert in alerts
+    ]
+
+def enrich_alerts_with_cached_prices(alerts) -> List[dict]:
+    """Como enrich_alerts_with_prices pero solo con la caché de precios (sin upstream)"""
+    return [
+        with_price(serialize_alert(alert), alert.alert_type, price_cache.peek(alert.symbol) or 0.0)
+        for alert in alerts
+    ]
 
 # ==================== CONNECTION TESTS ====================
 
 async def test_binance_connection(api_key: str, secret_key: str, use_testnet: bool = True) -> dict:
     """Probar conexión con Binance"""
     try:
-        base_url = "https://testnet.binancefuture.com" if use_testnet else "https://fapi.binance.com"
+        base_url = binance_futures_url(use_testnet)
         endpoint = "/fapi/v2/account"
         
         timestamp = int(time.time() * 1000)
@@ -339,23 +436,21 @@ async def test_binance_connection(api_key: str, secret_key: str, use_testnet: bo
         
         url = f"{base_url}{endpoint}?{query_string}&signature={signature}"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        "success": True,
-                        "message": "✅ Conexión exitosa con Binance Futures",
-                        "balance": data.get("totalWalletBalance", "0"),
-                        "testnet": use_testnet
-                    }
-                else:
-                    error_text = await response.text()
-                    return {
-                        "success": False,
-                        "message": f"❌ Error de conexión: {response.status}",
-                        "error": error_text
-                    }
+        response = await binance_scheduler.get(url, priority=PRIORITY_TEST, headers=headers)
+        if response.status_code == 200:
+            data = response.json()
+            return {
+                "success": True,
+                "message": "✅ Conexión exitosa con Binance Futures",
+                "balance": data.get("totalWalletBalance", "0"),
+                "testnet": use_testnet
+            }
+        else:
+            return {
+                "success": False,
+                "message": f"❌ Error de conexión: {response.status_code}",
+                "error": response.text
+            }
     except Exception as e:
         return {
             "success": False,
@@ -365,25 +460,24 @@ async def test_binance_connection(api_key: str, secret_key: str, use_testnet: bo
 async def test_telegram_connection(bot_token: str, chat_id: str) -> dict:
     """Probar conexión con Telegram"""
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        url = telegram_url(bot_token, "sendMessage")
         payload = {
             "chat_id": chat_id,
             "text": "🤖 Test de conexión desde CryptoAlert System\n✅ Telegram configurado correctamente!"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    return {
-                        "success": True,
-                        "message": "✅ Mensaje enviado a Telegram correctamente"
-                    }
-                else:
-                    error_data = await response.json()
-                    return {
-                        "success": False,
-                        "message": f"❌ Error Telegram: {error_data.get('description', 'Error desconocido')}"
-                    }
+        response = await http_pool.post(url, json=payload)
+        if response.status_code == 200:
+            return {
+                "success": True,
+                "message": "✅ Mensaje enviado a Telegram correctamente"
+            }
+        else:
+            error_data = response.json()
+            return {
+                "success": False,
+                "message": f"❌ Error Telegram: {error_data.get('description', 'Error desconocido')}"
+            }
     except Exception as e:
         return {
             "success": False,
@@ -397,18 +491,17 @@ async def test_discord_connection(webhook_url: str) -> dict:
             "content": "🤖 **Test de conexión desde CryptoAlert System**\n✅ Discord Webhook configurado correctamente!"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(webhook_url, json=payload) as response:
-                if response.status in [200, 204]:
-                    return {
-                        "success": True,
-                        "message": "✅ Mensaje enviado a Discord correctamente"
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "message": f"❌ Error Discord: Status {response.status}"
-                    }
+        response = await http_pool.post(discord_webhook_url(webhook_url), json=payload)
+        if response.status_code in [200, 204]:
+            return {
+                "success": True,
+                "message": "✅ Mensaje enviado a Discord correctamente"
+            }
+        else:
+            return {
+                "success": False,
+                "message": f"❌ Error Discord: Status {response.status_code}"
+            }
     except Exception as e:
         return {
             "success": False,
@@ -418,40 +511,39 @@ async def test_discord_connection(webhook_url: str) -> dict:
 async def get_telegram_chat_id(bot_token: str) -> dict:
     """Obtener Chat ID de Telegram"""
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data["result"]:
-                        chat_ids = []
-                        for update in data["result"][-5:]:  # Últimas 5 actualizaciones
-                            if "message" in update:
-                                chat_id = update["message"]["chat"]["id"]
-                                chat_type = update["message"]["chat"]["type"]
-                                chat_title = update["message"]["chat"].get("title", "DM")
-                                chat_ids.append({
-                                    "chat_id": str(chat_id),
-                                    "type": chat_type,
-                                    "title": chat_title
-                                })
-                        
-                        return {
-                            "success": True,
-                            "message": "✅ Chat IDs encontrados",
-                            "chat_ids": chat_ids
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "message": "❌ No hay mensajes recientes. Envía un mensaje al bot primero."
-                        }
-                else:
-                    return {
-                        "success": False,
-                        "message": f"❌ Error obteniendo updates: {response.status}"
-                    }
+        url = telegram_url(bot_token, "getUpdates")
+        
+        response = await http_pool.get(url)
+        if response.status_code == 200:
+            data = response.json()
+            if data["result"]:
+                chat_ids = []
+                for item in data["result"][-5:]:  # Últimas 5 actualizaciones
+                    if "message" in item:
+                        chat_id = item["message"]["chat"]["id"]
+                        chat_type = item["message"]["chat"]["type"]
+                        chat_title = item["message"]["chat"].get("title", "DM")
+                        chat_ids.append({
+                            "chat_id": str(chat_id),
+                            "type": chat_type,
+                            "title": chat_title
+                        })
+                
+                return {
+                    "success": True,
+                    "message": "✅ Chat IDs encontrados",
+                    "chat_ids": chat_ids
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": "❌ No hay mensajes recientes. Envía un mensaje al bot primero."
+                }
+        else:
+            return {
+                "success": False,
+                "message": f"❌ Error obteniendo updates: {response.status_code}"
+            }
     except Exception as e:
         return {
             "success": False,
@@ -463,7 +555,7 @@ async def get_telegram_chat_id(bot_token: str) -> dict:
 async def send_telegram_notification(bot_token: str, chat_id: str, message: str) -> bool:
     """Enviar notificación a Telegram"""
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        url = telegram_url(bot_token, "sendMessage")
         payload = {
             "chat_id": chat_id,
             "text": message,
@@ -471,15 +563,13 @@ async def send_telegram_notification(bot_token: str, chat_id: str, message: str)
             "disable_web_page_preview": True
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    print(f"✅ Mensaje Telegram enviado: {message[:50]}...")
-                    return True
-                else:
-                    error_data = await response.json()
-                    print(f"❌ Error Telegram: {error_data}")
-                    return False
+        response = await http_pool.post(url, json=payload)
+        if response.status_code == 200:
+            print(f"✅ Mensaje Telegram enviado: {message[:50]}...")
+            return True
+        else:
+            print(f"❌ Error Telegram: {response.text}")
+            return False
     except Exception as e:
         print(f"❌ Error enviando a Telegram: {e}")
         return False
@@ -493,23 +583,22 @@ async def send_discord_notification(webhook_url: str, message: str) -> bool:
             "avatar_url": "https://i.imgur.com/4M34hi2.png"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(webhook_url, json=payload) as response:
-                if response.status in [200, 204]:
-                    print(f"✅ Mensaje Discord enviado: {message[:50]}...")
-                    return True
-                else:
-                    print(f"❌ Error Discord: Status {response.status}")
-                    return False
+        response = await http_pool.post(discord_webhook_url(webhook_url), json=payload)
+        if response.status_code in [200, 204]:
+            print(f"✅ Mensaje Discord enviado: {message[:50]}...")
+            return True
+        else:
+            print(f"❌ Error Discord: Status {response.status_code}")
+            return False
     except Exception as e:
         print(f"❌ Error enviando a Discord: {e}")
         return False
 
-async def notify_alert_triggered(db: Session, alert, current_price: float):
+async def notify_alert_triggered(db: AsyncSession, alert, current_price: float):
     """Enviar notificaciones cuando una alerta se dispara"""
     try:
         # Obtener configuración de notificaciones
-        config = get_config(db)
+        config = await get_config(db)
         
         if not config.notify_on_trigger:
             return
@@ -517,6 +606,11 @@ async def notify_alert_triggered(db: Session, alert, current_price: float):
         # Crear mensaje
         alert_type_emoji = "🟢📈" if alert.alert_type.value == "LONG" else "🔴📉"
         direction = "subió" if alert.alert_type.value == "LONG" else "bajó"
+        condition = compile_condition(alert.condition) if alert.condition else None
+        reason = (
+            f"📐 Condición cumplida: {condition.describe()}" if condition
+            else f"💡 El precio {direction} hasta el nivel objetivo!"
+        )
         
         message = f"""🚨 <b>ALERTA DISPARADA</b> 🚨
 
@@ -525,7 +619,7 @@ async def notify_alert_triggered(db: Session, alert, current_price: float):
 🎯 Target: <b>${alert.target_price:,.4f}</b>
 📊 Tipo: <b>{alert.alert_type.value}</b>
 
-💡 El precio {direction} hasta el nivel objetivo!
+{reason}
 ⏰ Hora: {datetime.now().strftime('%H:%M:%S')}
 
 {alert.notes if alert.notes else ''}
@@ -551,10 +645,10 @@ async def notify_alert_triggered(db: Session, alert, current_price: float):
     except Exception as e:
         print(f"❌ Error enviando notificaciones: {e}")
 
-async def notify_price_near_target(db: Session, alert, current_price: float, percentage: float):
+async def notify_price_near_target(db: AsyncSession, alert, current_price: float, percentage: float):
     """Notificar cuando el precio está cerca del target"""
     try:
-        config = get_config(db)
+        config = await get_config(db)
         
         if not config.notify_on_near_price:
             return
@@ -591,126 +685,344 @@ async def notify_price_near_target(db: Session, alert, current_price: float, per
     except Exception as e:
         print(f"❌ Error enviando notificación de proximidad: {e}")
 
-# ==================== ALERT MONITORING ====================
-
-async def check_and_trigger_alerts(db: Session):
-    """Verificar y disparar alertas con notificaciones"""
+async def notify_alerts_expired(db: AsyncSession, alerts: List[models.Alert]):
+    """Un único aviso con todas las alertas caducadas en el mismo lote"""
     try:
-        # Obtener alertas activas
-        active_alerts = get_active_alerts(db)
+        config = await get_config(db)
         
-        if not active_alerts:
+        if not config.notify_on_expiry:
             return
         
-        print(f"Verificando {len(active_alerts)} alertas activas")
+        lines = "\n".join(
+            f"• <b>{alert.symbol}</b> {alert.alert_type.value} @ ${alert.target_price:,.4f}"
+            for alert in alerts[:20]
+        )
+        if len(alerts) > 20:
+            lines += f"\n… y {len(alerts) - 20} más"
         
-        # Obtener símbolos únicos
-        symbols = list(set([alert.symbol for alert in active_alerts]))
-        print(f"Símbolos a verificar: {symbols}")
+        message = f"""⌛ <b>ALERTAS EXPIRADAS</b> ⌛
+
+{lines}
+
+🗑️ {"Eliminadas" if config.auto_delete_expired else "Archivadas como EXPIRED"}
+⏰ {datetime.now().strftime('%H:%M:%S')}
+
+---
+🤖 CryptoAlert System"""
+
+        if config.telegram_bot_token and config.telegram_chat_id:
+            await send_telegram_notification(
+                config.telegram_bot_token,
+                config.telegram_chat_id,
+                message
+            )
         
-        # Obtener precios actuales
-        prices = await get_multiple_prices(symbols)
-        print(f"Precios obtenidos para verificación: {len(prices)} símbolos")
+        if config.discord_webhook_url:
+            await send_discord_notification(
+                config.discord_webhook_url,
+                message.replace('<b>', '**').replace('</b>', '**')
+            )
+            
+    except Exception as e:
+        print(f"❌ Error enviando notificación de expiración: {e}")
+
+async def notify_alerts_executed(db: AsyncSession, alerts: List[models.Alert]):
+    """Un único aviso con las alertas cuya posición se detectó en Binance"""
+    try:
+        config = await get_config(db)
         
-        alerts_triggered = 0
+        if not config.notify_on_position_detected:
+            return
+        
+        lines = "\n".join(
+            f"• <b>{alert.symbol}</b> {alert.alert_type.value} (alerta #{alert.id})"
+            for alert in alerts[:20]
+        )
+        if len(alerts) > 20:
+            lines += f"\n… y {len(alerts) - 20} más"
+        
+        message = f"""✅ <b>POSICIÓN DETECTADA</b> ✅
+
+{lines}
+
+🎯 Alertas marcadas como ejecutadas
+⏰ {datetime.now().strftime('%H:%M:%S')}
+
+---
+🤖 CryptoAlert System"""
+
+        if config.telegram_bot_token and config.telegram_chat_id:
+            await send_telegram_notification(
+                config.telegram_bot_token,
+                config.telegram_chat_id,
+                message
+            )
         
-        for alert in active_alerts:
-            current_price = prices.get(alert.symbol, 0)
+        if config.discord_webhook_url:
+            await send_discord_notification(
+                config.discord_webhook_url,
+                message.replace('<b>', '**').replace('</b>', '**')
+            )
             
+    except Exception as e:
+        print(f"❌ Error enviando notificación de posición: {e}")
+
+# ==================== ALERT MONITORING ====================
+
+def alert_should_trigger(alert_type, target_price: float, current_price: float) -> bool:
+    """LONG se dispara con precio >= target, SHORT con precio <= target"""
+    if current_price <= 0:
+        return False
+    if alert_type == models.AlertTypeEnum.LONG:
+        return current_price >= target_price
+    return current_price <= target_price
+
+def alert_progress(alert_type, target_price: float, current_price: float) -> float:
+    """Porcentaje de progreso hacia el target (100 = alcanzado)"""
+    return threshold_progress(alert_type, target_price, current_price)
+
+def alert_crossed_price(alert_type, target_price: float, low: float, high: float) -> Optional[float]:
+    """Precio de la ventana [low, high] que alcanzó el target (None si no se cruzó)"""
+    if alert_type == models.AlertTypeEnum.LONG:
+        return high if high >= target_price else None
+    return low if 0 < low <= target_price else None
+
+# Estados de origen válidos para cada transición
+ALERT_TRANSITION_SOURCES = {
+    models.AlertStatusEnum.TRIGGERED: (models.AlertStatusEnum.PENDING,),
+    models.AlertStatusEnum.EXPIRED: (models.AlertStatusEnum.PENDING,),
+    models.AlertStatusEnum.EXECUTED: (models.AlertStatusEnum.PENDING, models.AlertStatusEnum.TRIGGERED),
+    models.AlertStatusEnum.CANCELLED: (models.AlertStatusEnum.PENDING, models.AlertStatusEnum.TRIGGERED),
+}
+
+async def apply_alert_transitions(db: AsyncSession,
+                                  transitions: Dict[models.AlertStatusEnum, Dict[int, Optional[float]]]
+                                  ) -> Dict[models.AlertStatusEnum, List[models.Alert]]:
+    """Aplicar en una transacción todas las transiciones de un ciclo
+
+    ``transitions`` es estado destino -> {alert_id: precio (o None)}. Se ejecuta un
+    único UPDATE ... WHERE id = ANY(...) RETURNING por estado; solo cambian las
+    alertas que seguían en un estado de origen válido, y son las que se devuelven.
+    La sesión no expira en commit: las filas de RETURNING se notifican tal cual.
+    """
+    now = datetime.now()
+    applied: Dict[models.AlertStatusEnum, List[models.Alert]] = {}
+    try:
+        for status, prices in transitions.items():
+            if prices:
+                applied[status] = list((await db.execute(_transition_query(status, prices, now))).scalars().all())
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    if any(applied.values()):
+        await _alert_changed(removed_ids=[alert.id for alerts in applied.values() for alert in alerts])
+    return applied
+
+def _transition_query(status: models.AlertStatusEnum, prices: Dict[int, Optional[float]], now: datetime):
+    """UPDATE ... WHERE id = ANY(...) AND status IN (orígenes válidos) RETURNING"""
+    values = {"status": status}
+    if status == models.AlertStatusEnum.TRIGGERED:
+        values["triggered_at"] = now
+    elif status == models.AlertStatusEnum.EXECUTED:
+        values["executed_at"] = now
+    priced = {alert_id: price for alert_id, price in prices.items() if price is not None}
+    if priced:
+        values["current_price"] = case(priced, value=models.Alert.id, else_=models.Alert.current_price)
+
+    return (
+        update(models.Alert)
+        .where(
+            models.Alert.id == any_(bindparam("ids", list(prices), type_=ARRAY(Integer))),
+            models.Alert.status.in_(ALERT_TRANSITION_SOURCES[status])
+        )
+        .values(**values)
+        .returning(models.Alert)
+    )
+
+async def notify_transitions(db: AsyncSession, applied: Dict[models.AlertStatusEnum, List[models.Alert]]) -> int:
+    """Notificar las alertas que realmente cambiaron (filas devueltas por RETURNING)"""
+    triggered = applied.get(models.AlertStatusEnum.TRIGGERED, [])
+    for alert in triggered:
+        print(f"🚨 ALERTA DISPARADA: {alert.symbol} {alert.alert_type.value} @ ${alert.current_price}")
+        stream_hub.publish("alert_triggered", {
+            "id": alert.id,
+            "symbol": alert.symbol,
+            "alert_type": alert.alert_type.value,
+            "target_price": alert.target_price,
+            "current_price": alert.current_price,
+            "condition": alert.condition
+        })
+        await notify_alert_triggered(db, alert, alert.current_price)
+    expired = applied.get(models.AlertStatusEnum.EXPIRED, [])
+    if expired:
+        print(f"⌛ {len(expired)} alerta(s) expirada(s)")
+        stream_hub.publish("alerts_expired", {"ids": [alert.id for alert in expired]})
+        await notify_alerts_expired(db, expired)
+    executed = applied.get(models.AlertStatusEnum.EXECUTED, [])
+    if executed:
+        print(f"✅ {len(executed)} alerta(s) ejecutada(s)")
+        stream_hub.publish("alerts_executed", {"ids": [alert.id for alert in executed]})
+        await notify_alerts_executed(db, executed)
+    return len(triggered)
+
+# Instante de la última verificación REST por símbolo (para detectar cruces entre muestras)
+_last_alert_check_at: Dict[str, float] = {}
+
+async def check_and_trigger_alerts(db: Optional[AsyncSession] = None, symbols: Optional[List[str]] = None,
+                                   max_age: Optional[float] = None):
+    """Verificar y disparar alertas con notificaciones
+
+    Evalúa el registro en memoria; solo abre sesión si hay algo que escribir o notificar.
+    ``symbols`` limita la verificación (sondeo adaptativo) y ``max_age`` exige precios
+    más recientes que esa edad en lugar de aceptar los de la caché.
+    """
+    own_session = db is None
+    try:
+        check_started = time.time()
+        active = alert_registry.symbols()
+        symbols = [s for s in symbols if alert_registry.count(s)] if symbols is not None else active
+        
+        if not symbols:
+            return
+        
+        print(f"Verificando alertas activas en {len(symbols)} de {len(active)} símbolos")
+        
+        # Obtener precios actuales
+        if max_age is not None:
+            prices = await price_cache.get_fresh(symbols, max_age, PRIORITY_ALERTS)
+        else:
+            prices = await get_multiple_prices(symbols, PRIORITY_ALERTS)
+        
+        crossed = []
+        near = []
+        for symbol in symbols:
+            current_price = prices.get(symbol, 0)
             if current_price <= 0:
                 continue
             
-            # Verificar si se debe disparar
-            should_trigger = False
+            # El precio pudo tocar el target entre dos verificaciones y volver
+            low = high = None
+            last_check = _last_alert_check_at.get(symbol)
+            if last_check is not None:
+                extremes = tick_history.extremes_since(symbol, last_check)
+                if extremes:
+                    low, high = extremes
             
-            if alert.alert_type == models.AlertTypeEnum.LONG:
-                should_trigger = current_price >= alert.target_price
-                print(f"LONG {alert.symbol}: ${current_price} >= ${alert.target_price} = {should_trigger}")
-            else:  # SHORT
-                should_trigger = current_price <= alert.target_price
-                print(f"SHORT {alert.symbol}: ${current_price} <= ${alert.target_price} = {should_trigger}")
+            for record in alert_registry.pop_crossed(symbol, current_price, low, high):
+                trigger_price = current_price
+                # Las condiciones compuestas ya se evaluaron con el precio actual
+                if record.condition is None and \
+                        not alert_should_trigger(record.alert_type, record.target_price, current_price):
+                    # Cruce dentro de la ventana: solo cuenta si la alerta ya existía
+                    since = max(last_check, record.created_at.timestamp() if record.created_at else 0)
+                    window = tick_history.extremes_since(symbol, since)
+                    trigger_price = alert_crossed_price(record.alert_type, record.target_price, *window) if window else None
+                    if trigger_price is None:
+                        alert_registry.release(record, False)
+                        continue
+                crossed.append((record, trigger_price))
             
-            if should_trigger:
-                # Disparar alerta
-                alert.status = models.AlertStatusEnum.TRIGGERED
-                alert.triggered_at = datetime.now()
-                
-                print(f"🚨 ALERTA DISPARADA: {alert.symbol} {alert.alert_type.value} @ ${current_price}")
-                
-                # Enviar notificaciones
-                await notify_alert_triggered(db, alert, current_price)
-                
-                alerts_triggered += 1
-            else:
-                # Verificar si está cerca (>95% del progreso)
-                if alert.alert_type == models.AlertTypeEnum.LONG:
-                    progress = (current_price / alert.target_price) * 100
-                else:
-                    progress = ((alert.target_price / current_price) if current_price > 0 else 0) * 100
-                
-                # Notificar si está cerca y no se ha notificado recientemente
-                if progress >= 95 and not hasattr(alert, '_near_notified'):
-                    await notify_price_near_target(db, alert, current_price, progress)
-                    alert._near_notified = True  # Marcar como notificado
+            for record in alert_registry.near(symbol, current_price):
+                near.append((record, current_price))
+            
+            _last_alert_check_at[symbol] = check_started
+        
+        for symbol in [s for s in _last_alert_check_at if not alert_registry.count(s)]:
+            del _last_alert_check_at[symbol]
+        
+        if not crossed and not near:
+            print("ℹ️ No se dispararon alertas en esta verificación")
+            return
         
-        # Guardar cambios
-        db.commit()
+        if own_session:
+            db = AsyncSessionLocal()
+        
+        # Todas las transiciones del ciclo en un solo UPDATE ... RETURNING
+        try:
+            applied = await apply_alert_transitions(db, {
+                models.AlertStatusEnum.TRIGGERED: {record.id: price for record, price in crossed}
+            })
+        except Exception:
+            for record, _ in crossed:
+                alert_registry.release(record, False)
+            raise
+        for record, _ in crossed:
+            # Las que no seguían PENDING ya no pertenecen al registro
+            alert_registry.release(record, True)
+        alerts_triggered = await notify_transitions(db, applied)
+        
+        for record, current_price in near:
+            progress = alert_progress(record.alert_type, record.target_price, current_price)
+            await notify_price_near_target(db, record, current_price, progress)
+        if near:
+            # Persistir ya el aviso para que un reinicio no lo repita
+            await alert_registry.flush_near_states(db)
         
         if alerts_triggered > 0:
             print(f"🎯 {alerts_triggered} alerta(s) disparada(s)")
-        else:
-            print("ℹ️ No se dispararon alertas en esta verificación")
             
     except Exception as e:
         print(f"❌ Error verificando alertas: {e}")
-        db.rollback()
+        if db is not None:
+            await db.rollback()
+    finally:
+        if own_session and db is not None:
+            await db.close()
 
 # ==================== STATS CRUD ====================
 
-def get_alert_stats(db: Session, days: int = 7):
+def _alert_counts_by_symbol(since: datetime):
+    """SELECT symbol, total, executed, triggered ... GROUP BY symbol: solo conteos, sin hidratar filas"""
+    executed = func.count().filter(models.Alert.status == models.AlertStatusEnum.EXECUTED)
+    triggered = func.count().filter(models.Alert.status == models.AlertStatusEnum.TRIGGERED)
+    return (
+        select(
+            models.Alert.symbol,
+            func.count().label("total"),
+            executed.label("executed"),
+            triggered.label("triggered")
+        )
+        .where(models.Alert.created_at >= since)
+        .group_by(models.Alert.symbol)
+    )
+
+async def get_alert_stats(db: AsyncSession, days: int = 7):
     since = datetime.now() - timedelta(days=days)
+    rows = (await db.execute(_alert_counts_by_symbol(since))).all()
     
-    alerts = db.query(models.Alert).filter(
-        models.Alert.created_at >= since
-    ).all()
-    
-    total = len(alerts)
-    executed = len([a for a in alerts if a.status == models.AlertStatusEnum.EXECUTED])
-    triggered = len([a for a in alerts if a.status == models.AlertStatusEnum.TRIGGERED])
+    symbols = {
+        row.symbol: {"total": row.total, "executed": row.executed, "triggered": row.triggered}
+        for row in rows
+    }
+    total = sum(row.total for row in rows)
+    executed = sum(row.executed for row in rows)
+    triggered = sum(row.triggered for row in rows)
     
-    stats = {
+    return {
         "total_alerts": total,
         "executed_alerts": executed,
         "triggered_alerts": triggered,
         "success_rate": (executed / total * 100) if total > 0 else 0,
-        "by_symbol": {}
+        "by_symbol": symbols
     }
-    
-    symbols = {}
-    for alert in alerts:
-        if alert.symbol not in symbols:
-            symbols[alert.symbol] = {"total": 0, "executed": 0, "triggered": 0}
-        symbols[alert.symbol]["total"] += 1
-        if alert.status == models.AlertStatusEnum.EXECUTED:
-            symbols[alert.symbol]["executed"] += 1
-        elif alert.status == models.AlertStatusEnum.TRIGGERED:
-            symbols[alert.symbol]["triggered"] += 1
-    
-    stats["by_symbol"] = symbols
-    return stats
 
-def get_top_performers(db: Session, limit: int = 5):
-    stats = get_alert_stats(db, days=30)
+async def get_top_performers(db: AsyncSession, limit: int = 5):
+    since = datetime.now() - timedelta(days=30)
+    counts = _alert_counts_by_symbol(since).having(func.count() >= 3).subquery()
+    success_rate = counts.c.executed * 100.0 / counts.c.total
+    rows = (await db.execute(
+        select(counts.c.symbol, counts.c.total, success_rate.label("success_rate"))
+        .order_by(desc("success_rate"), counts.c.symbol)
+        .limit(limit)
+    )).all()
     
-    performers = []
-    for symbol, data in stats["by_symbol"].items():
-        if data["total"] >= 3:
-            success_rate = (data["executed"] / data["total"]) * 100
-            performers.append({
-                "symbol": symbol,
-                "total_alerts": data["total"],
-                "success_rate": success_rate
-            })
-    
-    performers.sort(key=lambda x: x["success_rate"], reverse=True)
-    return performers[:limit]
\ No newline at end of file
+    return [
+        {
+            "symbol": row.symbol,
+            "total_alerts": row.total,
+            "success_rate": float(row.success_rate)
+        }
+        for row in rows
+    ]
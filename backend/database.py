@@ -1,6 +1,8 @@
 # backend/database.py - CORREGIDO FINAL
 import os
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.exc import SQLAlchemyError
 import time
@@ -19,6 +21,19 @@ engine = create_engine(DATABASE_URL, echo=False)
 # Crear sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine asíncrono (asyncpg) para endpoints y tareas del event loop: las
+# consultas esperan sin bloquear el resto de peticiones. El síncrono queda
+# para migraciones y la configuración por defecto.
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    make_url(DATABASE_URL).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
+
+# Sin expirar en commit: tras await db.commit() los atributos no provocan
+# cargas implícitas (en una AsyncSession fallarían fuera de un await)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Importar Base desde models DESPUÉS de crear engine
 # Esto evita import circular
 def get_base():
@@ -45,6 +60,9 @@ def run_migrations():
         Base.metadata.create_all(bind=engine)
         print("✅ Tablas creadas/verificadas")
         
+        # Columnas y valores de enum añadidos después de crear las tablas
+        apply_schema_upgrades()
+        
         # Crear configuración por defecto
         create_default_config()
         
@@ -53,6 +71,26 @@ def run_migrations():
         print(f"❌ Error en migraciones: {e}")
         return False
 
+def apply_schema_upgrades():
+    """Cambios de esquema idempotentes sobre bases de datos ya existentes"""
+    # ALTER TYPE ... ADD VALUE no puede usarse dentro de la transacción que lo crea
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        # Solo si status usa el tipo enum (init.sql lo crea como VARCHAR)
+        has_enum = connection.execute(
+            text("SELECT 1 FROM pg_type WHERE typname = 'alertstatusenum'")
+        ).first()
+        if has_enum:
+            connection.execute(text("ALTER TYPE alertstatusenum ADD VALUE IF NOT EXISTS 'EXPIRED'"))
+        connection.execute(text("ALTER TABLE alerts ADD COLUMN IF NOT EXISTS near_state BOOLEAN DEFAULT FALSE"))
+        connection.execute(text("ALTER TABLE alerts ADD COLUMN IF NOT EXISTS near_notified_at TIMESTAMP"))
+        connection.execute(text("ALTER TABLE alerts ADD COLUMN IF NOT EXISTS expiry_hours INTEGER"))
+        connection.execute(text("ALTER TABLE alerts ADD COLUMN IF NOT EXISTS condition JSONB"))
+        # Paginación keyset de /api/alerts: ORDER BY created_at DESC, id DESC con o sin filtro
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_alerts_created_id ON alerts(created_at DESC, id DESC)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_alerts_status_created_id ON alerts(status, created_at DESC, id DESC)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_alerts_symbol_created_id ON alerts(symbol, created_at DESC, id DESC)"))
+    print("✅ Esquema actualizado")
+
 def create_default_config():
     """Crear configuración por defecto si no existe"""
     try:
@@ -124,10 +162,11 @@ def init_database():
     print("❌ No se pudo conectar a la base de datos después de varios intentos")
     return False
 
-def get_db():
-    """Dependency para obtener sesión de base de datos"""
-    db = SessionLocal()
-    try:
+async def get_async_db():
+    """Dependency para obtener sesión asíncrona de base de datos"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+async def close_async_engine():
+    """Cerrar las conexiones del pool asíncrono al apagar"""
+    await async_engine.dispose()
@@ -0,0 +1,128 @@
+# backend/etags.py - ETags fuertes a partir de versiones de datos; 304 sin tocar BD ni Binance
+import hashlib
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from shared_state import shared_state
+
+# Identifica este proceso: lo que solo existe en su memoria (contadores locales,
+# versión de la instantánea) no puede compararse con otro worker
+INSTANCE_ID = uuid.uuid4().hex[:12]
+# Sin Redis no se ven los cambios de otros procesos: la versión caduca con este periodo
+ETAG_UNSHARED_BUCKET_SECONDS = float(os.getenv("ETAG_UNSHARED_BUCKET_SECONDS", "30"))
+# Páginas servidas cuyos símbolos se recuerdan para revalidar sin consultar la BD
+ETAG_PAGE_MEMO_SIZE = 512
+
+class ChangeCounters:
+    """Contadores de cambios por tipo de dato (alertas, configuración)
+
+    Con Redis el contador es compartido (HINCRBY) y todos los workers producen
+    la misma versión; sin Redis se combina el contador local con una cubeta de
+    tiempo para acotar cuánto puede quedar oculto un cambio de otro proceso.
+    """
+
+    def __init__(self):
+        self._local: Dict[str, int] = {}
+        self.bumps = 0
+        self.shared_reads = 0
+
+    async def bump(self, name: str):
+        """Marcar un cambio; se espera justo después del commit
+
+        Se espera al HINCRBY: la respuesta de la escritura no sale hasta que la
+        versión compartida cambió, así que un GET inmediato ya no recibe un 304.
+        """
+        self._local[name] = self._local.get(name, 0) + 1
+        self.bumps += 1
+        if shared_state.enabled:
+            await shared_state.bump_version(name)
+
+    def local(self, name: str) -> int:
+        return self._local.get(name, 0)
+
+    async def get(self, name: str) -> str:
+        if shared_state.enabled:
+            try:
+                version = await shared_state.read_version(name)
+                self.shared_reads += 1
+                return f"r{version}"
+            except Exception as e:
+                print(f"❌ Error leyendo versión {name} de Redis: {e}")
+        bucket = int(time.time() // ETAG_UNSHARED_BUCKET_SECONDS)
+        return f"{INSTANCE_ID}.{self.local(name)}.{bucket}"
+
+    def stats(self) -> dict:
+        return {
+            "instance_id": INSTANCE_ID,
+            "shared": shared_state.enabled,
+            "local": dict(self._local),
+            "bumps": self.bumps,
+            "shared_reads": self.shared_reads,
+            "unshared_bucket_seconds": ETAG_UNSHARED_BUCKET_SECONDS
+        }
+
+class PageSymbols:
+    """Símbolos de cada página servida, por clave (ruta, query, versión de alertas)
+
+    Con la misma versión de alertas la página tiene las mismas filas y solo
+    pueden cambiar los precios de sus símbolos: el ETag se calcula con ellos
+    sin repetir la consulta. LRU acotada a ETAG_PAGE_MEMO_SIZE páginas.
+    """
+
+    def __init__(self, size: int = ETAG_PAGE_MEMO_SIZE):
+        self.size = size
+        self._pages: "OrderedDict[Hashable, Tuple[str, ...]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, ...]]:
+        symbols = self._pages.get(key)
+        if symbols is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._pages.move_to_end(key)
+        return symbols
+
+    def put(self, key: Hashable, symbols: Iterable[str]):
+        self._pages[key] = tuple(dict.fromkeys(symbols))
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.size:
+            self._pages.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"pages": len(self._pages), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+# ==================== ETAG / 304 ====================
+
+def make_etag(*parts) -> str:
+    """ETag fuerte: mismo valor solo para la misma representación"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:24]
+    return f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil: se ignora el prefijo W/
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Poner el ETag en la respuesta; devuelve un 304 si el cliente ya lo tiene"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+# Instancias globales
+change_counters = ChangeCounters()
+page_symbols = PageSymbols()
@@ -0,0 +1,179 @@
+# backend/expiry_scheduler.py - Caducidad de alertas PENDING con un min-heap de deadlines
+import asyncio
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import models
+from alert_registry import AlertRecord, AlertRegistry, alert_registry
+from database import AsyncSessionLocal
+
+# Tope de espera entre despertares; también recarga el TTL por defecto por si
+# la configuración se cambió desde otro proceso (API en modo lector)
+MAX_SLEEP_SECONDS = 3600
+# Espera tras un fallo al expirar antes de reintentar el mismo lote
+RETRY_SECONDS = 30
+
+class ExpiryScheduler:
+    """Duerme hasta el próximo vencimiento y expira en un solo UPDATE todo lo vencido
+
+    El heap guarda (deadline, alert_id); los cambios de una alerta añaden una
+    entrada nueva y las antiguas se descartan al salir (borrado perezoso),
+    comparándolas con ``_deadlines``.
+    """
+
+    def __init__(self, registry: AlertRegistry = alert_registry):
+        self.registry = registry
+        self.default_expiry_hours: Optional[int] = None
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._wake = asyncio.Event()
+        self._reload = False
+        self._task: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.runs = 0
+        self.last_run_at: Optional[float] = None
+
+    def deadline(self, record: AlertRecord) -> Optional[float]:
+        """created_at + TTL (de la alerta o por defecto); None si no caduca"""
+        hours = record.expiry_hours if record.expiry_hours is not None else self.default_expiry_hours
+        if not hours or hours <= 0 or record.created_at is None:
+            return None
+        return record.created_at.timestamp() + hours * 3600
+
+    # ==================== HEAP ====================
+
+    def schedule(self, alert_id: int, record: Optional[AlertRecord]):
+        """Listener del registro: (re)programar o descartar una alerta"""
+        deadline = self.deadline(record) if record is not None else None
+        if deadline is None:
+            self._deadlines.pop(alert_id, None)
+            return
+        if self._deadlines.get(alert_id) == deadline:
+            return
+        self._deadlines[alert_id] = deadline
+        heapq.heappush(self._heap, (deadline, alert_id))
+        if self._heap[0] == (deadline, alert_id):
+            # Nuevo vencimiento más próximo: acortar la espera en curso
+            self._wake.set()
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [(deadline, alert_id) for alert_id, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    async def rebuild(self, db: AsyncSession):
+        """Cargar el TTL por defecto y reconstruir el heap desde el registro"""
+        config = (await db.execute(select(models.Config.default_expiry_hours).limit(1))).first()
+        self.default_expiry_hours = config[0] if config else None
+        self._deadlines = {}
+        for record in self.registry.records():
+            deadline = self.deadline(record)
+            if deadline is not None:
+                self._deadlines[record.id] = deadline
+        self._compact()
+
+    def reload_config(self):
+        """Cambió default_expiry_hours: reconstruir en el próximo despertar"""
+        self._reload = True
+        self._wake.set()
+
+    def _next_delay(self) -> float:
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return MAX_SLEEP_SECONDS
+        return min(self._heap[0][0] - time.time(), MAX_SLEEP_SECONDS)
+
+    def _pop_due(self, now: float) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, alert_id = heapq.heappop(self._heap)
+            if self._deadlines.get(alert_id) == deadline:
+                del self._deadlines[alert_id]
+                due.append(alert_id)
+        return due
+
+    # ==================== EXPIRACIÓN ====================
+
+    async def expire_due(self) -> int:
+        """Expirar de una vez todas las alertas vencidas"""
+        now = time.time()
+        due = self._pop_due(now)
+        if not due:
+            return 0
+        async with AsyncSessionLocal() as db:
+            try:
+                expired = await crud.expire_alerts(db, due)
+            except Exception:
+                # Volver a programarlas para el reintento
+                for alert_id in due:
+                    self._deadlines[alert_id] = now
+                    heapq.heappush(self._heap, (now, alert_id))
+                raise
+            self.runs += 1
+            self.last_run_at = now
+            self.expired += len(expired)
+            await crud.notify_transitions(db, {models.AlertStatusEnum.EXPIRED: expired})
+            return len(expired)
+
+    # ==================== BACKGROUND ====================
+
+    async def start(self):
+        async with AsyncSessionLocal() as db:
+            await self.rebuild(db)
+        self.registry.on_alert_changed(self.schedule)
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        print(f"⌛ Expiración programada para {len(self._deadlines)} alerta(s)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        last_rebuild = time.monotonic()
+        while True:
+            try:
+                if self._reload or time.monotonic() - last_rebuild >= MAX_SLEEP_SECONDS:
+                    self._reload = False
+                    last_rebuild = time.monotonic()
+                    async with AsyncSessionLocal() as db:
+                        await self.rebuild(db)
+                self._wake.clear()
+                delay = self._next_delay()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                        continue
+                    except asyncio.TimeoutError:
+                        pass
+                await self.expire_due()
+            except Exception as e:
+                print(f"❌ Error expirando alertas: {e}")
+                await asyncio.sleep(RETRY_SECONDS)
+
+    def stats(self) -> dict:
+        delay = self._next_delay()
+        return {
+            "scheduled": len(self._deadlines),
+            "heap_size": len(self._heap),
+            "default_expiry_hours": self.default_expiry_hours,
+            "next_expiry_in_seconds": round(max(delay, 0), 1) if self._heap else None,
+            "expired": self.expired,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at
+        }
+
+# Instancia global
+expiry_scheduler = ExpiryScheduler()
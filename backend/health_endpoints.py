@@ -68,12 +68,12 @@ async def detailed_status():
     
     # Verificar base de datos
     try:
-        from database import get_db
-        db = next(get_db())
-        # Hacer una query simple
-        result = db.execute("SELECT 1").fetchone()
+        from sqlalchemy import text
+        from database import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            # Hacer una query simple
+            result = (await db.execute(text("SELECT 1"))).first()
         status.database = "healthy" if result else "unhealthy"
-        db.close()
     except Exception as e:
         status.database = f"error: {str(e)[:50]}"
     
@@ -102,16 +102,15 @@ async def detailed_status():
 async def system_statistics():
     """Estadísticas del sistema para el dashboard"""
     try:
-        from crud import get_alert_statistics, get_position_summary
-        from database import get_db
+        from crud import get_alert_stats, get_top_performers
+        from database import AsyncSessionLocal
         
-        db = next(get_db())
-        
-        # Obtener estadísticas de alertas
-        alert_stats = await get_alert_statistics(db)
-        
-        # Obtener resumen de posiciones
-        position_stats = await get_position_summary(db)
+        async with AsyncSessionLocal() as db:
+            # Obtener estadísticas de alertas
+            alert_stats = await get_alert_stats(db)
+            
+            # Símbolos con mejor tasa de ejecución (las posiciones viven en Binance, no en la BD)
+            top_performers = await get_top_performers(db)
         
         # Información del sistema
         system_info = {
@@ -124,7 +123,7 @@ async def system_statistics():
         
         return {
             "alerts": alert_stats,
-            "positions": position_stats,
+            "top_performers": top_performers,
             "system": system_info,
             "status": "operational"
         }
@@ -0,0 +1,122 @@
+# backend/http_clients.py - Clientes HTTP persistentes (keep-alive) por host upstream
+import os
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "20"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "10"))
+HTTP_POOL_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "60"))
+HTTP_DEFAULT_TIMEOUT = float(os.getenv("HTTP_DEFAULT_TIMEOUT", "10"))
+
+class HostStats:
+    __slots__ = ("requests", "errors", "in_flight", "total_latency", "last_status")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_latency = 0.0
+        self.last_status: Optional[int] = None
+
+class HTTPClientPool:
+    """Un httpx.AsyncClient por host (Binance, Telegram, Discord...) durante toda la vida de la app"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, HostStats] = {}
+        self.limits = httpx.Limits(
+            max_connections=HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_POOL_KEEPALIVE_EXPIRY
+        )
+
+    @staticmethod
+    def _host(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """Cliente del host de la URL (se crea la primera vez que se usa)"""
+        host = self._host(url)
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=host,
+                limits=self.limits,
+                timeout=HTTP_DEFAULT_TIMEOUT
+            )
+            self._clients[host] = client
+            self._stats.setdefault(host, HostStats())
+        return client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Petición por el cliente del host, registrando estadísticas"""
+        client = self.client_for(url)
+        stats = self._stats[self._host(url)]
+        stats.requests += 1
+        stats.in_flight += 1
+        started = time.monotonic()
+        try:
+            response = await client.request(method, url, **kwargs)
+            stats.last_status = response.status_code
+            if response.status_code >= 400:
+                stats.errors += 1
+            return response
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.total_latency += time.monotonic() - started
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def startup(self, *urls: str):
+        """Crear los clientes de los hosts conocidos al arrancar la app"""
+        for url in urls:
+            self.client_for(url)
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def stats(self) -> dict:
+        hosts = {}
+        for host, stats in self._stats.items():
+            client = self._clients.get(host)
+            connections = self._pool_connections(client) if client else []
+            hosts[host] = {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "in_flight": stats.in_flight,
+                "avg_latency_ms": round(stats.total_latency / stats.requests * 1000, 1) if stats.requests else None,
+                "last_status": stats.last_status,
+                "open_connections": len(connections),
+                "idle_connections": len([c for c in connections if c.is_idle()]),
+                "open": client is not None and not client.is_closed
+            }
+        return {
+            "limits": {
+                "max_connections": HTTP_POOL_MAX_CONNECTIONS,
+                "max_keepalive_connections": HTTP_POOL_MAX_KEEPALIVE,
+                "keepalive_expiry": HTTP_POOL_KEEPALIVE_EXPIRY
+            },
+            "hosts": hosts
+        }
+
+    @staticmethod
+    def _pool_connections(client: httpx.AsyncClient) -> list:
+        # httpx no expone el pool públicamente; si cambia la estructura interna, devolvemos []
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        return list(getattr(pool, "connections", []) or [])
+
+# Instancia global
+http_pool = HTTPClientPool()
@@ -0,0 +1,178 @@
+# backend/leader_election.py - Un solo proceso evalúa alertas: advisory lock de Postgres con heartbeat
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from database import DATABASE_URL
+
+# Clave del pg_advisory_lock compartida por API, scanner y alert_workers
+LEADER_LOCK_ID = int(os.getenv("LEADER_LOCK_ID", "7241001"))
+# Cadencia del heartbeat del líder y de los intentos de los seguidores
+LEADER_HEARTBEAT_SECONDS = float(os.getenv("LEADER_HEARTBEAT_SECONDS", "5"))
+
+# Conexión dedicada fuera del pool: el lock vive lo que viva esta sesión.
+# Los keepalives TCP hacen que Postgres libere el lock si el líder muere sin cerrar.
+_lock_engine = create_engine(
+    DATABASE_URL,
+    poolclass=NullPool,
+    isolation_level="AUTOCOMMIT",
+    connect_args={
+        "keepalives": 1,
+        "keepalives_idle": 10,
+        "keepalives_interval": 5,
+        "keepalives_count": 3,
+        "application_name": "cryptoalert-leader"
+    }
+)
+
+Callback = Callable[[], Awaitable[None]]
+
+class LeaderElection:
+    """Elección de líder con pg_try_advisory_lock sobre una conexión propia
+
+    El líder comprueba su sesión en cada heartbeat; si la conexión cae, el lock
+    ya no es suyo y deja de serlo. Los seguidores reintentan con la misma
+    cadencia, así que la conmutación tarda como mucho un heartbeat más lo que
+    Postgres tarde en detectar la sesión muerta.
+    """
+
+    def __init__(self, lock_id: int = LEADER_LOCK_ID, heartbeat: float = LEADER_HEARTBEAT_SECONDS):
+        self.lock_id = lock_id
+        self.heartbeat = heartbeat
+        self.is_leader = False
+        self._connection = None
+        self._elected_callbacks: List[Callback] = []
+        self._demoted_callbacks: List[Callback] = []
+        self._task: Optional[asyncio.Task] = None
+        self.elected_at: Optional[float] = None
+        self.last_heartbeat_at: Optional[float] = None
+        self.elections = 0
+        self.demotions = 0
+
+    def on_elected(self, callback: Callback):
+        self._elected_callbacks.append(callback)
+
+    def on_demoted(self, callback: Callback):
+        self._demoted_callbacks.append(callback)
+
+    # ==================== LOCK (bloqueante, en executor) ====================
+
+    def _try_acquire(self) -> bool:
+        if self._connection is None:
+            self._connection = _lock_engine.connect()
+        acquired = self._connection.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": self.lock_id}
+        ).scalar()
+        if not acquired:
+            # No retener conexiones ociosas mientras otro es líder
+            self._close_connection()
+        return bool(acquired)
+
+    def _still_held(self) -> bool:
+        held = self._connection.execute(
+            text(
+                "SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted "
+                "AND pid = pg_backend_pid() AND ((classid::bigint << 32) | objid::bigint) = :id"
+            ),
+            {"id": self.lock_id}
+        ).first()
+        return held is not None
+
+    def _release(self):
+        try:
+            if self._connection is not None:
+                self._connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": self.lock_id})
+        finally:
+            self._close_connection()
+
+    def _close_connection(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    # ==================== CICLO DE VIDA ====================
+
+    async def start(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self.is_leader:
+            await self._demote("parada")
+        await asyncio.get_running_loop().run_in_executor(None, self._release)
+
+    async def wait_until_leader(self):
+        while not self.is_leader:
+            await asyncio.sleep(self.heartbeat)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if self.is_leader:
+                    if await loop.run_in_executor(None, self._still_held):
+                        self.last_heartbeat_at = time.time()
+                    else:
+                        await self._demote("lock perdido")
+                elif await loop.run_in_executor(None, self._try_acquire):
+                    await self._elect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Conexión caída: si éramos líder, Postgres ya soltó el lock
+                print(f"❌ Error en elección de líder: {e}")
+                self._close_connection()
+                if self.is_leader:
+                    await self._demote("conexión perdida")
+            await asyncio.sleep(self.heartbeat)
+
+    async def _elect(self):
+        self.is_leader = True
+        self.elected_at = self.last_heartbeat_at = time.time()
+        self.elections += 1
+        print(f"👑 Proceso {os.getpid()} elegido líder del motor de alertas")
+        for callback in self._elected_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                print(f"❌ Error iniciando como líder: {e}")
+
+    async def _demote(self, reason: str):
+        self.is_leader = False
+        self.elected_at = None
+        self.demotions += 1
+        print(f"⚠️ Proceso {os.getpid()} deja de ser líder ({reason})")
+        for callback in self._demoted_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                print(f"❌ Error deteniendo como líder: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "is_leader": self.is_leader,
+            "lock_id": self.lock_id,
+            "heartbeat_seconds": self.heartbeat,
+            "elected_at": self.elected_at,
+            "last_heartbeat_at": self.last_heartbeat_at,
+            "elections": self.elections,
+            "demotions": self.demotions
+        }
+
+# Instancia global
+leader_election = LeaderElection()
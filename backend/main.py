@@ -1,14 +1,36 @@
 # backend/main.py - COMPLETO Y CORREGIDO - TODAS LAS FUNCIONALIDADES INCLUIDAS
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 import uvicorn
 import asyncio
+import time
+import json
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 import crud
 import schemas
 import models
-from database import SessionLocal, get_db, init_database, test_connection, run_migrations
+from database import get_async_db, close_async_engine, init_database, test_connection, run_migrations
+from price_stream import price_engine
+from price_cache import price_cache
+from tick_history import tick_history
+from alert_registry import alert_registry
+from alert_snapshot import alert_snapshot
+from etags import INSTANCE_ID, change_counters, etag_matches, make_etag, not_modified, page_symbols
+from trading_snapshot import position_pnl, trading_snapshot
+from stream_hub import stream_hub, SlowConsumerError, StreamClient
+from expiry_scheduler import expiry_scheduler
+from leader_election import leader_election
+from poll_scheduler import alert_poller, POLL_MIN_INTERVAL
+from alert_workers import ALERT_EVALUATION_MODE
+from http_clients import http_pool
+from symbol_registry import symbol_registry
+from shared_state import shared_state
+from binance_scheduler import binance_scheduler, PRIORITY_TEST
+from upstreams import BINANCE_SPOT_URL, BINANCE_FUTURES_URL, TELEGRAM_API_URL, binance_futures_url
 
 # Inicialización del sistema
 print("🔌 Inicializando sistema...")
@@ -24,6 +46,16 @@ else:
 
 app = FastAPI(title="CryptoAlert System", version="2.0.0")
 
+def remote_alert_changed(alert_id):
+    """Cambio hecho por otro proceso (crud lo publica tras el commit)
+
+    Todos los procesos invalidan su instantánea; solo el líder mantiene el
+    registro evaluado y relee esa alerta.
+    """
+    alert_snapshot.invalidate()
+    if leader_election.is_leader:
+        alert_registry.refresh_alert(alert_id)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # En producción, especificar dominios exactos
@@ -34,27 +66,49 @@ app.add_middleware(
 )
 
 async def monitor_alerts_background():
-    """Monitor de alertas en background con notificaciones"""
+    """Monitor de alertas en background con notificaciones (respaldo REST del WebSocket)"""
     print("🔄 Iniciando monitor de alertas en background...")
     
     while True:
+        # Con el stream sano las alertas se evalúan en cada tick: sin llamadas REST
+        if price_engine.is_healthy():
+            await asyncio.sleep(30)
+            continue
+        
         try:
-            db = SessionLocal()
-            
-            # Verificar alertas y enviar notificaciones automáticamente
-            await crud.check_and_trigger_alerts(db)
-            
-            db.close()
-            
+            # Solo los símbolos que tocan según su distancia al target y volatilidad
+            await alert_poller.poll_once()
         except Exception as e:
             print(f"❌ Error en monitor de alertas: {e}")
-            try:
-                db.close()
-            except:
-                pass
         
-        # Esperar 30 segundos antes del próximo check
-        await asyncio.sleep(30)
+        await asyncio.sleep(POLL_MIN_INTERVAL)
+
+_monitor_task = None
+
+async def start_alert_engine():
+    """Al ser elegido líder: cargar alertas y arrancar evaluación, expiración y monitor"""
+    global _monitor_task
+    # En modo auto el líder es también el único productor de datos de mercado
+    await shared_state.set_leader(True)
+    if shared_state.enabled:
+        # Publicar ya el universo de símbolos para los lectores
+        await symbol_registry.refresh()
+    await alert_registry.start()
+    await expiry_scheduler.start()
+    price_engine.start()
+    if _monitor_task is None or _monitor_task.done():
+        _monitor_task = asyncio.create_task(monitor_alerts_background())
+
+async def stop_alert_engine():
+    """Al perder el liderazgo: volver a ser un servidor de API puro"""
+    global _monitor_task
+    if _monitor_task:
+        _monitor_task.cancel()
+        _monitor_task = None
+    await price_engine.stop()
+    await expiry_scheduler.stop()
+    await alert_registry.stop()
+    await shared_state.set_leader(False)
 
 @app.on_event("startup")
 async def startup_event():
@@ -66,9 +120,54 @@ async def startup_event():
     else:
         print("❌ Error de conexión a base de datos")
     
-    # Iniciar monitoreo de alertas con notificaciones
-    asyncio.create_task(monitor_alerts_background())
-    print("🚀 Sistema iniciado con notificaciones activas")
+    # Clientes HTTP persistentes para los upstreams conocidos
+    await http_pool.startup(
+        BINANCE_SPOT_URL,
+        BINANCE_FUTURES_URL,
+        TELEGRAM_API_URL
+    )
+    
+    # Estado compartido en Redis (opcional, REDIS_URL)
+    await shared_state.connect()
+    
+    # Universo de símbolos en memoria con refresco periódico
+    symbol_registry.start()
+    
+    # Alertas enriquecidas precalculadas para los endpoints de lectura (todos los procesos)
+    await alert_snapshot.start()
+    # Cambios de alertas de otros procesos: cualquier rol y modo de evaluación los ve
+    shared_state.on_alerts_changed(remote_alert_changed)
+    
+    # Feed de /api/stream (un productor por proceso, eventos vía Redis)
+    await stream_hub.start()
+    
+    if shared_state.reader_only:
+        # Lector: solo API, el productor evalúa alertas y publica precios
+        print("🚀 Sistema iniciado en modo lector (Redis)")
+        return
+    
+    if ALERT_EVALUATION_MODE == "sharded":
+        # Las alertas las evalúa alert_workers.py en sus propios procesos
+        print("🚀 Sistema iniciado; evaluación de alertas en alert_workers.py")
+        return
+    
+    # Con varios workers (o scanner.py al lado) solo el líder evalúa alertas:
+    # registro en memoria, motor de precios, expiración y monitor REST de respaldo
+    leader_election.on_elected(start_alert_engine)
+    leader_election.on_demoted(stop_alert_engine)
+    await leader_election.start()
+    print("🚀 Sistema iniciado; el motor de alertas corre en el proceso líder")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Suelta el lock: otro worker toma el relevo en el siguiente heartbeat
+    await leader_election.stop()
+    await stream_hub.stop()
+    await alert_snapshot.stop()
+    await symbol_registry.stop()
+    await shared_state.close()
+    await http_pool.close()
+    await close_async_engine()
 
 @app.get("/")
 async def root():
@@ -97,78 +196,166 @@ async def favicon():
 
 # ==================== ALERTS ENDPOINTS ====================
 
+async def snapshot_or_304(request: Request, response: Response):
+    """Instantánea para la respuesta, o un 304 si el cliente ya tiene esta versión
+
+    get() solo relee la BD si alguna alerta cambió, aquí o en otro proceso (la
+    versión de alertas del ETag difiere de la de su última relectura), en la
+    primera petición o tras un periodo inactivo.
+    """
+    alerts_key = await change_counters.get("alerts")
+    snapshot = await alert_snapshot.get(alerts_key)
+    etag = make_etag(request.url.path, alerts_key, INSTANCE_ID, snapshot.version)
+    return snapshot, not_modified(request, response, etag)
+
+# Estados que forman el historial (todo lo que ya no está PENDING)
+HISTORIAL_STATUSES = [
+    models.AlertStatusEnum.TRIGGERED,
+    models.AlertStatusEnum.EXECUTED,
+    models.AlertStatusEnum.CANCELLED,
+    models.AlertStatusEnum.EXPIRED
+]
+
+def page_etag(key: tuple, symbols: Tuple[str, ...]) -> str:
+    """ETag de una página: su clave más el precio cacheado de cada uno de sus símbolos"""
+    return make_etag(*key, *(f"{symbol}={price_cache.peek(symbol)}" for symbol in symbols))
+
+async def alerts_page(request: Request, response: Response, db: AsyncSession, limit: int,
+                      cursor: Optional[str], extra: Optional[dict] = None,
+                      alerts_key: Optional[str] = None, **filters):
+    """Página keyset enriquecida con la caché de precios, o un 304 si no cambió
+
+    La versión es la de las alertas más los precios de los símbolos de la página
+    (no el contador global de ticks): un tick de otro símbolo no la invalida.
+    Los símbolos de cada página servida se recuerdan, así que revalidar no
+    consulta la BD. ``extra`` son campos que se añaden a la respuesta y al ETag;
+    ``alerts_key`` la versión de alertas si el llamador ya la leyó.
+    """
+    extra = extra or {}
+    if alerts_key is None:
+        alerts_key = await change_counters.get("alerts")
+    key = (request.url.path, request.url.query, alerts_key, *sorted(extra.items()))
+    symbols = page_symbols.get(key)
+    if symbols is not None:
+        cached = not_modified(request, response, page_etag(key, symbols))
+        if cached:
+            return cached
+
+    try:
+        alerts, next_cursor = await crud.get_alerts(db, limit=limit, cursor=cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    enriched_alerts = crud.enrich_alerts_with_cached_prices(alerts)
+    symbols = tuple(dict.fromkeys(alert.symbol for alert in alerts))
+    page_symbols.put(key, symbols)
+    # Mismos precios que acaba de leer enrich (sin await entre medias)
+    cached = not_modified(request, response, page_etag(key, symbols))
+    if cached:
+        return cached
+    return {
+        "alerts": enriched_alerts,
+        "count": len(enriched_alerts),
+        "next_cursor": next_cursor,
+        **extra
+    }
+
 @app.get("/api/alerts")
-async def get_alerts(db: Session = Depends(get_db)):
+async def get_alerts(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    status: Optional[models.AlertStatusEnum] = None,
+    symbol: Optional[str] = None,
+    alert_type: Optional[models.AlertTypeEnum] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Alertas por fecha de creación descendente; ``next_cursor`` pide la página siguiente"""
     try:
-        alerts = crud.get_alerts(db)
-        enriched_alerts = await crud.enrich_alerts_with_prices(alerts)
-        return {
-            "alerts": enriched_alerts,
-            "total": len(enriched_alerts),
-            "active": len([a for a in enriched_alerts if a["status"] == "PENDING"])
-        }
+        # Totales globales ya calculados en la instantánea (sin COUNT por petición),
+        # releída si la versión de alertas cambió en otro proceso
+        alerts_key = await change_counters.get("alerts")
+        snapshot = await alert_snapshot.get(alerts_key)
+        return await alerts_page(
+            request, response, db, limit, cursor,
+            extra={"total": snapshot.total, "active": snapshot.count(models.AlertStatusEnum.PENDING)},
+            alerts_key=alerts_key,
+            statuses=[status] if status else None,
+            symbol=symbol.upper() if symbol else None,
+            alert_type=alert_type,
+            created_from=created_from,
+            created_to=created_to
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error en get_alerts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/alerts/active")
-async def get_active_alerts(db: Session = Depends(get_db)):
+async def get_active_alerts(request: Request, response: Response):
     try:
-        alerts = crud.get_active_alerts(db)
-        enriched_alerts = await crud.enrich_alerts_with_prices(alerts)
+        snapshot, cached = await snapshot_or_304(request, response)
+        if cached:
+            return cached
         return {
-            "alerts": enriched_alerts,
-            "count": len(enriched_alerts)
+            "alerts": snapshot.active,
+            "count": len(snapshot.active)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/alerts/proximas")
-async def get_proximas_alerts(db: Session = Depends(get_db)):
+async def get_proximas_alerts(request: Request, response: Response):
     try:
-        alerts = crud.get_active_alerts(db)
-        enriched_alerts = await crud.enrich_alerts_with_prices(alerts)
-        proximas = [a for a in enriched_alerts if a.get("progress_percentage", 0) >= 80]
-        proximas.sort(key=lambda x: x.get("progress_percentage", 0), reverse=True)
+        snapshot, cached = await snapshot_or_304(request, response)
+        if cached:
+            return cached
         return {
-            "alerts": proximas,
-            "count": len(proximas)
+            "alerts": snapshot.proximas,
+            "count": len(snapshot.proximas)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/alerts/historial")
-async def get_historial_alerts(db: Session = Depends(get_db)):
+async def get_historial_alerts(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    symbol: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
-        alerts = crud.get_alerts(db)
-        enriched_alerts = await crud.enrich_alerts_with_prices(alerts)
-        historial = [a for a in enriched_alerts if a["status"] in ["TRIGGERED", "EXECUTED", "CANCELLED"]]
-        historial.sort(key=lambda x: x["created_at"], reverse=True)
-        return {
-            "alerts": historial,
-            "count": len(historial)
-        }
+        return await alerts_page(
+            request, response, db, limit, cursor,
+            statuses=HISTORIAL_STATUSES,
+            symbol=symbol.upper() if symbol else None
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/alerts/stats")
-async def get_alerts_stats(db: Session = Depends(get_db)):
+async def get_alerts_stats(request: Request, response: Response):
     try:
-        alerts = crud.get_alerts(db)
-        enriched_alerts = await crud.enrich_alerts_with_prices(alerts)
-        
-        total = len(enriched_alerts)
-        pending = len([a for a in enriched_alerts if a["status"] == "PENDING"])
-        triggered = len([a for a in enriched_alerts if a["status"] == "TRIGGERED"])
-        executed = len([a for a in enriched_alerts if a["status"] == "EXECUTED"])
+        snapshot, cached = await snapshot_or_304(request, response)
+        if cached:
+            return cached
         
+        total = snapshot.total
+        executed = snapshot.count(models.AlertStatusEnum.EXECUTED)
         success_rate = (executed / total * 100) if total > 0 else 0
         
         return {
             "overview": {
                 "total_alerts": total,
-                "pending": pending,
-                "triggered": triggered,
+                "pending": snapshot.count(models.AlertStatusEnum.PENDING),
+                "triggered": snapshot.count(models.AlertStatusEnum.TRIGGERED),
                 "executed": executed,
                 "success_rate": round(success_rate, 1)
             }
@@ -176,15 +363,19 @@ async def get_alerts_stats(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/alerts/snapshot/stats")
+async def get_alert_snapshot_stats():
+    """Estado de la instantánea de alertas enriquecidas"""
+    return alert_snapshot.stats()
+
 @app.post("/api/alerts")
-async def create_alert(alert: schemas.AlertCreate, db: Session = Depends(get_db)):
+async def create_alert(alert: schemas.AlertCreate, db: AsyncSession = Depends(get_async_db)):
     try:
         # Validar símbolo
-        supported_coins = await crud.get_supported_futures_symbols()
-        if alert.symbol not in supported_coins:
+        if not symbol_registry.is_supported(alert.symbol):
             raise HTTPException(status_code=400, detail=f"Símbolo {alert.symbol} no soportado")
         
-        db_alert = crud.create_alert(db=db, alert=alert)
+        db_alert = await crud.create_alert(db=db, alert=alert)
         current_price = await crud.get_binance_price(alert.symbol)
         
         return {
@@ -198,7 +389,8 @@ async def create_alert(alert: schemas.AlertCreate, db: Session = Depends(get_db)
                 "status": db_alert.status.value,
                 "notes": db_alert.notes,
                 "created_at": db_alert.created_at.isoformat(),
-                "trade_id": db_alert.trade_id
+                "trade_id": db_alert.trade_id,
+                "condition": db_alert.condition
             }
         }
     except Exception as e:
@@ -206,9 +398,9 @@ async def create_alert(alert: schemas.AlertCreate, db: Session = Depends(get_db)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/alerts/{alert_id}")
-async def delete_alert(alert_id: int, db: Session = Depends(get_db)):
+async def delete_alert(alert_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        success = crud.delete_alert(db=db, alert_id=alert_id)
+        success = await crud.delete_alert(db=db, alert_id=alert_id)
         if success:
             return {"message": f"✅ Alerta {alert_id} eliminada"}
         else:
@@ -217,10 +409,10 @@ async def delete_alert(alert_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.put("/api/alerts/{alert_id}")
-async def update_alert(alert_id: int, alert: schemas.AlertCreate, db: Session = Depends(get_db)):
+async def update_alert(alert_id: int, alert: schemas.AlertCreate, db: AsyncSession = Depends(get_async_db)):
     """Actualizar una alerta existente"""
     try:
-        db_alert = crud.update_alert(db=db, alert_id=alert_id, alert=alert)
+        db_alert = await crud.update_alert(db=db, alert_id=alert_id, alert=alert)
         if db_alert is None:
             raise HTTPException(status_code=404, detail="Alerta no encontrada")
         
@@ -237,13 +429,93 @@ async def update_alert(alert_id: int, alert: schemas.AlertCreate, db: Session =
                 "status": db_alert.status.value,
                 "notes": db_alert.notes,
                 "created_at": db_alert.created_at.isoformat(),
-                "trade_id": db_alert.trade_id
+                "trade_id": db_alert.trade_id,
+                "condition": db_alert.condition
             }
         }
     except Exception as e:
         print(f"Error actualizando alerta: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ==================== STREAM ENDPOINTS ====================
+
+def split_param(value: Optional[str]) -> list:
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+async def stream_websocket_reader(websocket: WebSocket, client: StreamClient):
+    """Cambios de suscripción: {"action": "subscribe"|"unsubscribe", "topics": [...], "symbols": [...]}"""
+    while True:
+        try:
+            message = json.loads(await websocket.receive_text())
+            action = message.get("action")
+            topics = message.get("topics") or []
+            symbols = message.get("symbols") or []
+        except (ValueError, AttributeError):
+            await websocket.send_json({"type": "error", "data": {"detail": "Mensaje JSON inválido"}})
+            continue
+        if action == "subscribe":
+            client.subscribe(topics, symbols)
+            stream_hub.send_initial_state(client)
+        elif action == "unsubscribe":
+            client.unsubscribe(topics, symbols)
+
+@app.websocket("/api/stream")
+async def stream_websocket(websocket: WebSocket, topics: str = "alerts", symbols: Optional[str] = None):
+    """Push de progreso de alertas, disparos, precios y posiciones (sustituye al polling)"""
+    await websocket.accept()
+    try:
+        client = stream_hub.connect(split_param(topics), split_param(symbols))
+    except ConnectionRefusedError as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+    
+    reader = asyncio.create_task(stream_websocket_reader(websocket, client))
+    try:
+        while not reader.done():
+            messages = await client.next_messages()
+            for message in messages:
+                await websocket.send_json(message)
+    except SlowConsumerError as e:
+        print(f"⚠️ Cliente de stream lento desconectado: {e}")
+        await websocket.close(code=1013, reason="Cliente lento: reconectar")
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        reader.cancel()
+        stream_hub.disconnect(client)
+
+@app.get("/api/stream")
+async def stream_events(request: Request, topics: str = "alerts", symbols: Optional[str] = None):
+    """Mismo feed como Server-Sent Events para clientes sin WebSocket"""
+    try:
+        client = stream_hub.connect(split_param(topics), split_param(symbols))
+    except ConnectionRefusedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    async def event_source():
+        try:
+            while not await request.is_disconnected():
+                for message in await client.next_messages():
+                    if message["type"] == "ping":
+                        yield ": ping\n\n"
+                    else:
+                        yield f"event: {message['type']}\ndata: {json.dumps(message, default=str)}\n\n"
+        except SlowConsumerError as e:
+            print(f"⚠️ Cliente de stream lento desconectado: {e}")
+        finally:
+            stream_hub.disconnect(client)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/stream/stats")
+async def get_stream_stats():
+    """Clientes conectados al stream y eventos publicados"""
+    return stream_hub.stats()
+
 # ==================== PRICES ENDPOINTS ====================
 
 @app.get("/api/prices/realtime")
@@ -254,21 +526,94 @@ async def get_realtime_prices(pairs: str = "BTCUSDT,ETHUSDT"):
         
         formatted_prices = {}
         for symbol, price in prices.items():
+            updated_at = price_cache.timestamp(symbol) or datetime.now()
             formatted_prices[symbol] = {
                 "price": price,
                 "symbol": symbol,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": updated_at.isoformat()
             }
         
         return {"prices": formatted_prices}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/prices/stream/status")
+async def get_price_stream_status():
+    """Estado del motor de precios WebSocket"""
+    return price_engine.stats()
+
+@app.get("/api/prices/cache/stats")
+async def get_price_cache_stats():
+    """Estadísticas de la caché de precios"""
+    return price_cache.stats()
+
+@app.get("/api/alerts/registry/stats")
+async def get_alert_registry_stats():
+    """Estado del registro de alertas activas en memoria"""
+    return alert_registry.stats()
+
+@app.get("/api/alerts/polling/stats")
+async def get_alert_polling_stats():
+    """Cadencia adaptativa del monitor REST de respaldo"""
+    return alert_poller.stats()
+
+@app.get("/api/leader")
+async def get_leader_status():
+    """Si este proceso es el líder que evalúa alertas"""
+    return leader_election.stats()
+
+@app.get("/api/alerts/expiry/stats")
+async def get_alert_expiry_stats():
+    """Estado del programador de expiración de alertas"""
+    return expiry_scheduler.stats()
+
+@app.get("/api/prices/history/stats")
+async def get_tick_history_stats():
+    """Estadísticas del historial de ticks en memoria"""
+    return tick_history.stats()
+
+@app.get("/api/prices/{symbol}/history")
+async def get_price_history(symbol: str, seconds: int = 900, points: int = 60):
+    """Sparkline del símbolo desde el historial en memoria (sin llamadas a Binance)"""
+    symbol = symbol.upper()
+    seconds = max(1, min(seconds, 24 * 60 * 60))
+    points = max(2, min(points, 500))
+    return {
+        "symbol": symbol,
+        "seconds": seconds,
+        "summary": tick_history.window(symbol, seconds),
+        "points": tick_history.sparkline(symbol, seconds, points)
+    }
+
+@app.get("/api/system/shared-state")
+async def get_shared_state_stats():
+    """Estado de la capa Redis compartida"""
+    return shared_state.stats()
+
+@app.get("/api/system/binance-weight")
+async def get_binance_weight_stats():
+    """Uso de request weight de Binance y profundidad de colas por prioridad"""
+    return binance_scheduler.stats()
+
+@app.get("/api/system/etags")
+async def get_etag_stats():
+    """Contadores de versión de los ETags y lecturas de Binance cacheadas"""
+    return {
+        "change_counters": change_counters.stats(),
+        "page_symbols": page_symbols.stats(),
+        "trading_snapshot": trading_snapshot.stats()
+    }
+
+@app.get("/api/system/http-pools")
+async def get_http_pool_stats():
+    """Estadísticas de los pools HTTP por host upstream"""
+    return http_pool.stats()
+
 @app.get("/api/coins/supported")
 async def get_supported_coins():
     """Obtener monedas soportadas para FUTURES trading"""
     try:
-        symbols = await crud.get_supported_futures_symbols()
+        symbols = symbol_registry.supported_list
         return {
             "coins": symbols,
             "count": len(symbols),
@@ -289,6 +634,14 @@ async def get_supported_coins():
             "note": "Lista predeterminada de futuros"
         }
 
+@app.get("/api/coins/{symbol}/info")
+async def get_coin_info(symbol: str):
+    """Metadatos del contrato (tick size, step size, estado)"""
+    info = symbol_registry.get(symbol.upper())
+    if not info:
+        raise HTTPException(status_code=404, detail=f"Símbolo {symbol} no encontrado")
+    return info.to_dict()
+
 @app.get("/api/market/info")
 async def get_market_info():
     """Información del mercado configurado"""
@@ -298,16 +651,16 @@ async def get_market_info():
         "leverage_available": True,
         "max_leverage": "125x",
         "settlement": "USDT",
-        "api_endpoint": "https://fapi.binance.com"
+        "api_endpoint": BINANCE_FUTURES_URL
     }
 
 # ==================== CONFIG ENDPOINTS ====================
 
 @app.get("/api/config")
-async def get_system_config(db: Session = Depends(get_db)):
+async def get_system_config(db: AsyncSession = Depends(get_async_db)):
     """Obtener configuración actual del sistema"""
     try:
-        config = crud.get_config(db)
+        config = await crud.get_config(db)
         return {
             "config": config.to_dict(),
             "message": "Configuración cargada correctamente"
@@ -317,10 +670,13 @@ async def get_system_config(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/config")
-async def update_system_config(config_update: schemas.ConfigUpdate, db: Session = Depends(get_db)):
+async def update_system_config(config_update: schemas.ConfigUpdate, db: AsyncSession = Depends(get_async_db)):
     """Actualizar configuración del sistema"""
     try:
-        updated_config = crud.update_config(db, config_update)
+        updated_config = await crud.update_config(db, config_update)
+        expiry_scheduler.reload_config()
+        # Las API keys o testnet pueden haber cambiado
+        trading_snapshot.clear()
         return {
             "config": updated_config.to_dict(),
             "message": "✅ Configuración actualizada correctamente"
@@ -430,17 +786,17 @@ async def get_telegram_chat_ids(bot_token: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/config/binance/status")
-async def get_binance_status(db: Session = Depends(get_db)):
+async def get_binance_status(db: AsyncSession = Depends(get_async_db)):
     """Verificar estado de la configuración de Binance"""
     try:
-        config = crud.get_config(db)
+        config = await crud.get_config(db)
         
         has_keys = bool(config.binance_api_key and config.binance_secret_key)
         
         status = {
             "configured": has_keys,
             "testnet": config.use_testnet,
-            "api_endpoint": "https://testnet.binancefuture.com" if config.use_testnet else "https://fapi.binance.com"
+            "api_endpoint": binance_futures_url(config.use_testnet)
         }
         
         if has_keys:
@@ -459,16 +815,18 @@ async def get_binance_status(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/config/reset")
-async def reset_system_config(db: Session = Depends(get_db)):
+async def reset_system_config(db: AsyncSession = Depends(get_async_db)):
     """Resetear configuración a valores por defecto"""
     try:
-        db.query(models.Config).delete()
-        db.commit()
+        await db.execute(delete(models.Config))
+        await db.commit()
         
         new_config = models.Config()
         db.add(new_config)
-        db.commit()
-        db.refresh(new_config)
+        await db.commit()
+        await db.refresh(new_config)
+        await change_counters.bump("config")
+        trading_snapshot.clear()
         
         return {
             "message": "✅ Configuración reseteada a valores por defecto",
@@ -477,14 +835,14 @@ async def reset_system_config(db: Session = Depends(get_db)):
         
     except Exception as e:
         print(f"Error reseteando configuración: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/notifications/test")
-async def test_notifications_manual(db: Session = Depends(get_db)):
+async def test_notifications_manual(db: AsyncSession = Depends(get_async_db)):
     """Endpoint para probar notificaciones manualmente"""
     try:
-        config = crud.get_config(db)
+        config = await crud.get_config(db)
         
         test_message = f"""🧪 <b>Test Manual de Notificaciones</b> 🧪
 
@@ -528,34 +886,38 @@ async def test_notifications_manual(db: Session = Depends(get_db)):
 # ==================== DASHBOARD ENDPOINTS ====================
 
 @app.get("/api/dashboard/recent-alerts")
-async def get_recent_alerts(db: Session = Depends(get_db)):
+async def get_recent_alerts(request: Request, response: Response):
     try:
-        recent_alerts = db.query(models.Alert).order_by(
-            models.Alert.created_at.desc()
-        ).limit(10).all()
-        
-        enriched_alerts = await crud.enrich_alerts_with_prices(recent_alerts)
+        snapshot, cached = await snapshot_or_304(request, response)
+        if cached:
+            return cached
         
         return {
-            "alerts": enriched_alerts,
-            "count": len(enriched_alerts)
+            "alerts": snapshot.recent,
+            "count": len(snapshot.recent)
         }
     except Exception as e:
         print(f"Error en recent-alerts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/dashboard/performance")
-async def get_performance(db: Session = Depends(get_db)):
+async def get_performance(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     try:
-        stats = crud.get_alert_stats(db, days=30)
+        # Las ventanas (hoy, 7 y 30 días) se desplazan: la versión caduca cada minuto
+        etag = make_etag(request.url.path, await change_counters.get("alerts"), int(time.time() // 60))
+        cached = not_modified(request, response, etag)
+        if cached:
+            return cached
+        
+        stats = await crud.get_alert_stats(db, days=30)
         
-        today_alerts = db.query(models.Alert).filter(
+        today_alerts = await db.scalar(select(func.count(models.Alert.id)).where(
             models.Alert.created_at >= datetime.now().replace(hour=0, minute=0, second=0)
-        ).count()
+        ))
         
-        week_alerts = db.query(models.Alert).filter(
+        week_alerts = await db.scalar(select(func.count(models.Alert.id)).where(
             models.Alert.created_at >= datetime.now() - timedelta(days=7)
-        ).count()
+        ))
         
         performance = {
             "total_alerts_30d": stats["total_alerts"],
@@ -573,21 +935,15 @@ async def get_performance(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/dashboard/opportunities")
-async def get_opportunities(db: Session = Depends(get_db)):
+async def get_opportunities(request: Request, response: Response):
     try:
-        active_alerts = crud.get_active_alerts(db)
-        enriched_alerts = await crud.enrich_alerts_with_prices(active_alerts)
-        
-        opportunities = [
-            alert for alert in enriched_alerts 
-            if alert.get("progress_percentage", 0) >= 80
-        ]
-        
-        opportunities.sort(key=lambda x: x.get("progress_percentage", 0), reverse=True)
+        snapshot, cached = await snapshot_or_304(request, response)
+        if cached:
+            return cached
         
         return {
-            "opportunities": opportunities[:5],
-            "count": len(opportunities)
+            "opportunities": snapshot.proximas[:5],
+            "count": len(snapshot.proximas)
         }
     except Exception as e:
         print(f"Error en opportunities: {e}")
@@ -598,7 +954,7 @@ async def test_prices(symbols: str = "BTCUSDT,ETHUSDT"):
     """Endpoint para testear la obtención de precios"""
     try:
         symbols_list = [s.strip() for s in symbols.split(',')]
-        prices = await crud.get_multiple_prices(symbols_list)
+        prices = await crud.get_multiple_prices(symbols_list, PRIORITY_TEST)
         
         return {
             "requested_symbols": symbols_list,
@@ -611,11 +967,36 @@ async def test_prices(symbols: str = "BTCUSDT,ETHUSDT"):
 
 # ==================== TRADING ENDPOINTS - CORREGIDOS ====================
 
+async def trading_etag(request: Request, *names: str) -> Tuple[str, Optional[str]]:
+    """(clave de configuración, ETag) para endpoints sobre lecturas de Binance
+
+    El ETag es None si alguna lectura de trading_snapshot ya caducó: entonces
+    hay que consultar Binance antes de saber la versión. Incluye el minuto
+    porque las respuestas llevan tiempos relativos (tiempo en posición, 24h).
+    """
+    config_key = await change_counters.get("config")
+    versions = [trading_snapshot.version(name, config_key) for name in names]
+    if None in versions:
+        return config_key, None
+    etag = make_etag(
+        request.url.path, INSTANCE_ID, config_key, await change_counters.get("alerts"),
+        *versions, int(time.time() // 60)
+    )
+    return config_key, etag
+
+async def trading_not_modified(request: Request, response: Response, *names: str) -> Optional[Response]:
+    _, etag = await trading_etag(request, *names)
+    return not_modified(request, response, etag) if etag else None
+
 @app.get("/api/trading/account")
-async def get_trading_account(db: Session = Depends(get_db)):
+async def get_trading_account(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Obtener información de la cuenta de trading"""
     try:
-        config = crud.get_config(db)
+        config_key, etag = await trading_etag(request, "account")
+        if etag and etag_matches(request, etag):
+            return not_modified(request, response, etag)
+        
+        config = await crud.get_config(db)
         
         if not config.binance_api_key or not config.binance_secret_key:
             raise HTTPException(status_code=400, detail="Binance API keys no configuradas")
@@ -626,11 +1007,15 @@ async def get_trading_account(db: Session = Depends(get_db)):
         from binance_service import BinanceFuturesService
         binance = BinanceFuturesService(api_key, secret_key, config.use_testnet)
         
-        account_info = await binance.get_account_info()
+        account_info = await trading_snapshot.get("account", config_key, binance.get_account_info)
         
         if not account_info:
             raise HTTPException(status_code=500, detail="Error obteniendo información de cuenta")
         
+        cached = await trading_not_modified(request, response, "account")
+        if cached:
+            return cached
+        
         return {
             "account": account_info,
             "testnet": config.use_testnet,
@@ -644,10 +1029,15 @@ async def get_trading_account(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/trading/positions")
-async def get_trading_positions(db: Session = Depends(get_db)):
+async def get_trading_positions(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Obtener posiciones activas con TPs automáticos - CORREGIDO"""
     try:
-        config = crud.get_config(db)
+        # Sondeo sin cambios: 304 sin BD ni Binance
+        config_key, etag = await trading_etag(request, "positions")
+        if etag and etag_matches(request, etag):
+            return not_modified(request, response, etag)
+        
+        config = await crud.get_config(db)
         
         if not config.binance_api_key or not config.binance_secret_key:
             return {"positions": [], "count": 0, "total_unrealized_pnl": 0}
@@ -658,7 +1048,12 @@ async def get_trading_positions(db: Session = Depends(get_db)):
         from binance_service import BinanceFuturesService
         binance = BinanceFuturesService(api_key, secret_key, config.use_testnet)
         
-        raw_positions = await binance.get_positions()
+        raw_positions = await trading_snapshot.get("positions", config_key, binance.get_positions)
+        
+        # Binance consultado pero sin cambios: sin consultas de alertas ni serialización
+        cached = await trading_not_modified(request, response, "positions")
+        if cached:
+            return cached
         
         enriched_positions = []
         for pos in raw_positions:
@@ -668,12 +1063,7 @@ async def get_trading_positions(db: Session = Depends(get_db)):
             mark_price = float(pos.get('markPrice', 0))
             
             # Calcular PnL manualmente
-            if size > 0:  # LONG
-                pnl_percent = ((mark_price - entry_price) / entry_price) * 100 if entry_price > 0 else 0
-            else:  # SHORT
-                pnl_percent = ((entry_price - mark_price) / entry_price) * 100 if entry_price > 0 else 0
-            
-            pnl_usd = abs(size) * (mark_price - entry_price) if size > 0 else abs(size) * (entry_price - mark_price)
+            pnl_percent, pnl_usd = position_pnl(pos)
             
             # Calcular TPs y SL
             direction = 'LONG' if size > 0 else 'SHORT'
@@ -682,10 +1072,10 @@ async def get_trading_positions(db: Session = Depends(get_db)):
             sl = binance.calculate_stop_loss(entry_price, leverage, direction)
             
             # Buscar alertas relacionadas
-            related_alerts = db.query(models.Alert).filter(
+            related_alerts = (await db.execute(select(models.Alert).where(
                 models.Alert.symbol == symbol,
                 models.Alert.status.in_([models.AlertStatusEnum.TRIGGERED, models.AlertStatusEnum.EXECUTED])
-            ).order_by(models.Alert.triggered_at.desc()).limit(1).all()
+            ).order_by(models.Alert.triggered_at.desc()).limit(1))).scalars().all()
             
             position_data = {
                 'symbol': symbol,
@@ -739,10 +1129,14 @@ async def get_trading_positions(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/trading/balance")
-async def get_trading_balance(db: Session = Depends(get_db)):
+async def get_trading_balance(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Obtener balance de la cuenta - CORREGIDO"""
     try:
-        config = crud.get_config(db)
+        config_key, etag = await trading_etag(request, "account", "positions")
+        if etag and etag_matches(request, etag):
+            return not_modified(request, response, etag)
+        
+        config = await crud.get_config(db)
         
         if not config.binance_api_key or not config.binance_secret_key:
             return {"total": 0, "available": 0, "unrealized_pnl": 0, "positions_count": 0}
@@ -753,12 +1147,18 @@ async def get_trading_balance(db: Session = Depends(get_db)):
         from binance_service import BinanceFuturesService
         binance = BinanceFuturesService(api_key, secret_key, config.use_testnet)
         
-        account_info = await binance.get_account_info()
-        positions = await binance.get_positions()
+        account_info, positions = await asyncio.gather(
+            trading_snapshot.get("account", config_key, binance.get_account_info),
+            trading_snapshot.get("positions", config_key, binance.get_positions)
+        )
         
         if not account_info:
             return {"total": 0, "available": 0, "unrealized_pnl": 0, "positions_count": 0}
         
+        cached = await trading_not_modified(request, response, "account", "positions")
+        if cached:
+            return cached
+        
         total_balance = float(account_info.get('totalWalletBalance', 0))
         available_balance = float(account_info.get('availableBalance', 0))
         unrealized_pnl = float(account_info.get('totalUnrealizedPnl', 0))
@@ -782,16 +1182,20 @@ async def get_trading_balance(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/trading/tracking")
-async def get_trading_tracking(db: Session = Depends(get_db)):
+async def get_trading_tracking(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Obtener seguimiento de alertas vs posiciones"""
     try:
-        config = crud.get_config(db)
+        config_key, etag = await trading_etag(request, "positions")
+        if etag and etag_matches(request, etag):
+            return not_modified(request, response, etag)
+        
+        config = await crud.get_config(db)
         
         since = datetime.now() - timedelta(hours=24)
-        recent_alerts = db.query(models.Alert).filter(
+        recent_alerts = (await db.execute(select(models.Alert).where(
             models.Alert.triggered_at >= since,
             models.Alert.status.in_([models.AlertStatusEnum.TRIGGERED, models.AlertStatusEnum.EXECUTED])
-        ).order_by(models.Alert.triggered_at.desc()).all()
+        ).order_by(models.Alert.triggered_at.desc()))).scalars().all()
         
         tracking_data = []
         
@@ -802,7 +1206,7 @@ async def get_trading_tracking(db: Session = Depends(get_db)):
             from binance_service import BinanceFuturesService
             binance = BinanceFuturesService(api_key, secret_key, config.use_testnet)
             
-            positions = await binance.get_positions()
+            positions = await trading_snapshot.get("positions", config_key, binance.get_positions)
             position_symbols = [pos['symbol'] for pos in positions]
             
             for alert in recent_alerts:
@@ -812,16 +1216,7 @@ async def get_trading_tracking(db: Session = Depends(get_db)):
                     position = next((p for p in positions if p['symbol'] == alert.symbol), None)
                     if position:
                         # Calcular PnL para tracking
-                        size = float(position.get('positionAmt', 0))
-                        entry_price = float(position.get('entryPrice', 0))
-                        mark_price = float(position.get('markPrice', 0))
-                        
-                        if size > 0:  # LONG
-                            pnl_percent = ((mark_price - entry_price) / entry_price) * 100 if entry_price > 0 else 0
-                        else:  # SHORT
-                            pnl_percent = ((entry_price - mark_price) / entry_price) * 100 if entry_price > 0 else 0
-                        
-                        pnl_usd = abs(size) * (mark_price - entry_price) if size > 0 else abs(size) * (entry_price - mark_price)
+                        pnl_percent, pnl_usd = position_pnl(position)
                         
                         tracking_data.append({
                             'alert_id': alert.id,
@@ -873,10 +1268,10 @@ async def get_trading_tracking(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/trading/orders")
-async def get_trading_orders(db: Session = Depends(get_db)):
+async def get_trading_orders(db: AsyncSession = Depends(get_async_db)):
     """Obtener órdenes abiertas"""
     try:
-        config = crud.get_config(db)
+        config = await crud.get_config(db)
         
         if not config.binance_api_key or not config.binance_secret_key:
             raise HTTPException(status_code=400, detail="Binance API keys no configuradas")
@@ -901,7 +1296,7 @@ async def get_trading_orders(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/trading/setup-take-profits")
-async def setup_automatic_take_profits(request: dict, db: Session = Depends(get_db)):
+async def setup_automatic_take_profits(request: dict, db: AsyncSession = Depends(get_async_db)):
     """Configurar take profits automáticos para una posición"""
     try:
         symbol = request.get('symbol')
@@ -916,7 +1311,7 @@ async def setup_automatic_take_profits(request: dict, db: Session = Depends(get_
                 "excluded": True
             }
         
-        config = crud.get_config(db)
+        config = await crud.get_config(db)
         
         if not config.binance_api_key or not config.binance_secret_key:
             raise HTTPException(status_code=400, detail="Binance API keys no configuradas")
@@ -968,7 +1363,7 @@ async def setup_automatic_take_profits(request: dict, db: Session = Depends(get_
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/trading/close-position")
-async def close_position_partial(request: dict, db: Session = Depends(get_db)):
+async def close_position_partial(request: dict, db: AsyncSession = Depends(get_async_db)):
     """Cerrar posición parcial o completa - MODO SEGURO"""
     try:
         symbol = request.get('symbol')
@@ -977,7 +1372,7 @@ async def close_position_partial(request: dict, db: Session = Depends(get_db)):
         if not symbol:
             raise HTTPException(status_code=400, detail="Symbol requerido")
         
-        config = crud.get_config(db)
+        config = await crud.get_config(db)
         
         if not config.binance_api_key or not config.binance_secret_key:
             raise HTTPException(status_code=400, detail="Binance API keys no configuradas")
@@ -997,10 +1392,10 @@ async def close_position_partial(request: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/trading/history")
-async def get_trading_history(days: int = 30, db: Session = Depends(get_db)):
+async def get_trading_history(days: int = 30, db: AsyncSession = Depends(get_async_db)):
     """Obtener historial de trading desde agosto 2024"""
     try:
-        config = crud.get_config(db)
+        config = await crud.get_config(db)
         
         if not config.binance_api_key or not config.binance_secret_key:
             raise HTTPException(status_code=400, detail="Binance API keys no configuradas")
@@ -1,7 +1,7 @@
 # backend/models.py - CORREGIDO FINAL
 from datetime import datetime
 import enum
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Text, JSON, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
 
 # Crear Base aquí (no importar de database para evitar import circular)
@@ -16,6 +16,7 @@ class AlertStatusEnum(enum.Enum):
     TRIGGERED = "TRIGGERED"
     EXECUTED = "EXECUTED"
     CANCELLED = "CANCELLED"
+    EXPIRED = "EXPIRED"
 
 class Alert(Base):
     __tablename__ = "alerts"
@@ -24,13 +25,21 @@ class Alert(Base):
     symbol = Column(String, index=True, nullable=False)
     target_price = Column(Float, nullable=False)
     current_price = Column(Float, nullable=True)
-    alert_type = Column(SQLEnum(AlertTypeEnum), nullable=False)  # ← USAR SQLEnum
-    status = Column(SQLEnum(AlertStatusEnum), default=AlertStatusEnum.PENDING)  # ← USAR SQLEnum
+    # VARCHAR como en init.sql (no un tipo enum de Postgres): los drivers envían texto
+    alert_type = Column(SQLEnum(AlertTypeEnum, native_enum=False, length=10), nullable=False)
+    status = Column(SQLEnum(AlertStatusEnum, native_enum=False, length=20), default=AlertStatusEnum.PENDING)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.now)  # ← USAR datetime.now
     triggered_at = Column(DateTime, nullable=True)
     executed_at = Column(DateTime, nullable=True)
     trade_id = Column(String, nullable=True)
+    # Estado de proximidad al target (histéresis) y último aviso enviado
+    near_state = Column(Boolean, default=False)
+    near_notified_at = Column(DateTime, nullable=True)
+    # Horas de vida desde created_at; NULL usa Config.default_expiry_hours
+    expiry_hours = Column(Integer, nullable=True)
+    # Condición compuesta opcional (conditions.py); NULL = LONG/SHORT contra target_price
+    condition = Column(JSON, nullable=True)
 
 class Config(Base):
     """Tabla de configuración del sistema"""
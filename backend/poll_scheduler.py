@@ -0,0 +1,147 @@
+# backend/poll_scheduler.py - Cadencia REST por símbolo según distancia al target más cercano y volatilidad
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import crud
+from alert_registry import AlertRegistry, alert_registry
+from price_cache import price_cache
+from tick_history import tick_history
+
+# Límites del intervalo de sondeo de un símbolo
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "1"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "300"))
+# Presupuesto global de peticiones REST del monitor de alertas (cada sondeo es un lote)
+POLL_REQUESTS_PER_MINUTE = int(os.getenv("POLL_REQUESTS_PER_MINUTE", "60"))
+# Margen en desviaciones típicas: se vuelve a mirar antes de que un movimiento de
+# POLL_SIGMAS sigmas pueda alcanzar el target
+POLL_SIGMAS = 3.0
+# Cadencia fija de los símbolos con condiciones compuestas (ventanas, cruces)
+POLL_CONDITION_INTERVAL = float(os.getenv("POLL_CONDITION_INTERVAL", "10"))
+# Ventana para estimar la volatilidad y valor por defecto sin historial (σ por √s, ~3%/h)
+VOLATILITY_WINDOW_SECONDS = 300
+DEFAULT_VOLATILITY = 0.0005
+MIN_VOLATILITY = 0.00001
+# Si ya sale una petición se adelantan los símbolos a los que les quede menos de
+# esta fracción de su intervalo (viajan gratis en el mismo lote)
+PIGGYBACK_FRACTION = 0.5
+
+class AdaptivePoller:
+    """Decide qué símbolos consultar en cada vuelta del monitor REST
+
+    El intervalo de cada símbolo es el tiempo que tardaría un movimiento de
+    POLL_SIGMAS desviaciones en recorrer la distancia al target más cercano:
+    (d / (k·σ))², acotado a [POLL_MIN_INTERVAL, POLL_MAX_INTERVAL]. Todos los
+    símbolos vencidos van en una sola petición por lotes, limitada por un
+    token bucket de POLL_REQUESTS_PER_MINUTE.
+    """
+
+    def __init__(self, registry: AlertRegistry = alert_registry, requests_per_minute: int = POLL_REQUESTS_PER_MINUTE):
+        self.registry = registry
+        self.requests_per_minute = requests_per_minute
+        self._next_due: Dict[str, float] = {}
+        self._intervals: Dict[str, float] = {}
+        self._tokens = float(requests_per_minute)
+        self._tokens_at = time.monotonic()
+        self.requests = 0
+        self.symbols_polled = 0
+        self.throttled = 0
+
+    # ==================== CADENCIA ====================
+
+    def volatility(self, symbol: str) -> float:
+        """Volatilidad realizada (σ de los retornos logarítmicos por √segundo)"""
+        ring = tick_history.get(symbol)
+        if ring is None:
+            return DEFAULT_VOLATILITY
+        ts, prices = ring.since(time.time() - VOLATILITY_WINDOW_SECONDS)
+        if len(prices) < 3:
+            return DEFAULT_VOLATILITY
+        elapsed = float(ts[-1] - ts[0])
+        if elapsed <= 0:
+            return DEFAULT_VOLATILITY
+        returns = np.diff(np.log(prices))
+        return max(math.sqrt(float(np.dot(returns, returns)) / elapsed), MIN_VOLATILITY)
+
+    def interval_for(self, symbol: str, price: Optional[float]) -> float:
+        if not price:
+            return POLL_MIN_INTERVAL
+        distance = self.registry.nearest_distance(symbol, price)
+        ceiling = POLL_CONDITION_INTERVAL if self.registry.has_conditions(symbol) else POLL_MAX_INTERVAL
+        if distance is None:
+            return ceiling
+        interval = (distance / (POLL_SIGMAS * self.volatility(symbol))) ** 2
+        return min(max(interval, POLL_MIN_INTERVAL), ceiling)
+
+    def _take_token(self, now: float) -> bool:
+        rate = self.requests_per_minute / 60
+        self._tokens = min(self.requests_per_minute, self._tokens + (now - self._tokens_at) * rate)
+        self._tokens_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def due(self, now: float) -> List[str]:
+        """Símbolos vencidos (los nuevos lo están desde el principio) más los que viajan gratis"""
+        symbols = self.registry.symbols()
+        active = set(symbols)
+        for symbol in [s for s in self._next_due if s not in active]:
+            del self._next_due[symbol]
+            self._intervals.pop(symbol, None)
+
+        due = [s for s in symbols if self._next_due.get(s, 0.0) <= now]
+        if due:
+            due.extend(
+                s for s in symbols
+                if now < self._next_due.get(s, 0.0) <= now + PIGGYBACK_FRACTION * self._intervals.get(s, 0.0)
+            )
+        return due
+
+    # ==================== SONDEO ====================
+
+    async def poll_once(self) -> int:
+        """Una vuelta: consultar en un lote lo vencido si el presupuesto lo permite"""
+        now = time.monotonic()
+        symbols = self.due(now)
+        if not symbols:
+            return 0
+        if not self._take_token(now):
+            # Sin presupuesto: esperan a la próxima vuelta
+            self.throttled += 1
+            return 0
+
+        self.requests += 1
+        self.symbols_polled += len(symbols)
+        await crud.check_and_trigger_alerts(symbols=symbols, max_age=POLL_MIN_INTERVAL)
+
+        checked_at = time.monotonic()
+        for symbol in symbols:
+            interval = self.interval_for(symbol, price_cache.peek(symbol))
+            self._intervals[symbol] = interval
+            self._next_due[symbol] = checked_at + interval
+        return len(symbols)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        intervals = sorted(self._intervals.values())
+        return {
+            "symbols": len(self._next_due),
+            "requests": self.requests,
+            "symbols_polled": self.symbols_polled,
+            "throttled": self.throttled,
+            "requests_per_minute_budget": self.requests_per_minute,
+            "tokens": round(self._tokens, 2),
+            "min_interval_seconds": round(intervals[0], 1) if intervals else None,
+            "median_interval_seconds": round(intervals[len(intervals) // 2], 1) if intervals else None,
+            "next_due": {
+                symbol: round(max(due - now, 0.0), 1)
+                for symbol, due in sorted(self._next_due.items(), key=lambda item: item[1])[:20]
+            }
+        }
+
+# Instancia global
+alert_poller = AdaptivePoller()
@@ -0,0 +1,207 @@
+# backend/price_cache.py - Caché de precios en memoria compartida por todos los consumidores
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from shared_state import shared_state
+from tick_history import tick_history
+from binance_scheduler import PRIORITY_ALERTS, PRIORITY_DASHBOARD
+
+# Edad máxima (s) para servir un precio como fresco
+PRICE_CACHE_MAX_AGE = float(os.getenv("PRICE_CACHE_MAX_AGE", "5"))
+# Edad máxima (s) para servir un precio viejo mientras se revalida en background
+PRICE_CACHE_STALE_AGE = float(os.getenv("PRICE_CACHE_STALE_AGE", "60"))
+# Sin markPrice de un símbolo durante este tiempo su historial lo alimenta el sondeo REST de alertas
+MARK_PRICE_LIVE_SECONDS = 10.0
+
+class PriceCache:
+    """Precios por símbolo con timestamp, stale-while-revalidate y fetch coalescido"""
+
+    def __init__(self, max_age: float = PRICE_CACHE_MAX_AGE, stale_age: float = PRICE_CACHE_STALE_AGE):
+        self.max_age = max_age
+        self.stale_age = max(stale_age, max_age)
+        # symbol -> (precio, instante monotónico, instante de reloj)
+        self._entries: Dict[str, Tuple[float, float, float]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # symbol -> instante monotónico del último markPrice del WebSocket
+        self._mark_price_at: Dict[str, float] = {}
+        self.seq = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upstream_fetches = 0
+
+    # ==================== ESCRITURA ====================
+
+    def put(self, symbol: str, price: float, timestamp: Optional[float] = None, history: bool = True):
+        """Guardar un precio (desde WebSocket, REST o cualquier productor)
+
+        ``history=False`` actualiza solo el último precio: el historial recibe una
+        única serie por símbolo (markPrice, o el sondeo REST de alertas si no hay
+        stream), no los mids de bookTicker ni los spot de REST intercalados.
+        """
+        if price is None or price <= 0:
+            return
+        now = time.time()
+        timestamp = timestamp or now
+        # La edad se cuenta desde que se observó el precio, no desde que llegó aquí
+        observed = time.monotonic() - max(0.0, now - timestamp)
+        self._entries[symbol] = (price, observed, timestamp)
+        self.seq += 1
+        if history:
+            tick_history.append(symbol, price, timestamp)
+
+    def put_mark_price(self, symbol: str, price: float, timestamp: Optional[float] = None):
+        """markPrice del WebSocket: la serie de futuros que alimenta el historial"""
+        self._mark_price_at[symbol] = time.monotonic()
+        self.put(symbol, price, timestamp)
+
+    def put_many(self, prices: Dict[str, float], history: bool = True):
+        for symbol, price in prices.items():
+            self.put(symbol, price, history=history)
+
+    def mark_price_live(self, symbol: str) -> bool:
+        """True si llega markPrice de este símbolo por el WebSocket"""
+        at = self._mark_price_at.get(symbol)
+        return at is not None and time.monotonic() - at <= MARK_PRICE_LIVE_SECONDS
+
+    # ==================== LECTURA ====================
+
+    def peek(self, symbol: str) -> Optional[float]:
+        """Último precio conocido sin tocar upstream (None si no hay)"""
+        entry = self._entries.get(symbol)
+        return entry[0] if entry else None
+
+    def is_fresh(self, symbol: str) -> bool:
+        entry = self._entries.get(symbol)
+        return entry is not None and time.monotonic() - entry[1] <= self.max_age
+
+    def age(self, symbol: str) -> Optional[float]:
+        entry = self._entries.get(symbol)
+        return time.monotonic() - entry[1] if entry else None
+
+    def timestamp(self, symbol: str) -> Optional[datetime]:
+        entry = self._entries.get(symbol)
+        return datetime.fromtimestamp(entry[2]) if entry else None
+
+    async def get(self, symbol: str, priority: int = PRIORITY_DASHBOARD) -> float:
+        prices = await self.get_many([symbol], priority)
+        return prices.get(symbol, 0.0)
+
+    async def get_many(self, symbols: Iterable[str], priority: int = PRIORITY_DASHBOARD) -> Dict[str, float]:
+        """Precios para los símbolos pedidos (0.0 si no disponibles)"""
+        symbols = list(dict.fromkeys(symbols))
+        now = time.monotonic()
+        result: Dict[str, float] = {}
+        stale: List[str] = []
+        missing: List[str] = []
+
+        for symbol in symbols:
+            entry = self._entries.get(symbol)
+            age = now - entry[1] if entry else None
+            if age is not None and age <= self.max_age:
+                self.hits += 1
+                result[symbol] = entry[0]
+            elif age is not None and age <= self.stale_age:
+                self.stale_hits += 1
+                result[symbol] = entry[0]
+                stale.append(symbol)
+            else:
+                self.misses += 1
+                missing.append(symbol)
+
+        if stale:
+            # Revalidar en background sin bloquear la respuesta
+            self._refresh(stale, priority)
+
+        if missing:
+            await asyncio.gather(*self._refresh(missing, priority), return_exceptions=True)
+            for symbol in missing:
+                result[symbol] = self.peek(symbol) or 0.0
+
+        return result
+
+    async def get_fresh(self, symbols: Iterable[str], max_age: float, priority: int = PRIORITY_DASHBOARD) -> Dict[str, float]:
+        """Como get_many pero esperando upstream para todo lo más viejo que ``max_age``
+
+        Para sondeos que necesitan el precio actual; lo que llega por WebSocket
+        ya está fresco y no genera petición.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        now = time.monotonic()
+        outdated = [s for s in symbols if s not in self._entries or now - self._entries[s][1] > max_age]
+        if outdated:
+            self.misses += len(outdated)
+            await asyncio.gather(*self._refresh(outdated, priority), return_exceptions=True)
+        self.hits += len(symbols) - len(outdated)
+        return {symbol: self.peek(symbol) or 0.0 for symbol in symbols}
+
+    # ==================== REFRESCO ====================
+
+    def _refresh(self, symbols: List[str], priority: int) -> List[asyncio.Task]:
+        """Lanza (o reutiliza) los fetch en vuelo que cubren estos símbolos"""
+        tasks = []
+        to_fetch = []
+        for symbol in symbols:
+            task = self._inflight.get(symbol)
+            if task is not None:
+                tasks.append(task)
+            else:
+                to_fetch.append(symbol)
+
+        if to_fetch:
+            task = asyncio.create_task(self._fetch(to_fetch, priority))
+            for symbol in to_fetch:
+                self._inflight[symbol] = task
+            tasks.append(task)
+
+        return list(dict.fromkeys(tasks))
+
+    async def _fetch(self, symbols: List[str], priority: int):
+        import crud  # import diferido para evitar import circular
+
+        try:
+            if shared_state.is_reader:
+                # Lectores nunca llaman a Binance: el productor publica en Redis
+                for symbol, (price, ts) in (await shared_state.fetch_prices(symbols, self.stale_age)).items():
+                    self.put(symbol, price, ts, history=False)
+                return
+            
+            self.upstream_fetches += 1
+            prices = await crud.fetch_binance_prices(symbols, priority)
+            # Son precios spot: no se mezclan con la serie markPrice de futuros del historial
+            self.put_many(prices, history=False)
+            if priority == PRIORITY_ALERTS:
+                # Respaldo REST del monitor de alertas: única serie de los símbolos sin markPrice en vivo
+                now = time.time()
+                for symbol, price in prices.items():
+                    if price and price > 0 and not self.mark_price_live(symbol):
+                        tick_history.append(symbol, price, now)
+            shared_state.queue_prices(prices)
+        except Exception as e:
+            print(f"❌ Error refrescando caché de precios: {e}")
+        finally:
+            task = asyncio.current_task()
+            for symbol in symbols:
+                if self._inflight.get(symbol) is task:
+                    del self._inflight[symbol]
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "symbols": len(self._entries),
+            "fresh": sum(1 for e in self._entries.values() if now - e[1] <= self.max_age),
+            "max_age_seconds": self.max_age,
+            "stale_age_seconds": self.stale_age,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "upstream_fetches": self.upstream_fetches,
+            "inflight": len(set(self._inflight.values())),
+            "seq": self.seq
+        }
+
+# Instancia global
+price_cache = PriceCache()
@@ -0,0 +1,267 @@
+# backend/price_stream.py - Motor de precios en tiempo real (WebSocket Binance Futures)
+import asyncio
+import json
+import random
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import websockets
+
+import crud
+import models
+from database import AsyncSessionLocal
+from price_cache import price_cache
+from shared_state import shared_state
+from alert_registry import AlertRecord, AlertRegistry, alert_registry
+from threshold_index import NEAR_PROGRESS
+from upstreams import BINANCE_FUTURES_WS_URL
+
+
+# Segundos sin ticks antes de considerar el stream caído
+STALE_AFTER_SECONDS = 15
+# Reconciliación periódica con la base de datos
+RESYNC_INTERVAL_SECONDS = 60
+# Backoff de reconexión
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+# Ventana para agrupar los cruces de varios ticks en una sola transacción
+TRIGGER_BATCH_SECONDS = 0.05
+
+class PriceStreamEngine:
+    """Suscripción a markPrice/bookTicker de los símbolos con alertas PENDING"""
+
+    def __init__(self, ws_url: str = BINANCE_FUTURES_WS_URL, registry: AlertRegistry = alert_registry):
+        self.ws_url = ws_url
+        self.registry = registry
+        self.prices: Dict[str, float] = {}
+        self.subscribed: Set[str] = set()
+        self.connected = False
+        self.last_tick_at: Optional[float] = None
+        self.ticks = 0
+        self.reconnects = 0
+        self.triggers = 0
+        self._resync_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._request_id = 0
+        self._pending_triggers: Dict[int, Tuple[AlertRecord, float]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # ==================== CICLO DE VIDA ====================
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._resync_event = asyncio.Event()
+        self.registry.on_symbols_changed(self.request_resync)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self.connected = False
+
+    def request_resync(self):
+        """Re-suscribir según los símbolos con alertas activas"""
+        if self._resync_event:
+            self._resync_event.set()
+
+    def is_healthy(self) -> bool:
+        """True si el stream está conectado y recibiendo ticks"""
+        if not self.connected:
+            return False
+        if not len(self.registry):
+            return True
+        return self.last_tick_at is not None and time.monotonic() - self.last_tick_at < STALE_AFTER_SECONDS
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "healthy": self.is_healthy(),
+            "symbols": sorted(self.subscribed),
+            "alerts": len(self.registry),
+            "ticks": self.ticks,
+            "triggers": self.triggers,
+            "reconnects": self.reconnects,
+            "seconds_since_last_tick": round(time.monotonic() - self.last_tick_at, 2) if self.last_tick_at else None
+        }
+
+    # ==================== ALERTAS ====================
+
+    def _wanted_streams(self) -> Set[str]:
+        streams = set()
+        for symbol in self.registry.symbols():
+            streams.add(f"{symbol.lower()}@markPrice@1s")
+            streams.add(f"{symbol.lower()}@bookTicker")
+        return streams
+
+    # ==================== WEBSOCKET ====================
+
+    async def _run(self):
+        print("📡 Iniciando motor de precios WebSocket...")
+        delay = RECONNECT_MIN_DELAY
+
+        while True:
+            try:
+                if not len(self.registry):
+                    # Sin alertas pendientes: no mantener conexión abierta
+                    await self._wait_resync(RESYNC_INTERVAL_SECONDS)
+                    continue
+
+                async with websockets.connect(self.ws_url, ping_interval=20, ping_timeout=20, close_timeout=5) as ws:
+                    self.connected = True
+                    print(f"✅ WebSocket conectado: {len(self.registry.symbols())} símbolos")
+                    received = await self._session(ws)
+                    if received:
+                        delay = RECONNECT_MIN_DELAY
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error en WebSocket de precios: {e}")
+            finally:
+                self.connected = False
+                self.subscribed = set()
+
+            if len(self.registry):
+                self.reconnects += 1
+                sleep_for = delay + random.uniform(0, delay / 2)
+                print(f"⏳ Reconectando WebSocket en {sleep_for:.1f}s...")
+                await asyncio.sleep(sleep_for)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _wait_resync(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._resync_event.wait(), timeout=timeout)
+            self._resync_event.clear()
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _session(self, ws) -> bool:
+        """Mantiene una conexión; devuelve True si se recibieron ticks"""
+        ticks_before = self.ticks
+        await self._apply_subscriptions(ws)
+        reader = asyncio.create_task(self._reader(ws))
+        try:
+            while not reader.done():
+                waiter = asyncio.create_task(self._resync_event.wait())
+                done, _ = await asyncio.wait(
+                    {reader, waiter},
+                    timeout=RESYNC_INTERVAL_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                waiter.cancel()
+                if reader in done:
+                    break
+                self._resync_event.clear()
+                if not len(self.registry):
+                    print("ℹ️ Sin alertas pendientes, cerrando WebSocket")
+                    break
+                await self._apply_subscriptions(ws)
+            if reader.done():
+                reader.result()
+        finally:
+            reader.cancel()
+        return self.ticks > ticks_before
+
+    async def _apply_subscriptions(self, ws):
+        wanted = self._wanted_streams()
+        to_add = sorted(wanted - self.subscribed)
+        to_remove = sorted(self.subscribed - wanted)
+
+        if to_remove:
+            self._request_id += 1
+            await ws.send(json.dumps({"method": "UNSUBSCRIBE", "params": to_remove, "id": self._request_id}))
+        if to_add:
+            self._request_id += 1
+            await ws.send(json.dumps({"method": "SUBSCRIBE", "params": to_add, "id": self._request_id}))
+
+        self.subscribed = wanted
+        if to_add or to_remove:
+            print(f"🔁 Suscripciones actualizadas: +{len(to_add)} -{len(to_remove)} streams")
+
+    async def _reader(self, ws):
+        async for raw in ws:
+            message = json.loads(raw)
+            data = message.get("data")
+            if not data:
+                continue  # respuestas a SUBSCRIBE/UNSUBSCRIBE
+
+            symbol = data.get("s")
+            if data.get("e") == "markPriceUpdate":
+                price = float(data["p"])
+                history = True
+            elif "b" in data and "a" in data:
+                # bookTicker: precio medio entre mejor bid y mejor ask; llega varias
+                # veces por segundo y solo actualiza el último precio, no el historial
+                price = (float(data["b"]) + float(data["a"])) / 2
+                history = False
+            else:
+                continue
+
+            self._on_tick(symbol, price, history)
+
+    # ==================== EVALUACIÓN ====================
+
+    def _on_tick(self, symbol: str, price: float, history: bool = True):
+        self.ticks += 1
+        self.last_tick_at = time.monotonic()
+        self.prices[symbol] = price
+        if history:
+            price_cache.put_mark_price(symbol, price)
+        else:
+            price_cache.put(symbol, price, history=False)
+        shared_state.queue_price(symbol, price)
+
+        if price <= 0 or not self.registry.count(symbol):
+            return
+
+        # Solo se tocan las alertas cruzadas o cercanas, no todas las del símbolo
+        for record in self.registry.pop_crossed(symbol, price):
+            self.triggers += 1
+            self._pending_triggers[record.id] = (record, price)
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_triggers())
+
+        for record in self.registry.near(symbol, price, NEAR_PROGRESS):
+            progress = crud.alert_progress(record.alert_type, record.target_price, price)
+            asyncio.create_task(self._notify_near(record, price, progress))
+
+    async def _flush_triggers(self):
+        await asyncio.sleep(TRIGGER_BATCH_SECONDS)
+        batch, self._pending_triggers = self._pending_triggers, {}
+        self._flush_task = None
+        await self._commit_triggers(batch)
+
+    async def _commit_triggers(self, batch: Dict[int, Tuple[AlertRecord, float]]):
+        """Aplicar los cruces acumulados en una transacción y notificar las filas devueltas"""
+        async with AsyncSessionLocal() as db:
+            try:
+                applied = await crud.apply_alert_transitions(db, {
+                    models.AlertStatusEnum.TRIGGERED: {alert_id: price for alert_id, (_, price) in batch.items()}
+                })
+            except Exception as e:
+                print(f"❌ Error disparando {len(batch)} alerta(s): {e}")
+                for record, _ in batch.values():
+                    self.registry.release(record, False)
+                return
+            for record, _ in batch.values():
+                self.registry.release(record, True)
+            await crud.notify_transitions(db, applied)
+
+    async def _notify_near(self, record: AlertRecord, price: float, progress: float):
+        async with AsyncSessionLocal() as db:
+            try:
+                await crud.notify_price_near_target(db, record, price, progress)
+                # Persistir el aviso (y cualquier otro cambio de proximidad pendiente)
+                await self.registry.flush_near_states(db)
+            except Exception as e:
+                print(f"❌ Error notificando proximidad {record.id}: {e}")
+
+# Instancia global
+price_engine = PriceStreamEngine()
@@ -0,0 +1,284 @@
+# backend/replay_ticks.py - Reproducción de ticks contra el motor de alertas (throughput, latencia, corrección)
+"""
+Uso:
+
+    python replay_ticks.py --alerts 100000 --symbols 50 --ticks 200000
+    python replay_ticks.py --ticks-file ticks.parquet --alerts 20000 --speed 1
+    python replay_ticks.py --path rest --alerts 10000 --ticks 20000 --tracemalloc
+
+Los ticks salen de un CSV/Parquet con columnas ``ts, symbol, price`` o se
+generan como paseos aleatorios (--save-ticks los guarda para repetir la
+misma serie). Las alertas se generan alrededor del primer precio de cada
+símbolo. La BD y las notificaciones se sustituyen por stubs en memoria, así
+que se mide solo la lógica de evaluación:
+
+- ``engine``: PriceStreamEngine._on_tick, el camino del WebSocket.
+- ``rest``: crud.check_and_trigger_alerts por tick, el respaldo REST.
+
+--speed 0 reproduce a máxima velocidad; --speed N a N veces el ritmo de los
+timestamps. Al final se comparan los disparos con una evaluación por fuerza
+bruta (NumPy) sobre la serie completa.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import crud
+import models
+from alert_registry import AlertRecord, alert_registry
+from price_stream import PriceStreamEngine
+
+# ==================== DATOS ====================
+
+def load_ticks(path: str) -> pd.DataFrame:
+    try:
+        ticks = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    except ImportError as e:
+        # Parquet necesita pyarrow o fastparquet, que no están en requirements.txt
+        raise SystemExit(f"No se puede leer {path}: {e}")
+    missing = {"ts", "symbol", "price"} - set(ticks.columns)
+    if missing:
+        raise SystemExit(f"Faltan columnas en {path}: {', '.join(sorted(missing))}")
+    return ticks[["ts", "symbol", "price"]].sort_values("ts", kind="stable").reset_index(drop=True)
+
+def synthetic_ticks(symbols: int, ticks: int, volatility: float, seed: int) -> pd.DataFrame:
+    """Paseos aleatorios log-normales intercalados, un tick por evento a ~10 ticks/s"""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"SYM{i:04d}USDT" for i in range(symbols)])
+    which = rng.integers(0, symbols, ticks)
+    start = rng.uniform(0.1, 50000.0, symbols)
+    steps = rng.normal(0.0, volatility, ticks)
+    prices = np.empty(ticks)
+    for i in range(symbols):
+        mask = which == i
+        prices[mask] = start[i] * np.exp(np.cumsum(steps[mask]))
+    ts = time.time() + np.cumsum(rng.exponential(0.1, ticks))
+    return pd.DataFrame({"ts": ts, "symbol": names[which], "price": prices})
+
+def generate_alerts(ticks: pd.DataFrame, n: int, spread: float, seed: int) -> List[AlertRecord]:
+    """Alertas LONG por encima y SHORT por debajo del primer precio, hasta ±spread"""
+    rng = np.random.default_rng(seed)
+    first = ticks.groupby("symbol", sort=False)["price"].first()
+    symbols = first.index.to_numpy()
+    picks = rng.integers(0, len(symbols), n)
+    is_long = rng.random(n) < 0.5
+    offsets = rng.uniform(0.0005, spread, n)
+    base = first.to_numpy()[picks]
+    targets = np.where(is_long, base * (1 + offsets), base * (1 - offsets))
+    return [
+        AlertRecord(
+            alert_id + 1, symbols[picks[alert_id]], float(targets[alert_id]),
+            models.AlertTypeEnum.LONG if is_long[alert_id] else models.AlertTypeEnum.SHORT,
+            None, None
+        )
+        for alert_id in range(n)
+    ]
+
+def expected_triggers(ticks: pd.DataFrame, alerts: List[AlertRecord]) -> Dict[int, int]:
+    """Fuerza bruta: alert_id -> posición del primer tick que lo cruza"""
+    expected: Dict[int, int] = {}
+    by_symbol: Dict[str, List[AlertRecord]] = {}
+    for record in alerts:
+        by_symbol.setdefault(record.symbol, []).append(record)
+    for symbol, group in ticks.groupby("symbol", sort=False):
+        records = by_symbol.get(symbol)
+        if not records:
+            continue
+        positions = group.index.to_numpy()
+        prices = group["price"].to_numpy()
+        # Máximos y mínimos acumulados son monótonos: el primer cruce sale por bisect
+        running_max = np.maximum.accumulate(prices)
+        running_min = -np.maximum.accumulate(-prices)
+        for record in records:
+            if record.alert_type == models.AlertTypeEnum.LONG:
+                i = int(np.searchsorted(running_max, record.target_price, side="left"))
+            else:
+                i = int(np.searchsorted(-running_min, -record.target_price, side="left"))
+            if i < len(prices):
+                expected[record.id] = int(positions[i])
+    return expected
+
+# ==================== STUBS ====================
+
+class StubSession:
+    """Sesión que no toca Postgres (flush de proximidad, commits)"""
+
+    async def execute(self, *args, **kwargs):
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: []), first=lambda: None)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+class ReplayEngine(PriceStreamEngine):
+    """Motor de precios con los cruces registrados en memoria en vez de en la BD"""
+
+    def __init__(self, triggered: Dict[int, float]):
+        super().__init__(registry=alert_registry)
+        self.triggered = triggered
+        self.near_notified = 0
+
+    async def _commit_triggers(self, batch):
+        for alert_id, (record, price) in batch.items():
+            self.triggered[alert_id] = price
+            self.registry.release(record, True)
+
+    async def _notify_near(self, record, price: float, progress: float):
+        self.near_notified += 1
+
+def stub_crud(triggered: Dict[int, float], counters: Dict[str, int]):
+    """Sustituir escritura y notificaciones de crud para el camino REST"""
+
+    async def apply_alert_transitions(db, transitions):
+        applied = {}
+        for status, prices in transitions.items():
+            applied[status] = [
+                SimpleNamespace(id=alert_id, current_price=price) for alert_id, price in prices.items()
+            ]
+            for alert_id, price in prices.items():
+                triggered[alert_id] = price
+                alert_registry.remove(alert_id)
+        return applied
+
+    async def notify_transitions(db, applied):
+        return sum(len(alerts) for alerts in applied.values())
+
+    async def notify_price_near_target(db, alert, current_price, percentage):
+        counters["near"] += 1
+
+    crud.apply_alert_transitions = apply_alert_transitions
+    crud.notify_transitions = notify_transitions
+    crud.notify_price_near_target = notify_price_near_target
+
+# ==================== REPRODUCCIÓN ====================
+
+async def replay(ticks: pd.DataFrame, path: str, speed: float, triggered: Dict[int, float],
+                 counters: Dict[str, int]) -> np.ndarray:
+    symbols = ticks["symbol"].to_numpy()
+    prices = ticks["price"].to_numpy()
+    ts = ticks["ts"].to_numpy()
+    latencies = np.empty(len(prices))
+    engine = ReplayEngine(triggered) if path == "engine" else None
+    session = StubSession()
+    from price_cache import price_cache
+
+    started = time.perf_counter()
+    for i in range(len(prices)):
+        if speed > 0:
+            # Ritmo real (o acelerado) según los timestamps grabados
+            delay = (ts[i] - ts[0]) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        symbol, price = str(symbols[i]), float(prices[i])
+        t0 = time.perf_counter()
+        if engine is not None:
+            engine._on_tick(symbol, price)
+        else:
+            price_cache.put(symbol, price)
+            await crud.check_and_trigger_alerts(session, symbols=[symbol], max_age=float("inf"))
+        latencies[i] = time.perf_counter() - t0
+        if engine is not None and i % 1000 == 999:
+            # Dejar correr los lotes de disparos pendientes
+            await asyncio.sleep(0)
+
+    if engine is not None:
+        while engine._flush_task is not None:
+            await asyncio.sleep(0.01)
+        counters["near"] += engine.near_notified
+    return latencies
+
+def run(args) -> int:
+    if args.ticks_file:
+        ticks = load_ticks(args.ticks_file)
+    else:
+        ticks = synthetic_ticks(args.symbols, args.ticks, args.volatility, args.seed)
+    if args.save_ticks:
+        try:
+            if args.save_ticks.endswith(".parquet"):
+                ticks.to_parquet(args.save_ticks)
+            else:
+                ticks.to_csv(args.save_ticks, index=False)
+        except ImportError as e:
+            raise SystemExit(f"No se puede guardar {args.save_ticks}: {e}")
+
+    alerts = generate_alerts(ticks, args.alerts, args.spread, args.seed)
+    for record in alerts:
+        alert_registry.put(record)
+    print(f"▶️ {len(ticks)} ticks, {ticks['symbol'].nunique()} símbolos, {len(alerts)} alertas, camino {args.path}")
+
+    triggered: Dict[int, float] = {}
+    counters = {"near": 0}
+    if args.path == "rest":
+        stub_crud(triggered, counters)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    # Sin el log por tick del motor ni del camino REST
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        latencies = asyncio.run(replay(ticks, args.path, args.speed, triggered, counters))
+    elapsed = time.perf_counter() - started
+    memory = None
+    if args.tracemalloc:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory = (current, peak, snapshot.statistics("lineno")[:5])
+
+    expected = expected_triggers(ticks, alerts)
+    targets = {record.id: record for record in alerts}
+    missed = set(expected) - set(triggered)
+    spurious = set(triggered) - set(expected)
+    wrong_price = [
+        alert_id for alert_id, price in triggered.items()
+        if alert_id in expected and not crud.alert_should_trigger(
+            targets[alert_id].alert_type, targets[alert_id].target_price, price
+        )
+    ]
+
+    micros = latencies * 1e6
+    print(f"⏱️ {len(latencies) / elapsed:,.0f} ticks/s ({elapsed:.2f}s)")
+    print(f"   latencia µs: p50 {np.percentile(micros, 50):.1f} | p99 {np.percentile(micros, 99):.1f} | max {micros.max():.1f}")
+    print(f"🎯 disparos {len(triggered)} (esperados {len(expected)}), avisos de proximidad {counters['near']}")
+    if memory:
+        current, peak, top = memory
+        print(f"🧠 memoria trazada: actual {current / 1e6:.1f} MB, pico {peak / 1e6:.1f} MB")
+        for stat in top:
+            print(f"   {stat}")
+
+    if missed or spurious or wrong_price:
+        print(f"❌ Corrección: {len(missed)} sin disparar, {len(spurious)} de más, {len(wrong_price)} con precio incorrecto")
+        return 1
+    print("✅ Disparos idénticos a la evaluación por fuerza bruta")
+    return 0
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Reproducir ticks contra el motor de alertas")
+    parser.add_argument("--ticks-file", help="CSV o Parquet con columnas ts, symbol, price")
+    parser.add_argument("--save-ticks", help="guardar la serie (sintética o cargada) en CSV/Parquet")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=100000)
+    parser.add_argument("--volatility", type=float, default=0.001, help="σ del retorno por tick sintético")
+    parser.add_argument("--alerts", type=int, default=100000)
+    parser.add_argument("--spread", type=float, default=0.5, help="distancia máxima relativa de los targets")
+    parser.add_argument("--path", choices=["engine", "rest"], default="engine")
+    parser.add_argument("--speed", type=float, default=0.0, help="0 = máxima velocidad; N = N veces tiempo real")
+    parser.add_argument("--tracemalloc", action="store_true", help="medir asignaciones (más lento)")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    raise SystemExit(run(parse_args()))
@@ -4,170 +4,171 @@ Este archivo se ejecuta como un proceso separado
 """
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from typing import Dict, List, Optional, Tuple
+from database import AsyncSessionLocal
 import crud
-import schemas
-from binance_service import BinanceService
-from notifications import NotificationService
+from binance_service import BinanceFuturesService
+from binance_scheduler import PRIORITY_ALERTS
+from leader_election import leader_election
+from conditions import CompiledCondition, ConditionError, compile_condition, EvalContext
 import models
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SCAN_INTERVAL_SECONDS = 30
+POSITIONS_INTERVAL_SECONDS = 60
+
 class PriceScanner:
+    """Cada ciclo reúne las transiciones y las aplica en un solo UPDATE ... RETURNING"""
+
     def __init__(self):
-        self.db = SessionLocal()
-        self.binance = None
-        self.notifier = NotificationService()
-        self._initialize_services()
-    
-    def _initialize_services(self):
-        """Inicializa servicios con credenciales de la DB"""
-        config = crud.get_config(self.db)
-        if config and config.binance_api_key:
-            self.binance = BinanceService(
-                config.binance_api_key,
-                config.binance_secret
-            )
-            logger.info("Binance service initialized")
-    
+        # alert_id -> (condición fuente, compilada): se compila una vez por alerta y
+        # los cruces conservan el precio de la pasada anterior
+        self._conditions: Dict[int, Tuple[dict, Optional[CompiledCondition]]] = {}
+
+    async def _binance(self, db) -> Optional[BinanceFuturesService]:
+        """Servicio autenticado con las credenciales de la DB (None si no hay API keys)"""
+        config = await crud.get_config(db)
+        if not config.binance_api_key or not config.binance_secret_key:
+            return None
+        return BinanceFuturesService(
+            crud.decrypt_api_key(config.binance_api_key),
+            crud.decrypt_api_key(config.binance_secret_key),
+            config.use_testnet
+        )
+
     async def scan_prices(self):
         """Escanea precios cada 30 segundos"""
         while True:
             try:
-                if not self.binance:
-                    self._initialize_services()
-                    await asyncio.sleep(30)
-                    continue
-                
-                # Obtener alertas activas
-                alerts = crud.get_active_alerts(self.db)
-                logger.info(f"Scanning {len(alerts)} active alerts")
-                
-                for alert in alerts:
-                    try:
-                        # Obtener precio actual
-                        current_price = self.binance.get_current_price(alert.symbol)
-                        
-                        # Actualizar precio en DB
-                        alert.current_price = current_price
-                        self.db.commit()
-                        
-                        # Verificar si se alcanzó el target
-                        if self._check_alert_triggered(alert, current_price):
-                            logger.info(f"Alert triggered: {alert.symbol} at {current_price}")
-                            
-                            # Enviar notificaciones
-                            await self.notifier.send_alert(
-                                f"🎯 ALERTA ACTIVADA\n"
-                                f"Symbol: {alert.symbol}\n"
-                                f"Target: ${alert.target_price}\n"
-                                f"Current: ${current_price}\n"
-                                f"Type: {alert.alert_type}"
-                            )
-                            
-                            # Actualizar estado
-                            crud.update_alert(
-                                self.db, 
-                                alert.id, 
-                                schemas.AlertUpdate(status=schemas.AlertStatus.TRIGGERED)
-                            )
-                    
-                    except Exception as e:
-                        logger.error(f"Error scanning alert {alert.id}: {e}")
-                
-                # Limpiar alertas expiradas
-                self._cleanup_expired_alerts()
-                
+                await self.scan_once()
             except Exception as e:
                 logger.error(f"Scanner error: {e}")
-            
-            await asyncio.sleep(30)
-    
+
+            await asyncio.sleep(SCAN_INTERVAL_SECONDS)
+
+    async def scan_once(self):
+        async with AsyncSessionLocal() as db:
+            # Obtener alertas activas
+            alerts = await crud.get_active_alerts(db)
+            logger.info(f"Scanning {len(alerts)} active alerts")
+
+            # Un lote de precios para todos los símbolos
+            symbols = list(dict.fromkeys(alert.symbol for alert in alerts))
+            prices = await crud.get_multiple_prices(symbols, PRIORITY_ALERTS) if symbols else {}
+
+            # Olvidar las condiciones de alertas que ya no están activas
+            active_ids = {alert.id for alert in alerts}
+            for alert_id in [a for a in self._conditions if a not in active_ids]:
+                del self._conditions[alert_id]
+
+            triggered: Dict[int, float] = {}
+            for alert in alerts:
+                current_price = prices.get(alert.symbol, 0)
+                if current_price > 0 and self._check_alert_triggered(alert, current_price):
+                    logger.info(f"Alert triggered: {alert.symbol} at {current_price}")
+                    triggered[alert.id] = current_price
+
+            # Solo las que seguían PENDING cambian; las notificaciones salen de RETURNING
+            applied = await crud.apply_alert_transitions(db, {models.AlertStatusEnum.TRIGGERED: triggered})
+            await crud.notify_transitions(db, applied)
+
+            # Limpiar alertas expiradas
+            await self._cleanup_expired_alerts(db)
+
     async def detect_positions(self):
         """Detecta si se abrió posición después de alerta"""
         while True:
             try:
-                if not self.binance:
-                    await asyncio.sleep(60)
-                    continue
-                
-                # Obtener alertas disparadas recientemente
-                triggered_alerts = crud.get_triggered_alerts(self.db)
-                
-                if triggered_alerts:
-                    logger.info(f"Checking {len(triggered_alerts)} triggered alerts")
-                    
-                    # Obtener posiciones actuales
-                    positions = self.binance.get_futures_positions()
-                    
-                    for alert in triggered_alerts:
-                        # Verificar si hay posición abierta para este símbolo
-                        position = self._find_position(positions, alert.symbol)
-                        
-                        if position:
-                            logger.info(f"Position detected for {alert.symbol}")
-                            
-                            # Actualizar alerta como ejecutada
-                            crud.update_alert(
-                                self.db,
-                                alert.id,
-                                schemas.AlertUpdate(status=schemas.AlertStatus.EXECUTED)
-                            )
-                            
-                            # Notificar
-                            await self.notifier.send_alert(
-                                f"✅ POSICIÓN DETECTADA\n"
-                                f"Symbol: {alert.symbol}\n"
-                                f"Entry: ${position['entryPrice']}\n"
-                                f"Size: {position['positionAmt']}\n"
-                                f"Alert #{alert.id} ejecutada con éxito"
-                            )
-                
+                await self.detect_positions_once()
             except Exception as e:
                 logger.error(f"Position detector error: {e}")
-            
-            await asyncio.sleep(60)
-    
+
+            await asyncio.sleep(POSITIONS_INTERVAL_SECONDS)
+
+    async def detect_positions_once(self):
+        async with AsyncSessionLocal() as db:
+            # Obtener alertas disparadas recientemente
+            triggered_alerts = await crud.get_triggered_alerts(db)
+            if not triggered_alerts:
+                return
+
+            binance = await self._binance(db)
+            if binance is None:
+                return
+
+            logger.info(f"Checking {len(triggered_alerts)} triggered alerts")
+
+            # Obtener posiciones actuales
+            positions = await binance.get_positions()
+            executed = {
+                alert.id: None
+                for alert in triggered_alerts
+                if self._find_position(positions, alert.symbol)
+            }
+
+            # TRIGGERED -> EXECUTED de todas las posiciones detectadas en una transacción
+            applied = await crud.apply_alert_transitions(db, {models.AlertStatusEnum.EXECUTED: executed})
+            await crud.notify_transitions(db, applied)
+
     def _check_alert_triggered(self, alert, current_price):
         """Verifica si una alerta debe ser disparada"""
-        if alert.alert_type == "LONG":
-            return current_price >= alert.target_price
-        else:  # SHORT
-            return current_price <= alert.target_price
-    
-    def _find_position(self, positions, symbol):
+        if alert.condition:
+            condition = self._condition(alert)
+            return condition is not None and condition.evaluate(EvalContext(alert.symbol, current_price))
+        return crud.alert_should_trigger(alert.alert_type, alert.target_price, current_price)
+
+    def _condition(self, alert) -> Optional[CompiledCondition]:
+        """Condición compilada de la alerta; se recompila solo si se editó"""
+        cached = self._conditions.get(alert.id)
+        if cached is None or cached[0] != alert.condition:
+            try:
+                compiled = compile_condition(alert.condition)
+            except ConditionError as e:
+                logger.error(f"Alert {alert.id} has an invalid condition, skipped: {e}")
+                compiled = None
+            cached = self._conditions[alert.id] = (alert.condition, compiled)
+        return cached[1]
+
+    def _find_position(self, positions: List[dict], symbol: str) -> Optional[dict]:
         """Busca una posición para un símbolo específico"""
         for pos in positions:
             if pos['symbol'] == symbol and float(pos['positionAmt']) != 0:
                 return pos
         return None
-    
-    def _cleanup_expired_alerts(self):
+
+    async def _cleanup_expired_alerts(self, db):
         """Marca como expiradas las alertas viejas"""
-        expired = crud.get_expired_alerts(self.db)
-        for alert in expired:
-            crud.update_alert(
-                self.db,
-                alert.id,
-                schemas.AlertUpdate(status=schemas.AlertStatus.EXPIRED)
-            )
+        due = await crud.get_expired_alerts(db)
+        expired = await crud.expire_alerts(db, [alert.id for alert in due]) if due else []
         if expired:
+            await crud.notify_transitions(db, {models.AlertStatusEnum.EXPIRED: expired})
             logger.info(f"Cleaned up {len(expired)} expired alerts")
 
 async def main():
     """Función principal que ejecuta ambos scanners"""
     scanner = PriceScanner()
-    
-    # Crear tareas asíncronas
-    price_task = asyncio.create_task(scanner.scan_prices())
-    position_task = asyncio.create_task(scanner.detect_positions())
-    
-    # Ejecutar ambas tareas
-    await asyncio.gather(price_task, position_task)
+
+    # Mismo lock que la API: solo escanea si ningún otro proceso evalúa alertas
+    await leader_election.start()
+    while True:
+        await leader_election.wait_until_leader()
+        logger.info("Leader lock acquired, scanning")
+
+        # Crear tareas asíncronas
+        tasks = [
+            asyncio.create_task(scanner.scan_prices()),
+            asyncio.create_task(scanner.detect_positions())
+        ]
+
+        # Ejecutar ambas tareas mientras se conserve el liderazgo
+        while leader_election.is_leader and not any(task.done() for task in tasks):
+            await asyncio.sleep(leader_election.heartbeat)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 if __name__ == "__main__":
     logger.info("Starting CryptoAlert Scanner...")
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -1,11 +1,13 @@
 # backend/schemas.py
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
 
 from pydantic import BaseModel, validator
 
+from conditions import compile_condition
+
 class AlertType(str, Enum):
     LONG = "LONG"
     SHORT = "SHORT"
@@ -15,12 +17,22 @@ class AlertStatus(str, Enum):
     TRIGGERED = "TRIGGERED"
     EXECUTED = "EXECUTED"
     CANCELLED = "CANCELLED"
+    EXPIRED = "EXPIRED"
 
 class AlertBase(BaseModel):
     symbol: str
     target_price: float
     alert_type: AlertType
     notes: Optional[str] = None
+    # Sin valor se aplica default_expiry_hours de la configuración
+    expiry_hours: Optional[int] = None
+    # Condición compuesta (ver conditions.py); sin ella se usa alert_type + target_price
+    condition: Optional[Dict[str, Any]] = None
+
+    @validator('condition')
+    def validate_condition(cls, v):
+        compile_condition(v)
+        return v
 
 class AlertCreate(AlertBase):
     pass
@@ -0,0 +1,358 @@
+# backend/shared_state.py - Estado compartido en Redis (precios, símbolos, alertas activas)
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+# Vacío = desactivado (cada proceso trabaja solo con su memoria)
+REDIS_URL = os.getenv("REDIS_URL", "")
+# auto: produce solo el proceso con el lock de líder (leader_election), el resto lee
+# producer: consulta Binance y publica siempre | reader: solo lee de Redis
+MARKET_DATA_ROLE = os.getenv("MARKET_DATA_ROLE", "auto").lower()
+
+KEY_PREFIX = "cryptoalert"
+PRICE_KEY = KEY_PREFIX + ":price:{symbol}"
+WANTED_KEY = KEY_PREFIX + ":prices:wanted"
+SYMBOLS_KEY = KEY_PREFIX + ":symbols"
+ACTIVE_ALERTS_KEY = KEY_PREFIX + ":alerts:active"
+ALERTS_CHANGED_CHANNEL = KEY_PREFIX + ":alerts:changed"
+# Origen de los mensajes de ALERTS_CHANGED_CHANNEL: cada proceso ignora los suyos
+PROCESS_ID = uuid.uuid4().hex[:12]
+# Contadores de cambios (alertas, configuración) compartidos por todos los procesos
+VERSIONS_KEY = KEY_PREFIX + ":versions"
+# Eventos discretos de /api/stream (disparos, expiraciones) para los clientes de todos los workers
+STREAM_EVENTS_CHANNEL = KEY_PREFIX + ":stream:events"
+
+# Frecuencia de volcado de precios a Redis (los ticks se agrupan)
+FLUSH_INTERVAL_SECONDS = 0.25
+# Un símbolo pedido por un lector se sigue refrescando durante este tiempo
+WANTED_TTL_SECONDS = 120
+WANTED_POLL_SECONDS = 2
+# Espera máxima de un lector a que el productor publique un símbolo nuevo
+READER_WAIT_SECONDS = 2.0
+PRICE_KEY_TTL_SECONDS = 300
+
+class SharedState:
+    """Capa Redis con un productor de precios y muchos lectores
+
+    En modo ``auto`` el rol sigue al liderazgo: el proceso que gana el lock de
+    Postgres pasa a productor (set_leader) y los demás workers y contenedores
+    solo leen, así que Binance recibe el tráfico de un único proceso.
+    """
+
+    def __init__(self, url: str = REDIS_URL, role: str = MARKET_DATA_ROLE):
+        self.url = url
+        self.role = role
+        self.leading = False
+        self.enabled = False
+        self._redis: Optional[aioredis.Redis] = None
+        self._pending_prices: Dict[str, Tuple[float, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._alerts_changed_callbacks: List[Callable[[Optional[int]], None]] = []
+        self.published = 0
+        self.reads = 0
+
+    @property
+    def is_producer(self) -> bool:
+        if not self.enabled:
+            return True
+        if self.role == "auto":
+            return self.leading
+        return self.role != "reader"
+
+    @property
+    def is_reader(self) -> bool:
+        return self.enabled and not self.is_producer
+
+    @property
+    def reader_only(self) -> bool:
+        """Rol lector fijo: el proceso no compite por el liderazgo"""
+        return self.enabled and self.role == "reader"
+
+    # ==================== CICLO DE VIDA ====================
+
+    async def connect(self) -> bool:
+        if not self.url:
+            return False
+        try:
+            self._redis = aioredis.Redis.from_url(self.url, decode_responses=True)
+            await self._redis.ping()
+            self.enabled = True
+            print(f"✅ Redis conectado ({self.role})")
+        except Exception as e:
+            print(f"❌ Redis no disponible, estado compartido desactivado: {e}")
+            self.enabled = False
+            self._redis = None
+            return False
+
+        if self.is_producer:
+            self._start_producer()
+        # Todos los procesos escuchan cambios de alertas (instantáneas, registro del líder)
+        if not self._listener or self._listener.done():
+            self._listener = asyncio.create_task(self._listen_alerts_changed())
+        return True
+
+    async def set_leader(self, leading: bool):
+        """Modo auto: el líder publica precios, símbolos y alertas; al perder el lock vuelve a leer"""
+        self.leading = leading
+        if not self.enabled or self.role != "auto":
+            return
+        if leading:
+            self._start_producer()
+            print("✅ Redis: este proceso pasa a productor (líder)")
+        else:
+            await self._stop_producer()
+            print("ℹ️ Redis: este proceso pasa a lector")
+
+    def _start_producer(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._producer_loop())
+
+    async def _stop_producer(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def close(self):
+        await self._stop_producer()
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis:
+            await self._flush_prices()
+            await self._redis.close()
+            self._redis = None
+        self.enabled = False
+
+    # ==================== PRECIOS ====================
+
+    def queue_price(self, symbol: str, price: float, timestamp: Optional[float] = None):
+        """Encolar un precio para publicarlo en el próximo volcado (solo productor)"""
+        if self.enabled and self.is_producer and price and price > 0:
+            self._pending_prices[symbol] = (price, timestamp or time.time())
+
+    def queue_prices(self, prices: Dict[str, float]):
+        now = time.time()
+        for symbol, price in prices.items():
+            self.queue_price(symbol, price, now)
+
+    async def _flush_prices(self):
+        if not self._pending_prices or not self._redis:
+            return
+        pending, self._pending_prices = self._pending_prices, {}
+        pipe = self._redis.pipeline(transaction=False)
+        for symbol, (price, ts) in pending.items():
+            key = PRICE_KEY.format(symbol=symbol)
+            pipe.hset(key, mapping={"price": price, "ts": ts})
+            pipe.expire(key, PRICE_KEY_TTL_SECONDS)
+        await pipe.execute()
+        self.published += len(pending)
+
+    async def read_prices(self, symbols: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """symbol -> (precio, timestamp) de los símbolos presentes en Redis"""
+        symbols = list(symbols)
+        if not self._redis or not symbols:
+            return {}
+        pipe = self._redis.pipeline(transaction=False)
+        for symbol in symbols:
+            pipe.hgetall(PRICE_KEY.format(symbol=symbol))
+        rows = await pipe.execute()
+        self.reads += 1
+        return {
+            symbol: (float(row["price"]), float(row["ts"]))
+            for symbol, row in zip(symbols, rows)
+            if row and "price" in row
+        }
+
+    async def fetch_prices(self, symbols: List[str], max_age: float) -> Dict[str, Tuple[float, float]]:
+        """Lectura para lectores: pide al productor lo que falte y espera brevemente"""
+        now = time.time()
+        await self._redis.zadd(WANTED_KEY, {symbol: now for symbol in symbols})
+
+        deadline = time.monotonic() + READER_WAIT_SECONDS
+        found: Dict[str, Tuple[float, float]] = {}
+        pending = list(symbols)
+        while True:
+            for symbol, (price, ts) in (await self.read_prices(pending)).items():
+                if time.time() - ts <= max_age:
+                    found[symbol] = (price, ts)
+            pending = [s for s in pending if s not in found]
+            if not pending or time.monotonic() >= deadline:
+                return found
+            await asyncio.sleep(0.1)
+
+    # ==================== SÍMBOLOS Y ALERTAS ====================
+
+    async def publish_symbols(self, symbols: List[dict]):
+        if self._redis and self.is_producer:
+            await self._redis.set(SYMBOLS_KEY, json.dumps(symbols))
+
+    async def read_symbols(self) -> Optional[List[dict]]:
+        if not self._redis:
+            return None
+        raw = await self._redis.get(SYMBOLS_KEY)
+        return json.loads(raw) if raw else None
+
+    async def publish_active_alerts(self, alerts: Dict[int, dict]):
+        """Reemplaza el conjunto de alertas activas (id -> datos mínimos)"""
+        if not self._redis or not self.is_producer:
+            return
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(ACTIVE_ALERTS_KEY)
+        if alerts:
+            pipe.hset(ACTIVE_ALERTS_KEY, mapping={str(k): json.dumps(v) for k, v in alerts.items()})
+        await pipe.execute()
+
+    async def update_active_alert(self, alert_id: int, data: Optional[dict]):
+        """Alta/cambio (data) o baja (None) de una alerta activa"""
+        if not self._redis or not self.is_producer:
+            return
+        try:
+            if data is None:
+                await self._redis.hdel(ACTIVE_ALERTS_KEY, str(alert_id))
+            else:
+                await self._redis.hset(ACTIVE_ALERTS_KEY, str(alert_id), json.dumps(data))
+        except Exception as e:
+            print(f"❌ Error actualizando alerta activa en Redis: {e}")
+
+    async def read_active_alerts(self) -> Dict[int, dict]:
+        if not self._redis:
+            return {}
+        raw = await self._redis.hgetall(ACTIVE_ALERTS_KEY)
+        return {int(k): json.loads(v) for k, v in raw.items()}
+
+    def on_alerts_changed(self, callback: Callable[[Optional[int]], None]):
+        """Registrar un callback para cambios de alertas hechos por otros procesos
+
+        Se llama una vez por alerta cambiada, o con None si hay que releerlo todo.
+        """
+        if callback not in self._alerts_changed_callbacks:
+            self._alerts_changed_callbacks.append(callback)
+
+    async def publish_alerts_changed(self, *alert_ids: int):
+        """Avisar al resto de procesos tras el commit (sin ids: cambio general)"""
+        if self._redis:
+            try:
+                message = f"{PROCESS_ID}|{','.join(str(alert_id) for alert_id in alert_ids)}"
+                await self._redis.publish(ALERTS_CHANGED_CHANNEL, message)
+            except Exception as e:
+                print(f"❌ Error publicando cambio de alertas: {e}")
+
+    async def _listen_alerts_changed(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(ALERTS_CHANGED_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        origin, _, data = (message.get("data") or "").rpartition("|")
+                        if origin == PROCESS_ID:
+                            # Este proceso ya aplicó el cambio al escribirlo
+                            continue
+                        alert_ids = [int(alert_id) for alert_id in data.split(",")] if data else [None]
+                        for alert_id in alert_ids:
+                            for callback in self._alerts_changed_callbacks:
+                                callback(alert_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error escuchando cambios de alertas: {e}")
+                await asyncio.sleep(5)
+
+    # ==================== EVENTOS DE STREAM ====================
+
+    async def publish_stream_event(self, event: dict) -> bool:
+        """Publicar un evento para los clientes de /api/stream de todos los procesos"""
+        if not self._redis:
+            return False
+        try:
+            await self._redis.publish(STREAM_EVENTS_CHANNEL, json.dumps(event, default=str))
+            return True
+        except Exception as e:
+            print(f"❌ Error publicando evento de stream: {e}")
+            return False
+
+    async def listen_stream_events(self, callback: Callable[[dict], None]):
+        """Bucle de suscripción (lo lanza cada proceso con clientes de stream)"""
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(STREAM_EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        callback(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error escuchando eventos de stream: {e}")
+                await asyncio.sleep(5)
+
+    # ==================== VERSIONES ====================
+
+    async def bump_version(self, name: str) -> Optional[int]:
+        """Incrementar un contador de cambios (cualquier proceso que escriba)"""
+        if not self._redis:
+            return None
+        try:
+            return await self._redis.hincrby(VERSIONS_KEY, name, 1)
+        except Exception as e:
+            print(f"❌ Error incrementando versión {name} en Redis: {e}")
+            return None
+
+    async def read_version(self, name: str) -> Optional[int]:
+        if not self._redis:
+            return None
+        value = await self._redis.hget(VERSIONS_KEY, name)
+        return int(value) if value else 0
+
+    # ==================== PRODUCTOR ====================
+
+    async def _producer_loop(self):
+        from price_cache import price_cache  # import diferido para evitar import circular
+
+        last_wanted_poll = 0.0
+        while True:
+            try:
+                await self._flush_prices()
+
+                if time.monotonic() - last_wanted_poll >= WANTED_POLL_SECONDS:
+                    last_wanted_poll = time.monotonic()
+                    now = time.time()
+                    await self._redis.zremrangebyscore(WANTED_KEY, 0, now - WANTED_TTL_SECONDS)
+                    wanted = await self._redis.zrange(WANTED_KEY, 0, -1)
+                    # Los símbolos del WebSocket ya están frescos: solo REST para el resto
+                    stale = [s for s in wanted if not price_cache.is_fresh(s)]
+                    if stale:
+                        # La caché refresca desde Binance y publica en Redis
+                        await price_cache.get_many(stale)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error en productor Redis: {e}")
+            await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "role": self.role if self.enabled else "local",
+            "producing": self.enabled and self.is_producer,
+            "published_prices": self.published,
+            "pending_prices": len(self._pending_prices),
+            "reads": self.reads
+        }
+
+# Instancia global
+shared_state = SharedState()
@@ -0,0 +1,339 @@
+# backend/stream_hub.py - Feed compartido de /api/stream: progreso de alertas, disparos, precios y posiciones
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set
+
+from alert_snapshot import alert_snapshot
+from binance_scheduler import PRIORITY_DASHBOARD
+from etags import change_counters
+from price_cache import price_cache
+from shared_state import shared_state
+from trading_snapshot import position_pnl, trading_snapshot
+
+# Cadencia del feed: una vuelta sirve a todos los clientes conectados
+STREAM_TICK_SECONDS = float(os.getenv("STREAM_TICK_SECONDS", "1"))
+# Eventos discretos (disparos) pendientes por cliente; al superarlo se le desconecta
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+STREAM_MAX_CLIENTS = int(os.getenv("STREAM_MAX_CLIENTS", "200"))
+STREAM_MAX_SYMBOLS = 50
+# Mensaje keepalive si un cliente no recibe nada en este tiempo
+STREAM_HEARTBEAT_SECONDS = 15
+# Sin API keys de Binance no se reintenta el feed de posiciones hasta pasado este tiempo
+POSITIONS_RETRY_SECONDS = 60
+
+TOPICS = ("alerts", "prices", "positions")
+
+class SlowConsumerError(Exception):
+    """El cliente no consume eventos al ritmo al que llegan"""
+
+class StreamClient:
+    """Suscripciones y buzón de un cliente
+
+    Los datos de estado (precios, progreso, posiciones) se fusionan en el buzón:
+    un cliente lento recibe el último valor, no la cola entera. Los eventos
+    discretos van a una cola acotada; si se llena, el cliente se desconecta y
+    al reconectar recibe otra vez el estado completo.
+    """
+
+    def __init__(self, topics: Iterable[str] = ("alerts",), symbols: Iterable[str] = ()):
+        self.topics: Set[str] = set()
+        self.symbols: Set[str] = set()
+        self.subscribe(topics, symbols)
+        self._events: Deque[dict] = deque()
+        self._state: Dict[str, dict] = {}
+        self._wakeup = asyncio.Event()
+        self.overflowed = False
+        self.connected_at = time.time()
+        self.sent = 0
+        self.coalesced = 0
+
+    def subscribe(self, topics: Iterable[str] = (), symbols: Iterable[str] = ()):
+        self.topics.update(topic for topic in topics if topic in TOPICS)
+        for symbol in symbols:
+            if len(self.symbols) >= STREAM_MAX_SYMBOLS:
+                break
+            self.symbols.add(symbol.upper())
+
+    def unsubscribe(self, topics: Iterable[str] = (), symbols: Iterable[str] = ()):
+        self.topics.difference_update(topics)
+        self.symbols.difference_update(symbol.upper() for symbol in symbols)
+
+    # ==================== BUZÓN ====================
+
+    def offer_event(self, event: dict):
+        if len(self._events) >= STREAM_QUEUE_SIZE:
+            self.overflowed = True
+        else:
+            self._events.append(event)
+        self._wakeup.set()
+
+    def offer_state(self, kind: str, data: dict, merge: bool = True):
+        """Fusionar por clave con lo pendiente (``merge``) o reemplazarlo"""
+        pending = self._state.get(kind)
+        if pending is not None:
+            self.coalesced += 1
+        if pending is not None and merge:
+            pending.update(data)
+        else:
+            # Copia propia para fusionar: ``data`` se reparte a todos los clientes
+            self._state[kind] = dict(data) if merge else data
+        self._wakeup.set()
+
+    async def next_messages(self, timeout: float = STREAM_HEARTBEAT_SECONDS) -> List[dict]:
+        """Esperar y vaciar el buzón: eventos primero, luego el estado fusionado"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return [{"type": "ping", "ts": time.time()}]
+        self._wakeup.clear()
+        if self.overflowed:
+            raise SlowConsumerError(f"más de {STREAM_QUEUE_SIZE} eventos sin consumir")
+
+        messages = list(self._events)
+        self._events.clear()
+        for kind, data in self._state.items():
+            if kind == "alert_progress":
+                messages.append({"type": kind, "data": list(data.values())})
+            else:
+                messages.append({"type": kind, "data": data})
+        self._state = {}
+        self.sent += len(messages)
+        return messages
+
+def _progress_key(data: dict) -> tuple:
+    """Lo que envía alert_progress: si no cambia, la alerta no se reenvía"""
+    return data["current_price"], data["progress_percentage"]
+
+class StreamHub:
+    """Un único productor por proceso para todos los clientes de /api/stream
+
+    Las entradas se calculan una vez por vuelta (diff de la instantánea de
+    alertas, precios de la unión de símbolos suscritos, lectura de posiciones
+    compartida con los endpoints de trading) y se reparten filtradas a cada
+    cliente. Los eventos discretos llegan por Redis pub/sub, así que un
+    disparo en el proceso líder llega a los clientes de todos los workers.
+    """
+
+    def __init__(self, tick: float = STREAM_TICK_SECONDS):
+        self.tick = tick
+        self.clients: Set[StreamClient] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._snapshot_version: Optional[int] = None
+        self._active: Dict[int, dict] = {}
+        self._prices: Dict[str, float] = {}
+        self._positions_version: Optional[int] = None
+        self._positions: Optional[dict] = None
+        self._positions_retry_at = 0.0
+        self.events_published = 0
+        self.slow_disconnects = 0
+
+    # ==================== CLIENTES ====================
+
+    def connect(self, topics: Iterable[str], symbols: Iterable[str]) -> StreamClient:
+        if len(self.clients) >= STREAM_MAX_CLIENTS:
+            raise ConnectionRefusedError("Demasiados clientes de stream")
+        client = StreamClient(topics, symbols)
+        self.clients.add(client)
+        self.send_initial_state(client)
+        return client
+
+    def disconnect(self, client: StreamClient):
+        self.clients.discard(client)
+        if client.overflowed:
+            self.slow_disconnects += 1
+
+    def send_initial_state(self, client: StreamClient):
+        """Estado completo al conectar o ampliar suscripciones; después solo deltas"""
+        if "alerts" in client.topics and self._snapshot_version is not None:
+            client.offer_state("alerts", {"alerts": list(self._active.values())}, merge=False)
+        if "prices" in client.topics:
+            prices = {s: self._prices[s] for s in client.symbols if s in self._prices}
+            if prices:
+                client.offer_state("prices", prices)
+        if "positions" in client.topics and self._positions is not None:
+            client.offer_state("positions", self._positions, merge=False)
+
+    def _clients_with(self, topic: str) -> List[StreamClient]:
+        return [client for client in self.clients if topic in client.topics]
+
+    # ==================== EVENTOS DISCRETOS ====================
+
+    def publish(self, event_type: str, data: dict):
+        """Evento para todos los workers (vía Redis) o solo este proceso sin Redis"""
+        event = {"type": event_type, "data": data, "ts": time.time()}
+        self.events_published += 1
+        if shared_state.enabled:
+            asyncio.ensure_future(self._publish_shared(event))
+        else:
+            self._fan_out(event)
+
+    async def _publish_shared(self, event: dict):
+        if not await shared_state.publish_stream_event(event):
+            self._fan_out(event)
+
+    def _fan_out(self, event: dict):
+        for client in self._clients_with("alerts"):
+            client.offer_event(event)
+
+    # ==================== FEED ====================
+
+    async def _update_alerts(self):
+        clients = self._clients_with("alerts")
+        if not clients:
+            return
+        # Leer la instantánea la mantiene viva (se reconstruye mientras haya lectores)
+        snapshot = await alert_snapshot.get()
+        if snapshot.version == self._snapshot_version:
+            return
+        first = self._snapshot_version is None
+        self._snapshot_version = snapshot.version
+
+        active = {data["id"]: data for data in snapshot.active}
+        # Por valor, no por identidad: cada relectura de la BD recrea todos los dicts
+        changed = {
+            alert_id: {
+                "id": alert_id,
+                "symbol": data["symbol"],
+                "current_price": data["current_price"],
+                "progress_percentage": data["progress_percentage"],
+                "distance_percentage": data["distance_percentage"]
+            }
+            for alert_id, data in active.items()
+            if alert_id in self._active and _progress_key(self._active[alert_id]) != _progress_key(data)
+        }
+        added = [data for alert_id, data in active.items() if alert_id not in self._active]
+        removed = [alert_id for alert_id in self._active if alert_id not in active]
+        self._active = active
+
+        for client in clients:
+            if first:
+                client.offer_state("alerts", {"alerts": list(active.values())}, merge=False)
+                continue
+            if changed:
+                client.offer_state("alert_progress", changed)
+            if added or removed:
+                client.offer_state("alerts_changed", {
+                    "added": added,
+                    "removed": removed,
+                    "counts": dict(snapshot.counts)
+                }, merge=False)
+
+    async def _update_prices(self):
+        clients = self._clients_with("prices")
+        symbols = sorted({symbol for client in clients for symbol in client.symbols})
+        if not symbols:
+            return
+        # Un lote coalescido para todos los clientes (caché, Redis en lectores o REST)
+        prices = await price_cache.get_many(symbols, PRIORITY_DASHBOARD)
+        changed = {s: p for s, p in prices.items() if p > 0 and self._prices.get(s) != p}
+        if not changed:
+            return
+        self._prices.update(changed)
+        for client in clients:
+            mine = {s: p for s, p in changed.items() if s in client.symbols}
+            if mine:
+                client.offer_state("prices", mine)
+
+    async def _update_positions(self):
+        clients = self._clients_with("positions")
+        if not clients or time.monotonic() < self._positions_retry_at:
+            return
+        config_key = await change_counters.get("config")
+        if trading_snapshot.version("positions", config_key) is None:
+            positions = await self._fetch_positions(config_key)
+            if positions is None:
+                self._positions_retry_at = time.monotonic() + POSITIONS_RETRY_SECONDS
+                return
+        version = trading_snapshot.version("positions", config_key)
+        if version is None or version == self._positions_version:
+            return
+        self._positions_version = version
+        positions = trading_snapshot.peek("positions", config_key)
+
+        summary = []
+        for position in positions or []:
+            size = float(position.get('positionAmt', 0))
+            pnl_percent, pnl_usd = position_pnl(position)
+            summary.append({
+                "symbol": position.get('symbol', ''),
+                "side": 'LONG' if size > 0 else 'SHORT',
+                "size": abs(size),
+                "entry_price": float(position.get('entryPrice', 0)),
+                "mark_price": float(position.get('markPrice', 0)),
+                "pnl": pnl_usd,
+                "pnl_percent": pnl_percent
+            })
+        self._positions = {
+            "positions": summary,
+            "total_unrealized_pnl": sum(item["pnl"] for item in summary)
+        }
+        for client in clients:
+            client.offer_state("positions", self._positions, merge=False)
+
+    async def _fetch_positions(self, config_key: str) -> Optional[list]:
+        """Misma lectura cacheada que /api/trading/positions (None si no hay API keys)"""
+        import crud  # import diferido para evitar import circular
+        from binance_service import BinanceFuturesService
+        from database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            config = await crud.get_config(db)
+        if not config.binance_api_key or not config.binance_secret_key:
+            return None
+        binance = BinanceFuturesService(
+            crud.decrypt_api_key(config.binance_api_key),
+            crud.decrypt_api_key(config.binance_secret_key),
+            config.use_testnet
+        )
+        return await trading_snapshot.get("positions", config_key, binance.get_positions)
+
+    # ==================== BACKGROUND ====================
+
+    async def start(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if shared_state.enabled and (not self._listener or self._listener.done()):
+            self._listener = asyncio.create_task(shared_state.listen_stream_events(self._fan_out))
+
+    async def stop(self):
+        for task in (self._task, self._listener):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._listener = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            if not self.clients:
+                # Sin clientes no se mantiene estado: el próximo recibe el completo
+                self._snapshot_version = None
+                self._positions_version = None
+                continue
+            for update in (self._update_alerts, self._update_prices, self._update_positions):
+                try:
+                    await update()
+                except Exception as e:
+                    print(f"❌ Error en feed de stream ({update.__name__}): {e}")
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "max_clients": STREAM_MAX_CLIENTS,
+            "by_topic": {topic: len(self._clients_with(topic)) for topic in TOPICS},
+            "symbols": len({symbol for client in self.clients for symbol in client.symbols}),
+            "events_published": self.events_published,
+            "slow_disconnects": self.slow_disconnects,
+            "queue_size": STREAM_QUEUE_SIZE,
+            "tick_seconds": self.tick
+        }
+
+# Instancia global
+stream_hub = StreamHub()
@@ -0,0 +1,364 @@
+# backend/stub_upstream.py - Servidor local que imita Binance, Telegram y Discord para benchmarks sin red
+"""
+Uso:
+
+    python stub_upstream.py --port 9000 --symbols 300 --latency-ms 20 --error-rate 0.01
+
+y arrancar el backend apuntando a él:
+
+    BINANCE_SPOT_URL=http://localhost:9000
+    BINANCE_FUTURES_URL=http://localhost:9000
+    BINANCE_FUTURES_TESTNET_URL=http://localhost:9000
+    BINANCE_FUTURES_WS_URL=ws://localhost:9000/stream
+    TELEGRAM_API_URL=http://localhost:9000
+    DISCORD_API_URL=http://localhost:9000
+
+Trayectorias de precio (--path):
+    walk    paseo aleatorio geométrico (--volatility por segundo)
+    sine    oscilación alrededor del precio base (--amplitude, --period)
+    script  fichero JSON {"BTCUSDT": [[segundo, precio], ...]} con interpolación lineal;
+            la trayectoria se repite al llegar al final (--script)
+
+Latencia, errores y límite de weight se cambian en caliente con POST /_stub/config.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import random
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
+
+from binance_scheduler import endpoint_weight
+from symbol_registry import POPULAR_FUTURES
+
+# Precios iniciales aproximados; el resto de símbolos arranca en un precio aleatorio
+BASE_PRICES = {
+    'BTCUSDT': 65000.0, 'ETHUSDT': 3200.0, 'BNBUSDT': 580.0, 'XRPUSDT': 0.52, 'SOLUSDT': 150.0,
+    'ADAUSDT': 0.45, 'DOGEUSDT': 0.15, 'DOTUSDT': 7.0, 'AVAXUSDT': 35.0, 'MATICUSDT': 0.7,
+    'LTCUSDT': 85.0, 'LINKUSDT': 15.0, 'ATOMUSDT': 8.5, 'UNIUSDT': 9.0, 'ETCUSDT': 27.0
+}
+
+class StubConfig:
+    """Parámetros del servidor, modificables en caliente"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.latency_ms = args.latency_ms
+        self.jitter_ms = args.jitter_ms
+        self.error_rate = args.error_rate
+        self.weight_limit = args.weight_limit
+        self.ws_interval = args.ws_interval
+        self.volatility = args.volatility
+        self.amplitude = args.amplitude
+        self.period = args.period
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    def update(self, values: dict):
+        for key, value in values.items():
+            if hasattr(self, key):
+                setattr(self, key, type(getattr(self, key))(value))
+
+class PricePath:
+    """Precio de un símbolo en función del tiempo transcurrido desde el arranque"""
+
+    def __init__(self, symbol: str, base: float, mode: str, config: StubConfig,
+                 script: Optional[List[Tuple[float, float]]] = None):
+        self.symbol = symbol
+        self.base = base
+        self.mode = mode
+        self.config = config
+        self.phase = random.uniform(0, 2 * math.pi)
+        self._price = base
+        self._last = 0.0
+        self._times = [p[0] for p in script] if script else []
+        self._prices = [p[1] for p in script] if script else []
+
+    def price(self, elapsed: float) -> float:
+        if self.mode == "sine":
+            return self.base * (1 + self.config.amplitude * math.sin(2 * math.pi * elapsed / self.config.period + self.phase))
+        if self.mode == "script" and self._times:
+            return self._scripted(elapsed)
+
+        # Paseo aleatorio: avanzar desde la última consulta
+        dt = elapsed - self._last
+        if dt > 0:
+            self._price *= math.exp(random.gauss(0, self.config.volatility * math.sqrt(dt)))
+            self._last = elapsed
+        return self._price
+
+    def _scripted(self, elapsed: float) -> float:
+        duration = self._times[-1]
+        t = elapsed % duration if duration > 0 else 0.0
+        i = bisect.bisect_right(self._times, t)
+        if i == 0:
+            return self._prices[0]
+        if i >= len(self._times):
+            return self._prices[-1]
+        t0, t1 = self._times[i - 1], self._times[i]
+        p0, p1 = self._prices[i - 1], self._prices[i]
+        return p0 + (p1 - p0) * (t - t0) / (t1 - t0)
+
+class StubMarket:
+    """Universo de símbolos simulados y contadores de peticiones"""
+
+    def __init__(self, args: argparse.Namespace, config: StubConfig):
+        self.config = config
+        self.started = time.monotonic()
+        self.paths: Dict[str, PricePath] = {}
+        self.requests = 0
+        self.errors_injected = 0
+        self.rate_limited = 0
+        self.telegram_messages = 0
+        self.discord_messages = 0
+        self.weight_window = int(time.time() // 60)
+        self.weight_used = 0
+
+        script = {}
+        if args.script:
+            with open(args.script) as f:
+                script = {s: [tuple(p) for p in points] for s, points in json.load(f).items()}
+
+        symbols = list(dict.fromkeys(list(POPULAR_FUTURES) + list(script)))
+        # Símbolos sintéticos para escalar a miles de alertas repartidas
+        for i in range(max(0, args.symbols - len(symbols))):
+            symbols.append(f"SYN{i:04d}USDT")
+
+        for symbol in symbols:
+            base = BASE_PRICES.get(symbol) or round(random.uniform(0.05, 500.0), 4)
+            mode = "script" if symbol in script else ("walk" if args.path == "script" else args.path)
+            self.paths[symbol] = PricePath(symbol, base, mode, config, script.get(symbol))
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def price(self, symbol: str) -> float:
+        return round(self.paths[symbol].price(self.elapsed()), 8)
+
+    def consume_weight(self, weight: int) -> bool:
+        window = int(time.time() // 60)
+        if window != self.weight_window:
+            self.weight_window = window
+            self.weight_used = 0
+        self.weight_used += weight
+        return self.weight_used <= self.config.weight_limit
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self.paths),
+            "uptime_seconds": round(self.elapsed(), 1),
+            "requests": self.requests,
+            "errors_injected": self.errors_injected,
+            "rate_limited": self.rate_limited,
+            "weight_used_1m": self.weight_used,
+            "telegram_messages": self.telegram_messages,
+            "discord_messages": self.discord_messages
+        }
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    config = StubConfig(args)
+    market = StubMarket(args, config)
+    app = FastAPI(title="CryptoAlert Upstream Stub")
+
+    @app.middleware("http")
+    async def emulate_upstream(request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/_stub"):
+            return await call_next(request)
+
+        market.requests += 1
+        delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        weight = 0
+        if path.startswith("/api/v3/") or path.startswith("/fapi/"):
+            weight = endpoint_weight(path, dict(request.query_params))
+            if not market.consume_weight(weight):
+                market.rate_limited += 1
+                retry_after = 60 - int(time.time() % 60)
+                return JSONResponse(
+                    {"code": -1003, "msg": "Too many requests; current limit is exceeded."},
+                    status_code=429,
+                    headers={"Retry-After": str(retry_after), "X-MBX-USED-WEIGHT-1M": str(market.weight_used)}
+                )
+
+        if config.error_rate > 0 and random.random() < config.error_rate:
+            market.errors_injected += 1
+            return JSONResponse({"code": -1001, "msg": "Internal error (stub)"}, status_code=503)
+
+        response = await call_next(request)
+        if weight:
+            response.headers["X-MBX-USED-WEIGHT-1M"] = str(market.weight_used)
+        return response
+
+    # ==================== BINANCE REST ====================
+
+    def ticker(symbol: Optional[str], symbols: Optional[str]):
+        if symbol:
+            if symbol not in market.paths:
+                return JSONResponse({"code": -1121, "msg": "Invalid symbol."}, status_code=400)
+            return {"symbol": symbol, "price": str(market.price(symbol))}
+        wanted = json.loads(symbols) if symbols else list(market.paths)
+        if any(s not in market.paths for s in wanted):
+            return JSONResponse({"code": -1121, "msg": "Invalid symbol."}, status_code=400)
+        return [{"symbol": s, "price": str(market.price(s))} for s in wanted]
+
+    @app.get("/api/v3/ticker/price")
+    async def spot_ticker(symbol: Optional[str] = None, symbols: Optional[str] = None):
+        return ticker(symbol, symbols)
+
+    @app.get("/fapi/v1/ticker/price")
+    async def futures_ticker(symbol: Optional[str] = None, symbols: Optional[str] = None):
+        return ticker(symbol, symbols)
+
+    @app.get("/fapi/v1/exchangeInfo")
+    async def exchange_info():
+        return {
+            "timezone": "UTC",
+            "serverTime": int(time.time() * 1000),
+            "symbols": [
+                {
+                    "symbol": symbol,
+                    "status": "TRADING",
+                    "contractType": "PERPETUAL",
+                    "baseAsset": symbol[:-4],
+                    "quoteAsset": "USDT",
+                    "filters": [
+                        {"filterType": "PRICE_FILTER", "tickSize": "0.0001"},
+                        {"filterType": "LOT_SIZE", "stepSize": "0.001"}
+                    ]
+                }
+                for symbol in market.paths
+            ]
+        }
+
+    @app.get("/fapi/v2/positionRisk")
+    async def position_risk():
+        positions = []
+        for symbol in list(market.paths)[:args.positions]:
+            mark = market.price(symbol)
+            entry = market.paths[symbol].base
+            amount = 1.0
+            positions.append({
+                "symbol": symbol,
+                "positionAmt": str(amount),
+                "entryPrice": str(entry),
+                "markPrice": str(mark),
+                "unRealizedProfit": str(round((mark - entry) * amount, 8)),
+                "leverage": "10",
+                "positionSide": "BOTH",
+                "updateTime": int(time.time() * 1000)
+            })
+        return positions
+
+    @app.get("/fapi/v2/account")
+    async def account():
+        return {
+            "totalWalletBalance": "10000.00000000",
+            "availableBalance": "9000.00000000",
+            "totalUnrealizedPnl": "0.00000000",
+            "canTrade": True,
+            "assets": [{"asset": "USDT", "walletBalance": "10000.00000000"}],
+            "positions": []
+        }
+
+    @app.get("/fapi/v1/openOrders")
+    async def open_orders():
+        return []
+
+    # ==================== TELEGRAM / DISCORD ====================
+
+    @app.post("/bot{token}/sendMessage")
+    async def telegram_send(token: str, request: Request):
+        payload = await request.json()
+        market.telegram_messages += 1
+        return {"ok": True, "result": {"message_id": market.telegram_messages, "text": payload.get("text", "")}}
+
+    @app.get("/bot{token}/getUpdates")
+    async def telegram_updates(token: str):
+        chat = {"id": 100000001, "type": "private"}
+        return {"ok": True, "result": [{"update_id": 1, "message": {"message_id": 1, "chat": chat, "text": "/start"}}]}
+
+    @app.post("/api/webhooks/{webhook_id}/{webhook_token}")
+    async def discord_webhook(webhook_id: str, webhook_token: str):
+        market.discord_messages += 1
+        return Response(status_code=204)
+
+    # ==================== WEBSOCKET ====================
+
+    @app.websocket("/stream")
+    async def stream(ws: WebSocket):
+        await ws.accept()
+        subscribed: Set[str] = set()
+
+        async def push():
+            while True:
+                await asyncio.sleep(config.ws_interval)
+                for name in list(subscribed):
+                    symbol = name.split("@", 1)[0].upper()
+                    if symbol not in market.paths:
+                        continue
+                    price = market.price(symbol)
+                    if "@markPrice" in name:
+                        data = {"e": "markPriceUpdate", "E": int(time.time() * 1000), "s": symbol, "p": str(price)}
+                    else:
+                        spread = price * 0.00005
+                        data = {"s": symbol, "b": str(price - spread), "a": str(price + spread)}
+                    await ws.send_text(json.dumps({"stream": name, "data": data}))
+
+        pusher = asyncio.create_task(push())
+        try:
+            while True:
+                message = json.loads(await ws.receive_text())
+                method = message.get("method")
+                if method == "SUBSCRIBE":
+                    subscribed.update(message.get("params", []))
+                elif method == "UNSUBSCRIBE":
+                    subscribed.difference_update(message.get("params", []))
+                await ws.send_text(json.dumps({"result": None, "id": message.get("id")}))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            pusher.cancel()
+
+    # ==================== CONTROL ====================
+
+    @app.get("/_stub/stats")
+    async def stub_stats():
+        return {**market.stats(), "config": config.to_dict()}
+
+    @app.post("/_stub/config")
+    async def stub_config(request: Request):
+        config.update(await request.json())
+        return config.to_dict()
+
+    return app
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stand-in local de Binance/Telegram/Discord")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--symbols", type=int, default=len(POPULAR_FUTURES), help="total de símbolos simulados")
+    parser.add_argument("--path", choices=("walk", "sine", "script"), default="walk")
+    parser.add_argument("--script", help="fichero JSON con trayectorias por símbolo")
+    parser.add_argument("--volatility", type=float, default=0.001, help="desviación por segundo del paseo aleatorio")
+    parser.add_argument("--amplitude", type=float, default=0.02, help="amplitud relativa de la onda")
+    parser.add_argument("--period", type=float, default=60.0, help="periodo de la onda en segundos")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 503")
+    parser.add_argument("--weight-limit", type=int, default=2400, help="weight por minuto antes de responder 429")
+    parser.add_argument("--ws-interval", type=float, default=1.0, help="segundos entre eventos del WebSocket")
+    parser.add_argument("--positions", type=int, default=3, help="posiciones abiertas en positionRisk")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,165 @@
+# backend/symbol_registry.py - Universo de símbolos de FUTURES en memoria con refresco periódico
+import asyncio
+import time
+from typing import Dict, FrozenSet, List, Optional
+
+from binance_scheduler import binance_scheduler
+from shared_state import shared_state
+from upstreams import BINANCE_FUTURES_URL
+
+EXCHANGE_INFO_URL = f"{BINANCE_FUTURES_URL}/fapi/v1/exchangeInfo"
+REFRESH_INTERVAL_SECONDS = 6 * 60 * 60
+RETRY_INTERVAL_SECONDS = 60
+
+# Símbolos populares que se ofrecen para crear alertas
+POPULAR_FUTURES = (
+    'BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'XRPUSDT', 'SOLUSDT',
+    'ADAUSDT', 'DOGEUSDT', 'DOTUSDT', 'AVAXUSDT', 'MATICUSDT',
+    'LTCUSDT', 'LINKUSDT', 'ATOMUSDT', 'UNIUSDT', 'ETCUSDT',
+    'FILUSDT', 'AAVEUSDT', 'ALGOUSDT', 'SANDUSDT', 'MANAUSDT',
+    'APTUSDT', 'OPUSDT', 'ARBUSDT', 'INJUSDT', 'SUIUSDT',
+    'SHIBUSDT', 'TRXUSDT', 'NEARUSDT', 'FTMUSDT', 'ICPUSDT'
+)
+
+# Lista de respaldo si exchangeInfo nunca se pudo cargar
+FALLBACK_FUTURES = (
+    'BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'XRPUSDT', 'SOLUSDT',
+    'ADAUSDT', 'DOGEUSDT', 'AVAXUSDT', 'LTCUSDT', 'LINKUSDT',
+    'MATICUSDT', 'DOTUSDT', 'ATOMUSDT', 'UNIUSDT', 'ETCUSDT'
+)
+
+class SymbolInfo:
+    """Metadatos de un contrato de futuros"""
+    __slots__ = ("symbol", "status", "base_asset", "quote_asset", "contract_type", "tick_size", "step_size")
+
+    def __init__(self, data: dict):
+        """``data`` es una entrada de exchangeInfo['symbols']"""
+        self.symbol = data["symbol"]
+        self.status = data.get("status")
+        self.base_asset = data.get("baseAsset")
+        self.quote_asset = data.get("quoteAsset")
+        self.contract_type = data.get("contractType")
+        self.tick_size = None
+        self.step_size = None
+        for f in data.get("filters", []):
+            if f.get("filterType") == "PRICE_FILTER":
+                self.tick_size = float(f["tickSize"])
+            elif f.get("filterType") == "LOT_SIZE":
+                self.step_size = float(f["stepSize"])
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SymbolInfo":
+        info = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(info, name, data.get(name))
+        return info
+
+class SymbolRegistry:
+    """Carga exchangeInfo una vez y lo refresca en background"""
+
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL_SECONDS):
+        self.refresh_interval = refresh_interval
+        self.symbols: Dict[str, SymbolInfo] = {}
+        self.tradable: FrozenSet[str] = frozenset()
+        self.supported: FrozenSet[str] = frozenset(FALLBACK_FUTURES)
+        self.supported_list: List[str] = list(FALLBACK_FUTURES)
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    # ==================== CONSULTAS O(1) ====================
+
+    def is_tradable(self, symbol: str) -> bool:
+        return symbol in self.tradable
+
+    def is_supported(self, symbol: str) -> bool:
+        """Símbolo aceptado para crear alertas"""
+        return symbol in self.supported
+
+    def get(self, symbol: str) -> Optional[SymbolInfo]:
+        return self.symbols.get(symbol)
+
+    def perpetual_usdt(self) -> List[str]:
+        return sorted(
+            s.symbol for s in self.symbols.values()
+            if s.status == 'TRADING' and s.contract_type == 'PERPETUAL' and s.quote_asset == 'USDT'
+        )
+
+    # ==================== CARGA ====================
+
+    async def ensure_loaded(self):
+        if self.loaded_at is None:
+            await self.refresh()
+
+    async def refresh(self) -> bool:
+        async with self._lock:
+            try:
+                if shared_state.is_reader:
+                    # Lectores toman el universo publicado por el productor
+                    published = await shared_state.read_symbols()
+                    if not published:
+                        return False
+                    self._load([SymbolInfo.from_dict(item) for item in published])
+                    return True
+                
+                response = await binance_scheduler.get(EXCHANGE_INFO_URL, timeout=10.0)
+                if response.status_code != 200:
+                    print(f"❌ Error cargando exchangeInfo: {response.status_code}")
+                    return False
+                self._load([SymbolInfo(item) for item in response.json().get("symbols", [])])
+                await shared_state.publish_symbols([info.to_dict() for info in self.symbols.values()])
+                return True
+            except Exception as e:
+                print(f"❌ Error cargando exchangeInfo: {e}")
+                return False
+
+    def _load(self, infos: List[SymbolInfo]):
+        symbols = {info.symbol: info for info in infos}
+
+        tradable = frozenset(
+            s.symbol for s in symbols.values()
+            if s.status == 'TRADING' and s.symbol.endswith('USDT')
+        )
+        supported_list = [s for s in POPULAR_FUTURES if s in tradable]
+
+        self.symbols = symbols
+        self.tradable = tradable
+        self.supported_list = supported_list
+        self.supported = frozenset(supported_list)
+        self.loaded_at = time.time()
+        print(f"✅ Símbolos de futuros cargados: {len(tradable)} operables, {len(supported_list)} soportados")
+
+    # ==================== REFRESCO EN BACKGROUND ====================
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            ok = await self.refresh()
+            await asyncio.sleep(self.refresh_interval if ok else RETRY_INTERVAL_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "tradable": len(self.tradable),
+            "supported": len(self.supported),
+            "loaded_at": self.loaded_at,
+            "refresh_interval_seconds": self.refresh_interval
+        }
+
+# Instancia global
+symbol_registry = SymbolRegistry()
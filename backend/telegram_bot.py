@@ -7,6 +7,8 @@ import time
 import logging
 from typing import Optional
 
+from upstreams import TELEGRAM_API_URL
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -111,7 +113,7 @@ class TelegramBot:
     def __init__(self, token: str, chat_id: str):
         self.token = token
         self.chat_id = chat_id
-        self.base_url = f"https://api.telegram.org/bot{token}"
+        self.base_url = f"{TELEGRAM_API_URL}/bot{token}"
         self.ngrok_manager = NgrokManager()
         
     def send_message(self, message: str, parse_mode: str = "HTML") -> bool:
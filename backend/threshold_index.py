@@ -0,0 +1,172 @@
+# backend/threshold_index.py - Índice ordenado de targets por símbolo para evaluar alertas en O(log n)
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import models
+
+# Progreso (%) a partir del cual una alerta se considera cerca del target
+NEAR_PROGRESS = 95.0
+# Progreso por debajo del cual deja de estar cerca (histéresis frente a NEAR_PROGRESS)
+NEAR_EXIT_PROGRESS = 93.0
+
+_MAX_ID = float("inf")
+
+def alert_progress(alert_type, target_price: float, current_price: float) -> float:
+    """Porcentaje de progreso hacia el target (100 = alcanzado)"""
+    if current_price <= 0 or target_price <= 0:
+        return 0.0
+    if alert_type == models.AlertTypeEnum.LONG:
+        return (current_price / target_price) * 100
+    return (target_price / current_price) * 100
+
+class SymbolThresholds:
+    """Targets de un símbolo: LONG ascendentes y SHORT descendentes
+
+    Ambas listas guardan claves (k, id) ordenadas de menor a mayor; en SHORT
+    k = -target, así que en los dos lados las alertas cruzadas forman un prefijo.
+    """
+    __slots__ = ("long_keys", "short_keys")
+
+    def __init__(self):
+        self.long_keys: List[Tuple[float, int]] = []
+        self.short_keys: List[Tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.long_keys) + len(self.short_keys)
+
+    def pop_crossed(self, high: float, low: float) -> Tuple[List[int], List[int]]:
+        """Quitar de una vez los LONG con target <= high y los SHORT con target >= low"""
+        i = bisect_right(self.long_keys, (high, _MAX_ID))
+        j = bisect_right(self.short_keys, (-low, _MAX_ID))
+        longs = [alert_id for _, alert_id in self.long_keys[:i]]
+        shorts = [alert_id for _, alert_id in self.short_keys[:j]]
+        if i:
+            del self.long_keys[:i]
+        if j:
+            del self.short_keys[:j]
+        return longs, shorts
+
+    def nearest_distance(self, price: float) -> Optional[float]:
+        """Distancia relativa del precio al target sin cruzar más cercano (en ambos sentidos)"""
+        distances = []
+        if self.long_keys:
+            distances.append(self.long_keys[0][0] / price - 1)
+        if self.short_keys:
+            distances.append(1 + self.short_keys[0][0] / price)
+        return max(min(distances), 0.0) if distances else None
+
+    def near(self, price: float, progress: float) -> Iterator[int]:
+        """Alertas sin cruzar cuyo progreso hacia el target es >= ``progress``"""
+        ratio = progress / 100
+        # LONG: price / target >= ratio  ->  target <= price / ratio
+        i = bisect_right(self.long_keys, (price / ratio, _MAX_ID))
+        for _, alert_id in self.long_keys[:i]:
+            yield alert_id
+        # SHORT: target / price >= ratio  ->  -target <= -price * ratio
+        j = bisect_right(self.short_keys, (-price * ratio, _MAX_ID))
+        for _, alert_id in self.short_keys[:j]:
+            yield alert_id
+
+class ThresholdIndex:
+    """Alertas PENDING indexadas por símbolo y target
+
+    Búsqueda por bisect en O(log n); las inserciones y borrados desplazan la
+    lista con un memmove, despreciable frente a recorrer todas las alertas.
+    """
+
+    def __init__(self):
+        self._symbols: Dict[str, SymbolThresholds] = {}
+        # id -> (símbolo, clave, es_long, payload)
+        self._entries: Dict[int, Tuple[str, Tuple[float, int], bool, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, alert_id: int) -> bool:
+        return alert_id in self._entries
+
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    def count(self, symbol: str) -> int:
+        thresholds = self._symbols.get(symbol)
+        return len(thresholds) if thresholds else 0
+
+    def get(self, alert_id: int) -> Optional[Any]:
+        entry = self._entries.get(alert_id)
+        return entry[3] if entry else None
+
+    def values(self) -> Iterator[Any]:
+        return (entry[3] for entry in self._entries.values())
+
+    # ==================== ESCRITURA ====================
+
+    def add(self, alert_id: int, symbol: str, alert_type, target_price: float, payload: Any = None):
+        """Insertar (o reemplazar) una alerta; ``payload`` se devuelve al dispararse"""
+        if alert_id in self._entries:
+            self.remove(alert_id)
+        is_long = alert_type == models.AlertTypeEnum.LONG
+        key = (target_price if is_long else -target_price, alert_id)
+        thresholds = self._symbols.get(symbol)
+        if thresholds is None:
+            thresholds = self._symbols[symbol] = SymbolThresholds()
+        insort(thresholds.long_keys if is_long else thresholds.short_keys, key)
+        self._entries[alert_id] = (symbol, key, is_long, payload if payload is not None else alert_id)
+
+    def remove(self, alert_id: int) -> Optional[Any]:
+        entry = self._entries.pop(alert_id, None)
+        if entry is None:
+            return None
+        symbol, key, is_long, payload = entry
+        thresholds = self._symbols[symbol]
+        keys = thresholds.long_keys if is_long else thresholds.short_keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+        if not thresholds:
+            del self._symbols[symbol]
+        return payload
+
+    def retarget(self, alert_id: int, target_price: float) -> bool:
+        entry = self._entries.get(alert_id)
+        if entry is None:
+            return False
+        symbol, _, is_long, payload = entry
+        alert_type = models.AlertTypeEnum.LONG if is_long else models.AlertTypeEnum.SHORT
+        self.add(alert_id, symbol, alert_type, target_price, payload)
+        return True
+
+    # ==================== EVALUACIÓN ====================
+
+    def pop_crossed(self, symbol: str, price: float,
+                    low: Optional[float] = None, high: Optional[float] = None) -> List[Any]:
+        """Payloads de las alertas cruzadas por ``price``, ya retiradas del índice
+
+        ``low``/``high`` amplían la comprobación al rango recorrido desde la
+        última evaluación (cruces entre muestras).
+        """
+        thresholds = self._symbols.get(symbol)
+        if thresholds is None or price <= 0:
+            return []
+        high = max(price, high) if high else price
+        low = min(price, low) if low and low > 0 else price
+        longs, shorts = thresholds.pop_crossed(high, low)
+        if not longs and not shorts:
+            return []
+        crossed = [self._entries.pop(alert_id)[3] for alert_id in longs]
+        crossed.extend(self._entries.pop(alert_id)[3] for alert_id in shorts)
+        if not thresholds:
+            del self._symbols[symbol]
+        return crossed
+
+    def nearest_distance(self, symbol: str, price: float) -> Optional[float]:
+        thresholds = self._symbols.get(symbol)
+        if thresholds is None or price <= 0:
+            return None
+        return thresholds.nearest_distance(price)
+
+    def near(self, symbol: str, price: float, progress: float = NEAR_PROGRESS) -> List[Any]:
+        thresholds = self._symbols.get(symbol)
+        if thresholds is None or price <= 0:
+            return []
+        return [self._entries[alert_id][3] for alert_id in thresholds.near(price, progress)]
@@ -0,0 +1,124 @@
+# backend/tick_history.py - Historial reciente (timestamp, precio) por símbolo en buffers circulares NumPy
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Muestras por símbolo; la serie es markPrice@1s (o el sondeo REST, más espaciado),
+# así que cubre al menos ~1 hora. Memoria fija de 16 bytes por muestra
+TICK_HISTORY_CAPACITY = int(os.getenv("TICK_HISTORY_CAPACITY", "3600"))
+
+class TickRing:
+    """Buffer circular de capacidad fija con append O(1) y consultas vectorizadas"""
+    __slots__ = ("capacity", "ts", "prices", "head", "size")
+
+    def __init__(self, capacity: int = TICK_HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.head = 0  # próxima posición a escribir
+        self.size = 0
+
+    def append(self, timestamp: float, price: float) -> bool:
+        """Añadir una muestra; se ignoran las que no avanzan en el tiempo"""
+        if self.size and timestamp <= self.ts[self.head - 1]:
+            return False
+        self.ts[self.head] = timestamp
+        self.prices[self.head] = price
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        return True
+
+    def last(self) -> Optional[Tuple[float, float]]:
+        if not self.size:
+            return None
+        i = self.head - 1
+        return float(self.ts[i]), float(self.prices[i])
+
+    def _ordered(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Últimas n muestras en orden cronológico (vistas si no dan la vuelta)"""
+        n = min(n, self.size)
+        start = self.head - n
+        if start >= 0:
+            return self.ts[start:self.head], self.prices[start:self.head]
+        idx = np.arange(start, self.head) % self.capacity
+        return self.ts[idx], self.prices[idx]
+
+    def last_n(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self._ordered(n)
+
+    def since(self, t: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Muestras con timestamp >= t"""
+        ts, prices = self._ordered(self.size)
+        i = int(np.searchsorted(ts, t, side="left"))
+        return ts[i:], prices[i:]
+
+    def extremes_since(self, t: float) -> Optional[Tuple[float, float]]:
+        """(mínimo, máximo) desde t, o None si no hay muestras"""
+        _, prices = self.since(t)
+        if not len(prices):
+            return None
+        return float(prices.min()), float(prices.max())
+
+class TickHistory:
+    """Un TickRing por símbolo, alimentado por la caché de precios (una sola fuente por símbolo)"""
+
+    def __init__(self, capacity: int = TICK_HISTORY_CAPACITY):
+        self.capacity = capacity
+        self._rings: Dict[str, TickRing] = {}
+        self.samples = 0
+
+    def append(self, symbol: str, price: float, timestamp: Optional[float] = None):
+        ring = self._rings.get(symbol)
+        if ring is None:
+            ring = self._rings[symbol] = TickRing(self.capacity)
+        if ring.append(timestamp or time.time(), price):
+            self.samples += 1
+
+    def get(self, symbol: str) -> Optional[TickRing]:
+        return self._rings.get(symbol)
+
+    def extremes_since(self, symbol: str, t: float) -> Optional[Tuple[float, float]]:
+        ring = self._rings.get(symbol)
+        return ring.extremes_since(t) if ring else None
+
+    def window(self, symbol: str, seconds: float) -> Dict[str, Optional[float]]:
+        """Resumen de la ventana: primero, último, mínimo, máximo y número de muestras"""
+        ring = self._rings.get(symbol)
+        if ring is None:
+            return {"samples": 0, "first": None, "last": None, "min": None, "max": None}
+        _, prices = ring.since(time.time() - seconds)
+        if not len(prices):
+            return {"samples": 0, "first": None, "last": None, "min": None, "max": None}
+        return {
+            "samples": int(len(prices)),
+            "first": float(prices[0]),
+            "last": float(prices[-1]),
+            "min": float(prices.min()),
+            "max": float(prices.max())
+        }
+
+    def sparkline(self, symbol: str, seconds: float, points: int = 60) -> List[List[float]]:
+        """[[timestamp, precio], ...] de la ventana reducido a como mucho ``points`` muestras"""
+        ring = self._rings.get(symbol)
+        if ring is None:
+            return []
+        ts, prices = ring.since(time.time() - seconds)
+        if len(ts) > points > 1:
+            idx = np.linspace(0, len(ts) - 1, points).round().astype(np.int64)
+            ts, prices = ts[idx], prices[idx]
+        return np.column_stack((ts, prices)).tolist()
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._rings),
+            "capacity_per_symbol": self.capacity,
+            "samples_appended": self.samples,
+            "samples_held": sum(r.size for r in self._rings.values()),
+            "memory_bytes": sum(r.ts.nbytes + r.prices.nbytes for r in self._rings.values())
+        }
+
+# Instancia global
+tick_history = TickHistory()
@@ -0,0 +1,92 @@
+# backend/trading_snapshot.py - Cuenta y posiciones de Binance con TTL y versión por contenido
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Vida de una lectura de cuenta/posiciones: los sondeos del dashboard dentro
+# de este periodo no llaman a Binance
+TRADING_SNAPSHOT_TTL = float(os.getenv("TRADING_SNAPSHOT_TTL", "10"))
+
+def position_pnl(position: dict) -> Tuple[float, float]:
+    """(PnL %, PnL USD) de una posición de Binance Futures según entrada y mark price"""
+    size = float(position.get('positionAmt', 0))
+    entry_price = float(position.get('entryPrice', 0))
+    mark_price = float(position.get('markPrice', 0))
+    
+    if size > 0:  # LONG
+        pnl_percent = ((mark_price - entry_price) / entry_price) * 100 if entry_price > 0 else 0
+    else:  # SHORT
+        pnl_percent = ((entry_price - mark_price) / entry_price) * 100 if entry_price > 0 else 0
+    
+    pnl_usd = abs(size) * (mark_price - entry_price) if size > 0 else abs(size) * (entry_price - mark_price)
+    return pnl_percent, pnl_usd
+
+class TradingSnapshot:
+    """Últimas respuestas firmadas de Binance (cuenta, posiciones) compartidas por los endpoints
+
+    Cada entrada guarda la clave de configuración con la que se leyó (un cambio
+    de API keys o testnet la invalida) y una versión que solo sube si el
+    contenido cambió, así el ETag de un sondeo sin cambios se mantiene aunque
+    se haya vuelto a consultar Binance.
+    """
+
+    def __init__(self, ttl: float = TRADING_SNAPSHOT_TTL):
+        self.ttl = ttl
+        # name -> (datos, instante monotónico, clave de config, versión, digest)
+        self._entries: Dict[str, Tuple[Any, float, str, int, str]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.fetches = 0
+
+    def version(self, name: str, key: str) -> Optional[int]:
+        """Versión de la entrada si sigue vigente para esta configuración (None si hay que releer)"""
+        entry = self._entries.get(name)
+        if entry is None or entry[2] != key or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[3]
+
+    def peek(self, name: str, key: str) -> Any:
+        """Datos vigentes sin consultar Binance (None si caducaron)"""
+        return self._entries[name][0] if self.version(name, key) is not None else None
+
+    async def get(self, name: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Datos vigentes o una lectura nueva (coalescida entre peticiones simultáneas)"""
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if self.version(name, key) is not None:
+                self.hits += 1
+                return self._entries[name][0]
+
+            data = await fetch()
+            self.fetches += 1
+            if data is None:
+                # Error de Binance (el servicio devuelve None): no se cachea
+                return None
+            digest = hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+            previous = self._entries.get(name)
+            version = previous[3] if previous is not None else 0
+            if previous is None or previous[4] != digest or previous[2] != key:
+                version += 1
+            self._entries[name] = (data, time.monotonic(), key, version, digest)
+            return data
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "entries": {
+                name: {"version": entry[3], "age_seconds": round(now - entry[1], 1)}
+                for name, entry in self._entries.items()
+            }
+        }
+
+# Instancia global
+trading_snapshot = TradingSnapshot()
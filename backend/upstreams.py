@@ -0,0 +1,22 @@
+# backend/upstreams.py - URLs base de los servicios externos (configurables para benchmarks locales)
+import os
+
+BINANCE_SPOT_URL = os.getenv("BINANCE_SPOT_URL", "https://api.binance.com").rstrip("/")
+BINANCE_FUTURES_URL = os.getenv("BINANCE_FUTURES_URL", "https://fapi.binance.com").rstrip("/")
+BINANCE_FUTURES_TESTNET_URL = os.getenv("BINANCE_FUTURES_TESTNET_URL", "https://testnet.binancefuture.com").rstrip("/")
+BINANCE_FUTURES_WS_URL = os.getenv("BINANCE_FUTURES_WS_URL", "wss://fstream.binance.com/stream")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+# Si se define, los webhooks de Discord se envían a este host conservando la ruta
+DISCORD_API_URL = os.getenv("DISCORD_API_URL", "").rstrip("/")
+
+def binance_futures_url(use_testnet: bool) -> str:
+    return BINANCE_FUTURES_TESTNET_URL if use_testnet else BINANCE_FUTURES_URL
+
+def telegram_url(bot_token: str, method: str) -> str:
+    return f"{TELEGRAM_API_URL}/bot{bot_token}/{method}"
+
+def discord_webhook_url(webhook_url: str) -> str:
+    """Redirige un webhook de Discord al host configurado (stand-in local)"""
+    if not DISCORD_API_URL or "/api/webhooks/" not in webhook_url:
+        return webhook_url
+    return DISCORD_API_URL + webhook_url[webhook_url.index("/api/webhooks/"):]
@@ -15,7 +15,11 @@ CREATE TABLE IF NOT EXISTS alerts (
     created_at TIMESTAMP DEFAULT NOW(),
     triggered_at TIMESTAMP,
     executed_at TIMESTAMP,
-    trade_id VARCHAR(50)
+    trade_id VARCHAR(50),
+    near_state BOOLEAN DEFAULT FALSE,
+    near_notified_at TIMESTAMP,
+    expiry_hours INTEGER,
+    condition JSONB
 );
 
 -- Crear tabla de configuración básica (SQLAlchemy creará la estructura completa)
@@ -55,6 +59,11 @@ CREATE INDEX IF NOT EXISTS idx_alerts_symbol ON alerts(symbol);
 CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status);
 CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts(created_at);
 
+-- Paginación keyset de /api/alerts (created_at, id) con filtros por estado o símbolo
+CREATE INDEX IF NOT EXISTS idx_alerts_created_id ON alerts(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_status_created_id ON alerts(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_symbol_created_id ON alerts(symbol, created_at DESC, id DESC);
+
 -- Función para actualizar updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$